@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+L2 frame-path microbenchmarks
+Runs without root or a network interface:
+- build: client frame construction and test-header stamping
+- parse: server header parse, client test-header parse and CRC check
+- echo: server echo path, old copy-based version vs. in-place recv_into
+  version, and the in-place path over a real SOCK_SEQPACKET socketpair
+- match: client reply matching (RTT table lookup, integrity tracking)
+- e2e: integrity_test against an echo thread over the loopback transport
+Reports ns/frame and frames/s for each path. --save writes the results as
+JSON; --compare checks a run against saved results and exits 1 if any path
+got slower than --tolerance, so a slower hot loop fails a regression check.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import binascii
+from unittest import mock
+
+import enhanced_l2_client as client
+import enhanced_l2_server as server
+from l2_counters import CounterTable
+from l2_mmsg import MmsgSender, MmsgReceiver
+from l2_proto import payload_offset, pack_test_header, parse_test_header, checksum_ok, FLAG_CHECKSUM
+from l2_stats import LatencyStats, SequenceTracker
+from l2_transport import loopback_pair
+
+ETH_P_8021Q = 0x8100
+DEFAULT_ETHERTYPE = 0x88B5
+DEFAULT_TOLERANCE = 0.2
+SUITES = ('build', 'parse', 'echo', 'match', 'e2e')
+DST_MAC = bytes.fromhex('020000000002')
+SRC_MAC = bytes.fromhex('020000000001')
+
+
+class NullSocket:
+    """Stands in for the AF_PACKET socket: receives replay one frame, send() discards."""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def recv(self, bufsize):
+        # Like a real recv(), hand back a freshly allocated bytes object.
+        return bytes(memoryview(self.frame)[:bufsize])
+
+    def recv_into(self, buf):
+        n = len(self.frame)
+        buf[:n] = self.frame
+        return n
+
+    def send(self, data):
+        return len(data)
+
+
+def legacy_echo(sock, frame, ethertype):
+    # The echo path before the in-place rewrite, kept as the baseline.
+    if len(frame) < 14:
+        return None
+    dst_mac = frame[0:6]
+    src_mac = frame[6:12]
+    ethertype_field = struct.unpack('!H', frame[12:14])[0]
+    vlan_tag = None
+    actual_ethertype = ethertype_field
+    payload_offset = 14
+    if ethertype_field == ETH_P_8021Q and len(frame) >= 18:
+        vlan_tag = frame[14:18]
+        actual_ethertype = struct.unpack('!H', frame[16:18])[0]
+        payload_offset = 18
+    if actual_ethertype != ethertype:
+        return None
+    payload = frame[payload_offset:]
+    src_mac_str = binascii.hexlify(src_mac).decode()
+    if vlan_tag:
+        vlan_id = struct.unpack('!H', vlan_tag[2:])[0] & 0x0FFF
+        print(f"[VLAN {vlan_id}] Received frame from {src_mac_str}, size = {len(payload)}")
+        echo_frame = src_mac + dst_mac + vlan_tag + struct.pack('!H', actual_ethertype) + payload
+    else:
+        print(f"Received frame from {src_mac_str}, size = {len(payload)}")
+        echo_frame = src_mac + dst_mac + struct.pack('!H', actual_ethertype) + payload
+    sock.send(echo_frame)
+    print(f"Echoed back to {src_mac_str}")
+    return True
+
+def make_frame(payload_size, vlan_id=None, ethertype=DEFAULT_ETHERTYPE):
+    payload = os.urandom(payload_size)
+    if vlan_id is not None:
+        return DST_MAC + SRC_MAC + struct.pack('!HHH', ETH_P_8021Q, vlan_id, ethertype) + payload
+    return DST_MAC + SRC_MAC + struct.pack('!H', ethertype) + payload
+
+def make_test_frames(count, payload_size, vlan_id=None, flags=0):
+    # Echo-shaped frames carrying test headers with sequence numbers 0..count-1.
+    frame = bytearray(make_frame(payload_size, vlan_id))
+    offset = payload_offset(frame)
+    frames = []
+    for seq in range(count):
+        pack_test_header(frame, offset, client.RTT_FLOW, seq, seq, flags)
+        frames.append(bytes(frame))
+    return frames
+
+def timed(fn, frames):
+    start = time.perf_counter_ns()
+    fn(frames)
+    return (time.perf_counter_ns() - start) / frames
+
+def report(results, name, ns_per_frame):
+    results[name] = ns_per_frame
+    print(f"{name:<36} {ns_per_frame:10.1f} ns/frame {1e9 / ns_per_frame:12.0f} frames/s")
+
+def quiet():
+    # The legacy echo path and the client tests print; writing those lines
+    # costs more than the frame path itself, so print() is stubbed out while
+    # timing (the messages are still formatted).
+    silent = lambda *args, **kwargs: None
+    patches = [mock.patch.object(module, 'print', silent, create=True)
+               for module in (server, client, sys.modules[__name__])]
+    for patch in patches:
+        patch.start()
+    return patches
+
+def bench_build(results, frames, payload_size, vlan_id):
+    payload = os.urandom(payload_size)
+    frame = bytearray(client.build_frame(DST_MAC, SRC_MAC, DEFAULT_ETHERTYPE, payload, vlan_id))
+    offset = payload_offset(frame)
+
+    def build(n):
+        for _ in range(n):
+            client.build_frame(DST_MAC, SRC_MAC, DEFAULT_ETHERTYPE, payload, vlan_id)
+
+    def stamp(n):
+        for seq in range(n):
+            pack_test_header(frame, offset, client.RTT_FLOW, seq, seq)
+
+    def stamp_checksum(n):
+        for seq in range(n):
+            pack_test_header(frame, offset, client.INTEGRITY_FLOW, seq, seq, FLAG_CHECKSUM)
+
+    report(results, "build (build_frame)", timed(build, frames))
+    report(results, "build (test header)", timed(stamp, frames))
+    report(results, "build (test header + CRC32)", timed(stamp_checksum, frames))
+
+def bench_parse(results, frames, payload_size, vlan_id):
+    frame = make_test_frames(1, payload_size, vlan_id, FLAG_CHECKSUM)[0]
+
+    def server_header(n):
+        for _ in range(n):
+            server.frame_ethertype(frame)
+
+    def test_header(n):
+        for _ in range(n):
+            parse_test_header(frame)
+
+    def checksum(n):
+        for _ in range(n):
+            checksum_ok(frame)
+
+    report(results, "parse (server EtherType/VLAN)", timed(server_header, frames))
+    report(results, "parse (test header)", timed(test_header, frames))
+    report(results, "parse (CRC32 check)", timed(checksum, frames))
+
+def bench_echo(results, frames, payload_size, vlan_id, batch):
+    frame = make_frame(payload_size, vlan_id)
+    sock = NullSocket(frame)
+    table = CounterTable()
+
+    def legacy(n):
+        for _ in range(n):
+            legacy_echo(sock, sock.recv(65535), DEFAULT_ETHERTYPE)
+
+    def in_place(n):
+        buf = bytearray(server.RECV_BUF_SIZE)
+        view = memoryview(buf)
+        for _ in range(n):
+            size = sock.recv_into(buf)
+            server.echo_in_place(sock, view[:size], DEFAULT_ETHERTYPE, table=table)
+
+    # Real socket calls: the client end sends a batch with sendmmsg, the
+    # server end echoes each frame in place, the client drains the batch.
+    client_end, server_end = loopback_pair()
+    sender = MmsgSender(client_end, [frame], batch)
+    receiver = MmsgReceiver(client_end, batch)
+
+    def socketpair(n):
+        buf = bytearray(server.RECV_BUF_SIZE)
+        view = memoryview(buf)
+        for start in range(0, n, batch):
+            count = sender.send(min(batch, n - start))
+            for _ in range(count):
+                size = server_end.recv_into(buf)
+                server.echo_in_place(server_end, view[:size], DEFAULT_ETHERTYPE, table=table)
+            received = 0
+            while received < count:
+                received += receiver.recv()
+
+    patches = quiet()
+    try:
+        before = timed(legacy, frames)
+        after = timed(in_place, frames)
+    finally:
+        for patch in patches:
+            patch.stop()
+    report(results, "echo (copy, recvfrom)", before)
+    report(results, "echo (in place, recv_into)", after)
+    print(f"{'echo speedup':<36} {before / after:10.2f}x")
+    try:
+        report(results, "echo (socketpair round trip)", timed(socketpair, frames))
+    finally:
+        client_end.close()
+        server_end.close()
+
+def bench_match(results, frames, payload_size, vlan_id):
+    # The per-reply work of the client's receive loops, on prebuilt echoes.
+    echoes = make_test_frames(min(frames, 1 << 16), payload_size, vlan_id, FLAG_CHECKSUM)
+
+    def rtt(n):
+        stats = LatencyStats()
+        outstanding = {}
+        for i in range(n):
+            outstanding[i % len(echoes)] = 0
+            header = parse_test_header(echoes[i % len(echoes)])
+            if header is None or header[0] != client.RTT_FLOW:
+                continue
+            t_send = outstanding.pop(header[1], None)
+            if t_send is not None:
+                stats.add(header[1], i + 1000 - t_send)
+
+    def integrity(n):
+        tracker = SequenceTracker()
+        for i in range(n):
+            echoed = echoes[i % len(echoes)]
+            header = parse_test_header(echoed)
+            if header is None:
+                continue
+            if checksum_ok(echoed):
+                tracker.add(header[1] + i // len(echoes) * len(echoes))
+            else:
+                tracker.add_corrupted()
+
+    report(results, "match (RTT table + stats)", timed(rtt, frames))
+    report(results, "match (integrity: CRC + tracker)", timed(integrity, frames))
+
+def bench_e2e(results, frames, payload_size, vlan_id):
+    # The real client test against the real server connection loop.
+    client_end, server_end = loopback_pair()
+    table = CounterTable()
+    args = argparse.Namespace(stamp=False, debug=False)
+    echo = threading.Thread(target=server.connection_loop,
+                            args=(server_end, DEFAULT_ETHERTYPE, table, [table], args), daemon=True)
+    echo.start()
+    payload = os.urandom(payload_size)
+    patches = quiet()
+    try:
+        start = time.perf_counter_ns()
+        stats = client.integrity_test(client_end, client_end, DST_MAC, SRC_MAC, DEFAULT_ETHERTYPE, payload,
+                                      frames, timeout=0.2, vlan_id=vlan_id, filename=os.devnull)
+        elapsed = time.perf_counter_ns() - start
+    finally:
+        for patch in patches:
+            patch.stop()
+        client_end.close()
+        echo.join()
+    if stats['lost'] or stats['corrupted']:
+        print(f"e2e: {stats['lost']} lost, {stats['corrupted']} corrupted of {frames}")
+    report(results, "e2e (integrity_test, socketpair)", elapsed / frames)
+
+def compare(results, filename, tolerance):
+    with open(filename) as f:
+        baseline = json.load(f)
+    slower = []
+    print(f"\nCompared with {filename} (tolerance {tolerance:.0%}):")
+    for name, ns in results.items():
+        if name not in baseline:
+            continue
+        change = ns / baseline[name] - 1
+        flag = "  SLOWER" if change > tolerance else ""
+        print(f"{name:<36} {baseline[name]:10.1f} -> {ns:10.1f} ns/frame ({change:+.1%}){flag}")
+        if flag:
+            slower.append(name)
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="L2 frame-path microbenchmarks")
+    parser.add_argument('--frames', type=int, default=200000)
+    parser.add_argument('--payload', type=int, default=100)
+    parser.add_argument('--vlan', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=client.DEFAULT_BATCH)
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=SUITES, help="run only these paths")
+    parser.add_argument('--save', default=None, help="write ns/frame per path to this JSON file")
+    parser.add_argument('--compare', default=None, help="fail if slower than the results in this JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed slowdown for --compare (default {DEFAULT_TOLERANCE})")
+    args = parser.parse_args()
+
+    results = {}
+    if 'build' in args.only:
+        bench_build(results, args.frames, args.payload, args.vlan)
+    if 'parse' in args.only:
+        bench_parse(results, args.frames, args.payload, args.vlan)
+    if 'echo' in args.only:
+        bench_echo(results, args.frames, args.payload, args.vlan, args.batch)
+    if 'match' in args.only:
+        bench_match(results, args.frames, args.payload, args.vlan)
+    if 'e2e' in args.only:
+        bench_e2e(results, args.frames, args.payload, args.vlan)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        slower = compare(results, args.compare, args.tolerance)
+        if slower:
+            print(f"Regression: {', '.join(slower)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,222 +1,972 @@
-#!/usr/bin/env python3
-"""
-Enhanced Layer 2 Test Client
-Supports:
-- RTT measurement
-- Throughput test
-- Load test (stress)
-- Variable frame size test
-- Data integrity verification
-- VLAN tagging
-- Jitter analysis
-All results are saved in CSV format per test.
-"""
-import socket
-import struct
-import time
-import os
-import csv
-import fcntl
-import binascii
-import random
-from datetime import datetime
-
-# Constants
-ETH_P_ALL = 0x0003
-ETH_P_8021Q = 0x8100
-DEFAULT_ETHERTYPE = 0x88B5
-
-# Utility functions
-def get_src_mac(ifname):
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    info = fcntl.ioctl(s.fileno(), 0x8927, struct.pack('256s', ifname[:15].encode('utf-8')))
-    return info[18:24]
-
-def mac_str_to_bytes(mac_str):
-    return bytes(int(b, 16) for b in mac_str.split(':'))
-
-def bytes_to_mac_str(b):
-    return ':'.join(f'{x:02x}' for x in b)
-
-def generate_payload(size):
-    return os.urandom(size)
-
-def add_vlan_tag(dst_mac, src_mac, vlan_id, ethertype, payload):
-    vlan_header = struct.pack('!HH', ETH_P_8021Q, vlan_id)
-    return dst_mac + src_mac + vlan_header + struct.pack('!H', ethertype) + payload
-
-def build_frame(dst_mac, src_mac, ethertype, payload, vlan_id=None):
-    if vlan_id is not None:
-        return add_vlan_tag(dst_mac, src_mac, vlan_id, ethertype, payload)
-    return dst_mac + src_mac + struct.pack('!H', ethertype) + payload
-
-def save_csv(filename, header, rows):
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(header)
-        writer.writerows(rows)
-
-# Test functions
-def rtt_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count, interval):
-    results = []
-    frame = build_frame(dst_mac, src_mac, ethertype, payload)
-    recv_sock.settimeout(1.0)
-    print("Starting RTT test...")
-    for i in range(count):
-        t_send = time.time()
-        send_sock.send(frame)
-        try:
-            while True:
-                recv_frame, _ = recv_sock.recvfrom(65535)
-                if len(recv_frame) < 14:
-                    continue
-                r_dst, r_src, r_ethertype = recv_frame[:6], recv_frame[6:12], struct.unpack('!H', recv_frame[12:14])[0]
-                if r_src == dst_mac and r_dst == src_mac and r_ethertype == ethertype:
-                    if recv_frame[14:] == payload:
-                        t_recv = time.time()
-                        rtt = (t_recv - t_send) * 1000
-                        print(f"[{i+1}] RTT: {rtt:.3f} ms")
-                        results.append([i+1, rtt])
-                        break
-        except socket.timeout:
-            print(f"[{i+1}] Timeout")
-            results.append([i+1, 'timeout'])
-        time.sleep(interval)
-    save_csv('rtt_test.csv', ['Seq', 'RTT_ms'], results)
-
-def throughput_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, duration):
-    frame = build_frame(dst_mac, src_mac, ethertype, payload)
-    recv_sock.settimeout(1.0)
-    sent = 0
-    received = 0
-    print("Starting throughput test...")
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        send_sock.send(frame)
-        sent += 1
-        try:
-            recv_frame, _ = recv_sock.recvfrom(65535)
-            if recv_frame[6:12] == dst_mac:
-                received += 1
-        except socket.timeout:
-            pass
-    elapsed = time.time() - start_time
-    throughput = (received * len(payload) * 8) / elapsed
-    print(f"Sent: {sent}, Received: {received}, Throughput: {throughput:.2f} bps")
-    save_csv('throughput_test.csv', ['Sent', 'Received', 'Throughput_bps'], [[sent, received, throughput]])
-
-def jitter_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count, interval):
-    frame = build_frame(dst_mac, src_mac, ethertype, payload)
-    recv_sock.settimeout(1.0)
-    timestamps = []
-    print("Starting jitter test...")
-    for i in range(count):
-        t_send = time.time()
-        send_sock.send(frame)
-        try:
-            while True:
-                recv_frame, _ = recv_sock.recvfrom(65535)
-                if recv_frame[6:12] == dst_mac:
-                    t_recv = time.time()
-                    timestamps.append(t_recv - t_send)
-                    break
-        except socket.timeout:
-            pass
-        time.sleep(interval)
-    jitter_values = [abs(timestamps[i] - timestamps[i-1]) * 1000 for i in range(1, len(timestamps))]
-    save_csv('jitter_test.csv', ['Sample', 'Jitter_ms'], list(enumerate(jitter_values, start=1)))
-    print("Jitter test complete.")
-
-def integrity_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count):
-    frame = build_frame(dst_mac, src_mac, ethertype, payload)
-    recv_sock.settimeout(1.0)
-    errors = 0
-    print("Starting integrity test...")
-    for i in range(count):
-        send_sock.send(frame)
-        try:
-            recv_frame, _ = recv_sock.recvfrom(65535)
-            if recv_frame[14:] != payload:
-                errors += 1
-        except socket.timeout:
-            errors += 1
-    print(f"Total errors: {errors} out of {count}")
-    save_csv('integrity_test.csv', ['Sent', 'Errors'], [[count, errors]])
-
-def variable_frame_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, sizes):
-    results = []
-    recv_sock.settimeout(1.0)
-    print("Starting variable frame size test...")
-    for size in sizes:
-        payload = generate_payload(size)
-        frame = build_frame(dst_mac, src_mac, ethertype, payload)
-        send_sock.send(frame)
-        try:
-            recv_frame, _ = recv_sock.recvfrom(65535)
-            received = len(recv_frame)
-        except socket.timeout:
-            received = 0
-        results.append([size, received])
-    save_csv('frame_size_test.csv', ['Payload_Bytes', 'Received_Bytes'], results)
-
-def main():
-    interface = input("Enter interface name: ").strip()
-    dst_mac_str = input("Enter destination MAC address (e.g., aa:bb:cc:dd:ee:ff): ").strip()
-    vlan_input = input("Use VLAN? (y/n): ").lower().strip()
-    vlan_id = int(input("Enter VLAN ID (0-4095): ")) if vlan_input == 'y' else None
-
-    dst_mac = mac_str_to_bytes(dst_mac_str)
-    src_mac = get_src_mac(interface)
-
-    send_sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
-    send_sock.bind((interface, 0))
-    recv_sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(DEFAULT_ETHERTYPE))
-    recv_sock.bind((interface, 0))
-
-    while True:
-        print("\nAvailable Tests:")
-        print("1. RTT Test")
-        print("2. Throughput Test")
-        print("3. Jitter Test")
-        print("4. Integrity Test")
-        print("5. Variable Frame Size Test")
-        print("6. Exit")
-        choice = input("Select test: ").strip()
-
-        if choice == '1':
-            count = int(input("Enter packet count: "))
-            interval = float(input("Enter interval between packets (s): "))
-            payload = generate_payload(100)
-            rtt_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count, interval)
-
-        elif choice == '2':
-            duration = float(input("Enter test duration (s): "))
-            payload = generate_payload(500)
-            throughput_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, duration)
-
-        elif choice == '3':
-            count = int(input("Enter packet count: "))
-            interval = float(input("Enter interval between packets (s): "))
-            payload = generate_payload(100)
-            jitter_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count, interval)
-
-        elif choice == '4':
-            count = int(input("Enter packet count: "))
-            payload = generate_payload(100)
-            integrity_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count)
-
-        elif choice == '5':
-            sizes = [64, 128, 256, 512, 1024, 1500]
-            variable_frame_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, sizes)
-
-        elif choice == '6':
-            break
-
-        else:
-            print("Invalid selection.")
-
-    send_sock.close()
-    recv_sock.close()
-
-if __name__ == '__main__':
-    main()
+#!/usr/bin/env python3
+"""
+Enhanced Layer 2 Test Client
+Supports:
+- RTT measurement (kernel software/hardware timestamps when available)
+- One-way delay: uplink/downlink from server stamps, NTP-style clock offset
+  and drift estimation (see l2_owd.py)
+- Throughput test (batched sendmmsg/recvmmsg, concurrent TX and RX)
+- Rate-controlled load: target pps/bps held by a token-bucket pacer
+- RFC 2544 benchmark suite (see l2_rfc2544.py), JSON report
+- Load test (stress)
+- Variable frame size test
+- Data integrity verification (loss, reordering, duplicates, corruption)
+- VLAN tagging (ID and PCP)
+- Multi-flow load: N flows with their own MAC/VLAN/PCP/size over worker
+  processes, per-flow and aggregate stats (see l2_multiflow.py)
+- Priority isolation: critical probes vs. bulk load with different PCP and
+  SO_PRIORITY (see l2_priority.py)
+- Soak test: fixed load for hours/days, per-window pps/bps/loss/latency
+  streamed to CSV with flat memory (see l2_soak.py)
+- Jitter analysis (RFC 3550 interarrival jitter, IPDV)
+- Streaming latency percentiles (p50/p90/p99/p99.9/max); raw samples opt-in
+- Server counters: per-source frames/bytes/errors/drops queried from the
+  server after every test (see l2_counters.py)
+- Live OpenMetrics endpoint: frames/bytes sent, received and lost, and RTT
+  histograms, while tests run (see l2_metrics.py)
+- Path MTU discovery: binary search for the largest payload that echoes
+  intact, tagged and untagged; later tests keep their payloads within it
+  (see l2_pmtu.py)
+- Sampled pcapng capture of echoes (1-in-N, snap length), plus lost probes,
+  latency outliers and corrupted frames, with kernel timestamps where the
+  test has them (see l2_capture.py)
+- Transports: an AF_PACKET interface, or unix:<name> to reach a server
+  listening on a SOCK_SEQPACKET socket with no root (see l2_transport.py)
+All results are saved in CSV format per test.
+"""
+import socket
+import struct
+import time
+import os
+import csv
+import binascii
+import random
+import itertools
+from datetime import datetime
+
+from l2_capture import Capture, DEFAULT_SAMPLE as CAPTURE_SAMPLE
+from l2_counters import pack_stats_query, parse_stats_reply, STATS_ETHERTYPE
+from l2_loop import EventLoop
+from l2_metrics import REGISTRY as metrics, serve_metrics
+from l2_mmsg import MmsgSender, MmsgReceiver, HAVE_MMSG
+from l2_pacing import Pacer, parse_rate, format_report
+from l2_owd import OneWayDelay
+from l2_proto import (payload_offset, pack_test_header, parse_test_header, parse_server_stamps, checksum_ok,
+                      FLAG_CHECKSUM, FLAG_SERVER_STAMPS, TEST_HEADER)
+from l2_stats import SequenceTracker, LatencyStats
+import l2_transport
+from l2_timestamps import (enable_timestamps, disable_timestamps, read_tx_timestamps, scm_timestamp_ns,
+                           ANCILLARY_SIZE, SOURCES, SOURCE_SOFTWARE, SOURCE_USER)
+
+# Constants
+ETH_P_ALL = 0x0003
+ETH_P_8021Q = 0x8100
+DEFAULT_ETHERTYPE = 0x88B5
+DEFAULT_BATCH = 64
+DRAIN_TIME = 1.0  # seconds to keep receiving after the last frame was sent
+PROBE_TIMEOUT = 1.0  # default per-probe deadline before it counts as lost
+RTT_FLOW = 0
+INTEGRITY_FLOW = 1
+SIZE_FLOW = 2
+LOAD_PROBE_FLOW = 0xFFFF  # metrics label for latency probes embedded in a load stream
+LOAD_FIRST_FLOW = 0x8000  # load runs (throughput, RFC 2544 trials) take the next flow ID each
+LOAD_RUN_FLOWS = 0x7FFF
+STATS_TIMEOUT = 0.5  # seconds to wait for each page of a server stats reply
+LOAD_FLOW = 'load'  # metrics label for untagged load frames
+
+_load_runs = itertools.count()
+
+metrics.describe('client_frames_sent', "Test frames sent, by flow ID")
+metrics.describe('client_bytes_sent', "Test frame bytes sent, by flow ID")
+metrics.describe('client_frames_received', "Echoed test frames received, by flow ID")
+metrics.describe('client_bytes_received', "Echoed test frame bytes received, by flow ID")
+metrics.describe('client_frames_lost', "Test frames not echoed before their deadline, by flow ID")
+metrics.describe('client_rtt', "Round-trip time, by flow ID and timestamp source")
+
+# Utility functions
+def get_src_mac(ifname):
+    return l2_transport.source_mac(ifname)
+
+def mac_str_to_bytes(mac_str):
+    return bytes(int(b, 16) for b in mac_str.split(':'))
+
+def bytes_to_mac_str(b):
+    return ':'.join(f'{x:02x}' for x in b)
+
+def generate_payload(size):
+    return os.urandom(size)
+
+def add_vlan_tag(dst_mac, src_mac, vlan_id, ethertype, payload, pcp=0):
+    vlan_header = struct.pack('!HH', ETH_P_8021Q, (pcp & 0x7) << 13 | (vlan_id & 0x0FFF))
+    return dst_mac + src_mac + vlan_header + struct.pack('!H', ethertype) + payload
+
+def build_frame(dst_mac, src_mac, ethertype, payload, vlan_id=None, pcp=0):
+    if vlan_id is not None:
+        return add_vlan_tag(dst_mac, src_mac, vlan_id, ethertype, payload, pcp)
+    return dst_mac + src_mac + struct.pack('!H', ethertype) + payload
+
+def fit_payload(size, limit):
+    # Keep a payload within the path limit found by Path MTU discovery.
+    if limit is None or size <= limit:
+        return size
+    print(f"Payload {size} bytes exceeds the path limit, using {limit}")
+    return limit
+
+def fit_sizes(sizes, limit, overhead=0):
+    """Sizes (payload + overhead) within limit; if any were cut, the largest size that fits is added."""
+    if limit is None:
+        return sizes
+    fitting = [size for size in sizes if size - overhead <= limit]
+    if len(fitting) < len(sizes):
+        print(f"Skipping sizes above the path limit ({limit}-byte payload): "
+              f"{', '.join(str(size) for size in sizes if size - overhead > limit)}")
+        if limit + overhead not in fitting:
+            fitting.append(limit + overhead)
+    return fitting
+
+def open_test_sockets(interface, dst_mac, ethertype=DEFAULT_ETHERTYPE):
+    # On a unix: link both are the same connected socket.
+    return l2_transport.open_test_sockets(interface, dst_mac, ethertype)
+
+def sibling_filename(filename, suffix):
+    # Secondary output next to a test's own file: rtt_test.csv -> rtt_test_owd.csv
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{suffix}{ext or '.csv'}"
+
+def save_csv(filename, header, rows):
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def ask_timestamp_source():
+    source = input(f"Timestamp source ({'/'.join(SOURCES)}) [{SOURCE_SOFTWARE}]: ").strip().lower()
+    return source if source in SOURCES else SOURCE_SOFTWARE
+
+def ask_capture(interface):
+    filename = input("Capture frames to pcapng file (empty = off): ").strip()
+    if not filename:
+        return None
+    sample = input(f"Capture 1 in N echoes (0 = lost/outliers/corrupted only) [{CAPTURE_SAMPLE}]: ").strip()
+    snaplen = input("Bytes kept per frame (e.g., 64 for headers only, empty = whole frame): ").strip()
+    outlier = input("Also capture echoes with RTT above (ms, empty = off): ").strip()
+    return Capture(filename, int(sample) if sample else CAPTURE_SAMPLE, int(snaplen) if snaplen else 0,
+                   interface, int(float(outlier) * 1e6) if outlier else None)
+
+def interval_pacer(interval):
+    # Probe tests: strictly spaced probes, at most one sent late to catch up.
+    return Pacer(1.0 / interval, burst=1) if interval > 0 else None
+
+def send_probes(send_sock, recv_sock, frame, count, interval, timeout, flow_id, timestamps, on_sample=None,
+                one_way=None, capture=None):
+    # Pipelined: probes are sent on schedule without waiting for replies, each
+    # carrying a test header (flow, sequence, TX timestamp). Replies are matched
+    # by sequence number against the table of outstanding probes, so any number
+    # of probes can be in flight and matching never compares payloads.
+    # With kernel timestamps the RTT is taken between the kernel's TX stamp
+    # (read back from the error queue) and its RX stamp; a probe missing
+    # either falls back to the perf_counter_ns() stamps taken in Python.
+    # Samples are streamed into one LatencyStats per timestamp source, and a
+    # probe's state is dropped once it is answered or its deadline in the
+    # receive loop's timer heap passes, so a lost probe costs `timeout` and
+    # memory is bounded by rate x timeout, not by count. on_sample(seq,
+    # rtt_ns, source) sees every sample (raw dumps).
+    # With one_way (a dict) the probes ask the server for RX/echo stamps, and
+    # one OneWayDelay per timestamp source is filled in it. The server stamps
+    # with CLOCK_REALTIME, so perf_counter_ns() stamps are shifted onto the
+    # realtime clock for the estimator (the RTT stays on the monotonic clock).
+    # With capture (an l2_capture.Capture) replies are sampled into it, and
+    # every lost probe and every reply above its outlier threshold is recorded.
+    # Returns ({source: LatencyStats}, replies received, source in effect, pacer).
+    if timestamps != SOURCE_USER and not l2_transport.kernel_timestamps(send_sock):
+        print("Kernel timestamps need an AF_PACKET interface, using perf_counter_ns()")
+        timestamps = SOURCE_USER
+    source = enable_timestamps(send_sock, recv_sock, timestamps)
+    kernel = source != SOURCE_USER
+    frame = bytearray(frame)
+    offset = payload_offset(frame)
+    timeout_ns = int(timeout * 1e9)
+    outstanding = {}           # seq -> user-space TX time
+    tx_stamps = {}             # seq -> kernel TX stamp, until the reply arrives
+    pending = {}               # seq -> (kernel RX stamp, user TX, user RX, server stamps), waiting for the TX stamp
+    stats = {}
+    rx = {'received': 0, 'sending': True}
+    loop = EventLoop()
+    realtime_shift = time.time_ns() - time.perf_counter_ns()
+
+    def emit(seq, t_tx, t_rx, sample_source, server):
+        rtt_ns = t_rx - t_tx
+        sample_stats = stats.get(sample_source)
+        if sample_stats is None:
+            sample_stats = stats[sample_source] = LatencyStats()
+        sample_stats.add(seq, rtt_ns)
+        metrics.observe('client_rtt', rtt_ns, flow=flow_id, source=sample_source)
+        if server is not None:
+            estimator = one_way.get(sample_source)
+            if estimator is None:
+                estimator = one_way[sample_source] = OneWayDelay()
+            if sample_source == SOURCE_USER:
+                t_tx += realtime_shift
+                t_rx += realtime_shift
+            estimator.add(seq, t_tx, server[0], server[1], t_rx)
+        if on_sample:
+            on_sample(seq, rtt_ns, sample_source)
+
+    def collect_tx_stamps():
+        for looped, stamp in read_tx_timestamps(send_sock, source):
+            header = parse_test_header(looped)
+            if header is None or header[0] != flow_id:
+                continue
+            waiting = pending.pop(header[1], None)
+            if waiting is not None:
+                emit(header[1], stamp, waiting[0], source, waiting[3])
+            elif header[1] in outstanding:
+                tx_stamps[header[1]] = stamp
+
+    def check_done():
+        if not rx['sending'] and not outstanding:
+            loop.stop()
+
+    def expire(seq):
+        waiting = pending.pop(seq, None)
+        if waiting is not None:
+            emit(seq, waiting[1], waiting[2], SOURCE_USER, waiting[3])
+        else:
+            t_send = outstanding.pop(seq, None)
+            if t_send is None:
+                return
+            tx_stamps.pop(seq, None)
+            metrics.inc('client_frames_lost', flow=flow_id)
+            if capture is not None:
+                lost = bytearray(frame)
+                pack_test_header(lost, offset, flow_id, seq, t_send, flags)
+                # Placed at its send time on the wall clock.
+                capture.trigger(lost, time.time_ns() - (time.perf_counter_ns() - t_send),
+                                f"lost: probe {seq} not echoed within {timeout:g} s")
+            check_done()
+
+    receiver = MmsgReceiver(recv_sock, DEFAULT_BATCH, control_size=ANCILLARY_SIZE if kernel else 0)
+
+    def on_readable():
+        t_recv = time.perf_counter_ns()
+        for i in range(receiver.recv()):
+            echoed = receiver.frame(i)
+            header = parse_test_header(echoed)
+            if header is None or header[0] != flow_id:
+                continue
+            seq = header[1]
+            t_send = outstanding.pop(seq, None)
+            if t_send is None:
+                continue
+            rx['received'] += 1
+            metrics.inc('client_frames_received', flow=flow_id)
+            metrics.inc('client_bytes_received', len(echoed), flow=flow_id)
+            server = parse_server_stamps(echoed) if one_way is not None else None
+            rx_stamp = scm_timestamp_ns(receiver.ancillary(i), source) if kernel else None
+            if capture is not None:
+                # Hardware stamps are on the NIC's clock, not the wall clock.
+                capture.offer(echoed, rx_stamp if source == SOURCE_SOFTWARE else None, t_recv - t_send)
+            if rx_stamp is None:
+                emit(seq, t_send, t_recv, SOURCE_USER, server)
+                continue
+            tx_stamp = tx_stamps.pop(seq, None)
+            if tx_stamp is not None:
+                emit(seq, tx_stamp, rx_stamp, source, server)
+            else:
+                pending[seq] = (rx_stamp, t_send, t_recv, server)
+        check_done()
+
+    loop.add_reader(recv_sock, on_readable)
+    if kernel:
+        # TX timestamps are signalled as an error condition on the sending socket.
+        loop.add_reader(send_sock, collect_tx_stamps)
+    rx_thread = loop.run_in_thread()
+    pacer = interval_pacer(interval)
+    flags = FLAG_SERVER_STAMPS if one_way is not None else 0
+    try:
+        for seq in range(count):
+            if pacer:
+                pacer.wait()
+            t_send = time.perf_counter_ns()
+            pack_test_header(frame, offset, flow_id, seq, t_send, flags)
+            outstanding[seq] = t_send
+            loop.call_at(t_send + timeout_ns, expire, seq)
+            send_sock.send(frame)
+            metrics.inc('client_frames_sent', flow=flow_id)
+            metrics.inc('client_bytes_sent', len(frame), flow=flow_id)
+        rx['sending'] = False
+        loop.call_at(0, check_done)
+        rx_thread.join()
+        if kernel:
+            collect_tx_stamps()
+        for seq, (_, t_send, t_recv, server) in pending.items():
+            emit(seq, t_send, t_recv, SOURCE_USER, server)
+    finally:
+        loop.stop()
+        rx_thread.join()
+        loop.close()
+        if kernel:
+            disable_timestamps(send_sock, recv_sock)
+    return stats, rx['received'], source, pacer
+
+def format_timestamp_source(stats, source):
+    if source == SOURCE_USER:
+        return "Timestamp source: user (perf_counter_ns)"
+    total = sum(s.latency.count for s in stats.values())
+    kernel = stats[source].latency.count if source in stats else 0
+    return (f"Timestamp source: {source} (kernel) for {kernel}/{total} samples"
+            + (f", {total - kernel} fell back to user (perf_counter_ns)" if kernel < total else ""))
+
+def ms(value_ns):
+    return value_ns / 1e6 if value_ns is not None else ''
+
+def format_latency(name, source, summary):
+    return (f"{name} ({source}) min/p50/p90/p99/p99.9/max: "
+            + '/'.join(f"{ms(summary[k]):.3f}" for k in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max'))
+            + f" ms, mean {ms(summary['mean']):.3f} ms")
+
+def format_jitter(summary):
+    ipdv = ('/'.join(f"{ms(summary[k]):.3f}" for k in ('ipdv_p50', 'ipdv_p99', 'ipdv_max'))
+            if summary['ipdv_max'] is not None else 'n/a')
+    return f"Jitter (RFC 3550): {ms(summary['jitter']):.3f} ms, IPDV p50/p99/max: {ipdv} ms"
+
+def report_one_way(estimators, filename='owd_test.csv'):
+    if not estimators:
+        print("No server stamps in the replies; start the server with --stamp for one-way delay")
+        return {}
+    rows = []
+    summaries = {}
+    for sample_source, estimator in estimators.items():
+        summary = summaries[sample_source] = estimator.finish()
+        print(f"One-way delay ({sample_source}): clock offset {summary['offset_ns'] / 1e6:.3f} ms, "
+              f"drift {summary['drift_ppm']:+.2f} ppm ({summary['windows']} min-filter windows)")
+        for direction in ('uplink', 'downlink'):
+            direction_summary = summary[direction]
+            print(format_latency(direction.capitalize(), sample_source, direction_summary))
+            print(f"  {format_jitter(direction_summary)}")
+            rows.append([sample_source, direction, direction_summary['count']]
+                        + [ms(direction_summary[k]) for k in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max', 'mean',
+                                                              'jitter', 'ipdv_p50', 'ipdv_p99', 'ipdv_max')]
+                        + [summary['offset_ns'] / 1e6, summary['drift_ppm']])
+        print(f"  Server residence p50/max: {ms(summary['server']['p50']):.3f}/{ms(summary['server']['max']):.3f} ms")
+    print("  (the minimum delay is split evenly between directions; variation above it is per direction)")
+    save_csv(filename,
+             ['Timestamp_source', 'Direction', 'Count', 'Min_ms', 'P50_ms', 'P90_ms', 'P99_ms', 'P99.9_ms',
+              'Max_ms', 'Mean_ms', 'Jitter_ms', 'IPDV_p50_ms', 'IPDV_p99_ms', 'IPDV_max_ms', 'Clock_offset_ms',
+              'Drift_ppm'], rows)
+    return summaries
+
+def open_sample_dump(filename):
+    # Raw samples are opt-in; they are written as they arrive, not kept.
+    f = open(filename, 'w', newline='')
+    writer = csv.writer(f)
+    writer.writerow(['Seq', 'RTT_ms', 'Timestamp_source'])
+    return f, lambda seq, rtt_ns, source: writer.writerow([seq + 1, rtt_ns / 1e6, source])
+
+# Test functions
+def rtt_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count, interval,
+             timeout=PROBE_TIMEOUT, flow_id=RTT_FLOW, timestamps=SOURCE_SOFTWARE, dump_raw=False, one_way=False,
+             vlan_id=None, filename='rtt_test.csv', capture=None):
+    # With one_way the server (started with --stamp) stamps RX and echo times
+    # into the probes and uplink/downlink delay are reported separately.
+    frame = build_frame(dst_mac, src_mac, ethertype, payload, vlan_id)
+    shown = {} if count <= 100 else None  # per-probe lines only for short runs
+    samples_file = sibling_filename(filename, 'samples')
+    dump, write_sample = open_sample_dump(samples_file) if dump_raw else (None, None)
+
+    def on_sample(seq, rtt_ns, source):
+        if shown is not None:
+            shown[seq] = rtt_ns
+        if write_sample:
+            write_sample(seq, rtt_ns, source)
+
+    estimators = {} if one_way else None
+    print("Starting RTT test...")
+    try:
+        stats, received, source, pacer = send_probes(send_sock, recv_sock, frame, count, interval, timeout,
+                                                     flow_id, timestamps, on_sample, estimators, capture)
+    finally:
+        if dump:
+            dump.close()
+
+    if shown is not None:
+        for seq in range(count):
+            print(f"[{seq + 1}] RTT: {shown[seq] / 1e6:.3f} ms" if seq in shown else f"[{seq + 1}] Timeout")
+    print(f"Received {received}/{count}, Lost: {count - received}")
+    rows = []
+    summaries = {}
+    for sample_source, sample_stats in stats.items():
+        summary = summaries[sample_source] = sample_stats.summary()
+        print(format_latency('RTT', sample_source, summary))
+        print(format_jitter(summary))
+        rows.append([sample_source, summary['count']]
+                    + [ms(summary[k]) for k in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max', 'mean',
+                                                'jitter', 'ipdv_p50', 'ipdv_p99', 'ipdv_max')])
+    print(format_timestamp_source(stats, source))
+    one_way_summaries = report_one_way(estimators, sibling_filename(filename, 'owd')) if one_way else None
+    if pacer:
+        print(format_report(pacer.report()))
+    save_csv(filename,
+             ['Timestamp_source', 'Count', 'Min_ms', 'P50_ms', 'P90_ms', 'P99_ms', 'P99.9_ms', 'Max_ms',
+              'Mean_ms', 'Jitter_ms', 'IPDV_p50_ms', 'IPDV_p99_ms', 'IPDV_max_ms'], rows)
+    if dump_raw:
+        print(f"Raw samples written to {samples_file}")
+    return {'sent': count, 'received': received, 'lost': count - received, 'timestamp_source': source,
+            'latency': summaries, 'one_way': one_way_summaries}
+
+def flush_socket(sock):
+    # Discard frames already queued, e.g. late echoes of an earlier trial.
+    while True:
+        try:
+            sock.recv(65535, socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return
+
+def run_load(send_sock, recv_sock, frame, duration=None, rate_pps=None, batch=DEFAULT_BATCH,
+             drain=DRAIN_TIME, max_frames=None, probe_interval=None, capture=None):
+    # Transmit and receive run concurrently: TX pushes batches with sendmmsg()
+    # until duration elapses or max_frames are sent, RX drains echoes with
+    # recvmmsg() in its own thread, so the result reflects the path capacity
+    # rather than the RTT. With rate_pps set, TX is paced to that rate instead
+    # of running flat out. With probe_interval set, a latency probe is sent
+    # every probe_interval seconds inside the stream.
+    # Every frame carries a test header with a flow ID of its own for this
+    # run, so only this run's echoes are counted (a SequenceTracker handles
+    # loss, reordering and duplicates) and late echoes of an earlier trial
+    # cannot pass for this one's.
+    # After TX the receive loop drains for up to `drain` seconds, and stops
+    # as soon as every frame has come back. With capture, echoes are sampled
+    # into it.
+    flow_id = LOAD_FIRST_FLOW + next(_load_runs) % LOAD_RUN_FLOWS
+    offset = payload_offset(frame)
+    if len(frame) - offset < TEST_HEADER.size:
+        raise ValueError(f"load payloads need at least {TEST_HEADER.size} bytes for the test header")
+    flush_socket(recv_sock)
+    sender = MmsgSender(send_sock, [frame], batch)
+    receiver = MmsgReceiver(recv_sock, batch)
+    loop = EventLoop()
+    tracker = SequenceTracker()
+    rx = {'expected': None}
+    probe_sent = {}     # seq -> (probe number, send time) of the probes still in flight
+    latency = LatencyStats()
+
+    def on_readable():
+        n = receiver.recv()
+        t_recv = time.perf_counter_ns()
+        matched = 0
+        for i in range(n):
+            echoed = receiver.frame(i)
+            header = parse_test_header(echoed)
+            if header is None or header[0] != flow_id:
+                continue
+            tracker.add(header[1])
+            matched += 1
+            if capture is not None:
+                capture.offer(echoed)
+            probe = probe_sent.pop(header[1], None)
+            if probe is not None:
+                t_send = probe[1]
+                # Numbered by probe, so IPDV sees consecutive probes as such.
+                latency.add(probe[0], t_recv - t_send)
+                metrics.observe('client_rtt', t_recv - t_send, flow=LOAD_PROBE_FLOW, source=SOURCE_USER)
+        metrics.inc('client_frames_received', matched, flow=LOAD_FLOW)
+        metrics.inc('client_bytes_received', matched * len(frame), flow=LOAD_FLOW)
+        check_done()
+
+    def check_done():
+        if rx['expected'] is not None and tracker.received >= rx['expected']:
+            loop.stop()
+
+    loop.add_reader(recv_sock, on_readable)
+    rx_thread = loop.run_in_thread()
+
+    pacer = Pacer(rate_pps) if rate_pps else None
+    count = pacer.batch_size(batch) if pacer else batch
+    probe = bytearray(frame)
+    probes = 0
+    next_probe = time.perf_counter()
+    sent = 0
+    start_time = time.perf_counter()
+    try:
+        while True:
+            if duration is not None and time.perf_counter() - start_time >= duration:
+                break
+            if max_frames is not None:
+                if sent >= max_frames:
+                    break
+                count = min(count, max_frames - sent)
+            if pacer:
+                pacer.wait(count)
+            t_send = time.perf_counter_ns()
+            for i in range(count):
+                pack_test_header(sender.buffers[i], offset, flow_id, sent + i, t_send)
+            n = sender.send(count)
+            sent += n
+            metrics.inc('client_frames_sent', n, flow=LOAD_FLOW)
+            metrics.inc('client_bytes_sent', n * len(frame), flow=LOAD_FLOW)
+            if probe_interval and time.perf_counter() >= next_probe:
+                t_send = time.perf_counter_ns()
+                pack_test_header(probe, offset, flow_id, sent, t_send)
+                probe_sent[sent] = (probes, t_send)
+                loop.call_later(PROBE_TIMEOUT, probe_sent.pop, sent, None)
+                send_sock.send(probe)
+                probes += 1
+                sent += 1
+                next_probe += probe_interval
+        tx_elapsed = time.perf_counter() - start_time
+
+        rx['expected'] = sent
+        loop.call_at(0, check_done)
+        loop.call_later(drain, loop.stop)
+        rx_thread.join()
+    finally:
+        loop.stop()
+        rx_thread.join()
+        loop.close()
+    stats = tracker.finish(sent - 1)
+    metrics.inc('client_frames_lost', stats['lost'], flow=LOAD_FLOW)
+    return {
+        'sent': sent,
+        'received': stats['received'],
+        'stats': stats,
+        'tx_elapsed': tx_elapsed,
+        'pacing': pacer.report() if pacer else None,
+        'latency': latency,
+        'probes_sent': probes,
+    }
+
+def throughput_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, duration,
+                    batch=DEFAULT_BATCH, drain=DRAIN_TIME, rate_pps=None, vlan_id=None,
+                    filename='throughput_test.csv', capture=None):
+    frame = build_frame(dst_mac, src_mac, ethertype, payload, vlan_id)
+    print(f"Starting throughput test ({'sendmmsg/recvmmsg' if HAVE_MMSG else 'send/recv'})...")
+    result = run_load(send_sock, recv_sock, frame, duration, rate_pps, batch, drain, capture=capture)
+    sent = result['sent']
+    received = result['received']
+    tx_elapsed = result['tx_elapsed']
+    lost = max(sent - received, 0)
+    loss_pct = (lost / sent * 100) if sent else 0.0
+    payload_bits = len(payload) * 8
+    offered_pps = sent / tx_elapsed
+    delivered_pps = received / tx_elapsed
+    offered_bps = offered_pps * payload_bits
+    delivered_bps = delivered_pps * payload_bits
+    print(f"Sent: {sent}, Received: {received}, Lost: {lost} ({loss_pct:.2f}%)")
+    print(f"Offered load: {offered_bps:.2f} bps ({offered_pps:.0f} pps), "
+          f"Delivered load: {delivered_bps:.2f} bps ({delivered_pps:.0f} pps)")
+    pacing = result['pacing']
+    if pacing:
+        print(format_report(pacing))
+    save_csv(filename,
+             ['Sent', 'Received', 'Lost', 'Loss_pct', 'Offered_bps', 'Delivered_bps', 'Offered_pps', 'Delivered_pps',
+              'Target_pps', 'Pacing_mean_error_us', 'Pacing_max_error_us'],
+             [[sent, received, lost, loss_pct, offered_bps, delivered_bps, offered_pps, delivered_pps,
+               pacing['target_pps'] if pacing else '',
+               pacing['mean_abs_error_us'] if pacing else '',
+               pacing['max_abs_error_us'] if pacing else '']])
+    return {'sent': sent, 'received': received, 'lost': lost, 'loss_pct': loss_pct, 'offered_pps': offered_pps,
+            'delivered_pps': delivered_pps, 'offered_bps': offered_bps, 'delivered_bps': delivered_bps,
+            'pacing': pacing}
+
+def jitter_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count, interval,
+                timeout=PROBE_TIMEOUT, flow_id=RTT_FLOW, timestamps=SOURCE_SOFTWARE, dump_raw=False,
+                vlan_id=None, filename='jitter_test.csv', capture=None):
+    frame = build_frame(dst_mac, src_mac, ethertype, payload, vlan_id)
+    dump, write_sample = open_sample_dump(sibling_filename(filename, 'samples')) if dump_raw else (None, None)
+    print("Starting jitter test...")
+    try:
+        stats, received, source, pacer = send_probes(send_sock, recv_sock, frame, count, interval, timeout,
+                                                     flow_id, timestamps, write_sample, capture=capture)
+    finally:
+        if dump:
+            dump.close()
+    if pacer:
+        print(format_report(pacer.report()))
+    # Kernel and user-space RTTs are not comparable, so jitter and IPDV are
+    # kept per timestamp source.
+    rows = []
+    summaries = {}
+    for sample_source, sample_stats in stats.items():
+        summary = summaries[sample_source] = sample_stats.summary()
+        print(f"[{sample_source}] {format_jitter(summary)}")
+        rows.append([sample_source, summary['count'], ms(summary['jitter']),
+                     ms(summary['ipdv_p50']), ms(summary['ipdv_p99']), ms(summary['ipdv_max'])])
+    print(f"Received {received}/{count}")
+    print(format_timestamp_source(stats, source))
+    save_csv(filename,
+             ['Timestamp_source', 'Count', 'Jitter_ms', 'IPDV_p50_ms', 'IPDV_p99_ms', 'IPDV_max_ms'], rows)
+    print("Jitter test complete.")
+    return {'sent': count, 'received': received, 'lost': count - received, 'timestamp_source': source,
+            'latency': summaries}
+
+def integrity_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, payload, count,
+                   rate_pps=None, timeout=PROBE_TIMEOUT, flow_id=INTEGRITY_FLOW, vlan_id=None,
+                   filename='integrity_test.csv', capture=None):
+    # Every frame carries a sequence number and a CRC32 of its payload. The
+    # receiver keeps a sliding-window tracker per flow, so loss, reordering,
+    # duplication and corruption are told apart in constant memory.
+    frame = bytearray(build_frame(dst_mac, src_mac, ethertype, payload, vlan_id))
+    offset = payload_offset(frame)
+    trackers = {}
+    loop = EventLoop()
+    receiver = MmsgReceiver(recv_sock, DEFAULT_BATCH)
+
+    def on_readable():
+        for i in range(receiver.recv()):
+            echoed = receiver.frame(i)
+            header = parse_test_header(echoed)
+            if header is None:
+                continue
+            metrics.inc('client_frames_received', flow=header[0])
+            metrics.inc('client_bytes_received', len(echoed), flow=header[0])
+            tracker = trackers.get(header[0])
+            if tracker is None:
+                tracker = trackers[header[0]] = SequenceTracker()
+            if checksum_ok(echoed):
+                tracker.add(header[1])
+                if capture is not None:
+                    capture.offer(echoed)
+            else:
+                tracker.add_corrupted()
+                if capture is not None:
+                    capture.trigger(echoed, comment=f"corrupted: flow {header[0]} seq {header[1]} fails CRC32")
+        tracker = trackers.get(flow_id)
+        if tracker and tracker.received + tracker.corrupted >= count:
+            loop.stop()
+
+    loop.add_reader(recv_sock, on_readable)
+    rx_thread = loop.run_in_thread()
+    pacer = Pacer(rate_pps) if rate_pps else None
+    print("Starting integrity test...")
+    try:
+        for seq in range(count):
+            if pacer:
+                pacer.wait()
+            pack_test_header(frame, offset, flow_id, seq, time.perf_counter_ns(), FLAG_CHECKSUM)
+            send_sock.send(frame)
+            metrics.inc('client_frames_sent', flow=flow_id)
+            metrics.inc('client_bytes_sent', len(frame), flow=flow_id)
+        # Frames still missing `timeout` after the last one was sent are lost.
+        loop.call_later(timeout, loop.stop)
+        rx_thread.join()
+    finally:
+        loop.stop()
+        rx_thread.join()
+        loop.close()
+
+    tracker = trackers.pop(flow_id, None) or SequenceTracker()
+    stats = tracker.finish(count - 1)
+    metrics.inc('client_frames_lost', stats['lost'], flow=flow_id)
+    print(f"Sent: {count}, Received: {stats['received']}, Lost: {stats['lost']}, "
+          f"Reordered: {stats['reordered']} (max displacement {stats['max_displacement']}), "
+          f"Duplicates: {stats['duplicates']}, Late: {stats['late']}, Corrupted: {stats['corrupted']}")
+    if trackers:
+        print(f"Ignored frames from other flows: {sorted(trackers)}")
+    save_csv(filename,
+             ['Sent', 'Received', 'Lost', 'Reordered', 'Max_displacement', 'Duplicates', 'Late', 'Corrupted'],
+             [[count, stats['received'], stats['lost'], stats['reordered'], stats['max_displacement'],
+               stats['duplicates'], stats['late'], stats['corrupted']]])
+    return dict(stats, sent=count)
+
+def variable_frame_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, sizes,
+                        timeout=PROBE_TIMEOUT, flow_id=SIZE_FLOW, vlan_id=None, filename='frame_size_test.csv'):
+    # All sizes are sent back to back, each tagged with its index as sequence
+    # number; a size whose echo misses its deadline is recorded as 0 bytes.
+    if not sizes:
+        raise ValueError("no frame sizes to test")
+    if min(sizes) < TEST_HEADER.size:
+        raise ValueError(f"payload sizes below {TEST_HEADER.size} bytes leave no room for the test header")
+    received = {}
+    outstanding = set(range(len(sizes)))
+    loop = EventLoop()
+    receiver = MmsgReceiver(recv_sock, DEFAULT_BATCH, snaplen=max(sizes) + 64)
+
+    def expire(seq):
+        if seq in outstanding and seq not in received:
+            metrics.inc('client_frames_lost', flow=flow_id)
+        outstanding.discard(seq)
+        if not outstanding:
+            loop.stop()
+
+    def on_readable():
+        for i in range(receiver.recv()):
+            echoed = receiver.frame(i)
+            header = parse_test_header(echoed)
+            if header is not None and header[0] == flow_id and header[1] in outstanding:
+                received[header[1]] = len(echoed)
+                metrics.inc('client_frames_received', flow=flow_id)
+                metrics.inc('client_bytes_received', len(echoed), flow=flow_id)
+                expire(header[1])
+
+    loop.add_reader(recv_sock, on_readable)
+    rx_thread = loop.run_in_thread()
+    print("Starting variable frame size test...")
+    try:
+        for seq, size in enumerate(sizes):
+            frame = bytearray(build_frame(dst_mac, src_mac, ethertype, generate_payload(size), vlan_id))
+            t_send = time.perf_counter_ns()
+            pack_test_header(frame, payload_offset(frame), flow_id, seq, t_send)
+            loop.call_at(t_send + int(timeout * 1e9), expire, seq)
+            send_sock.send(frame)
+            metrics.inc('client_frames_sent', flow=flow_id)
+            metrics.inc('client_bytes_sent', len(frame), flow=flow_id)
+        rx_thread.join()
+    finally:
+        loop.stop()
+        rx_thread.join()
+        loop.close()
+    results = [[size, received.get(seq, 0)] for seq, size in enumerate(sizes)]
+    save_csv(filename, ['Payload_Bytes', 'Received_Bytes'], results)
+    return [{'payload_size': size, 'received_bytes': received_bytes} for size, received_bytes in results]
+
+def fetch_server_stats(interface, dst_mac, src_mac, timeout=STATS_TIMEOUT, limit=None):
+    """Query the server's per-source counters; returns a list of entries, or None if it does not answer.
+
+    Reply pages are kept within limit (the payload limit from Path MTU
+    discovery), else within the interface MTU.
+    """
+    try:
+        sock = l2_transport.open_protocol_socket(interface, STATS_ETHERTYPE)
+    except OSError:
+        return None
+    max_payload = limit or l2_transport.interface_mtu(interface)
+    entries = []
+    try:
+        while True:
+            sock.send(dst_mac + src_mac + struct.pack('!H', STATS_ETHERTYPE)
+                      + pack_stats_query(len(entries), max_payload))
+            deadline = time.perf_counter() + timeout
+            reply = None
+            while reply is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                sock.settimeout(remaining)
+                try:
+                    frame = sock.recv(65535)
+                except socket.timeout:
+                    return None
+                if frame[6:12] != dst_mac:
+                    continue
+                reply = parse_stats_reply(frame[payload_offset(frame):])
+                if reply is not None and reply[0] != len(entries):
+                    reply = None
+            _, total, page = reply
+            entries += page
+            if not page or len(entries) >= total:
+                return entries
+    finally:
+        sock.close()
+
+def report_server_stats(interface, dst_mac, src_mac, own_only=False, filename='server_stats.csv', limit=None):
+    # Counters are cumulative since the server started. own_only prints just
+    # what the server saw from this client (one line per VLAN).
+    entries = fetch_server_stats(interface, dst_mac, src_mac, limit=limit)
+    if entries is None:
+        print("Server did not answer the stats query")
+        return None
+    if own_only:
+        for mac, vlan_id, frames, nbytes, errors, drops in entries:
+            if mac == src_mac:
+                vlan = f" VLAN {vlan_id}" if vlan_id is not None else ""
+                print(f"Server counters for us{vlan}: frames {frames}, bytes {nbytes}, "
+                      f"errors {errors}, drops {drops}")
+        return entries
+    print(f"Server counters ({len(entries)} sources):")
+    rows = []
+    for mac, vlan_id, frames, nbytes, errors, drops in entries:
+        vlan = vlan_id if vlan_id is not None else ''
+        print(f"  {bytes_to_mac_str(mac)} VLAN {vlan or '-':<5} frames {frames:<10} bytes {nbytes:<12} "
+              f"errors {errors:<6} drops {drops}")
+        rows.append([bytes_to_mac_str(mac), vlan, frames, nbytes, errors, drops])
+    save_csv(filename, ['Src_MAC', 'VLAN', 'Frames', 'Bytes', 'Errors', 'Drops'], rows)
+    return entries
+
+def main():
+    interface = input("Enter interface name: ").strip()
+    dst_mac_str = input("Enter destination MAC address (e.g., aa:bb:cc:dd:ee:ff): ").strip()
+    vlan_input = input("Use VLAN? (y/n): ").lower().strip()
+    vlan_id = int(input("Enter VLAN ID (0-4095): ")) if vlan_input == 'y' else None
+    metrics_port = input("Serve live metrics on port (empty = off): ").strip()
+    if metrics_port:
+        serve_metrics(int(metrics_port))
+
+    dst_mac = mac_str_to_bytes(dst_mac_str)
+    src_mac = get_src_mac(interface)
+
+    try:
+        send_sock, recv_sock = open_test_sockets(interface, dst_mac)
+    except PermissionError:
+        print("Permission denied: run as root, or use a unix:<name> server.")
+        return
+    except OSError as e:
+        print(f"Cannot open {l2_transport.describe(interface)}: {e}")
+        return
+    capture = ask_capture(interface)
+    limit = None  # largest payload the path carries, once discovered
+    server_stats = True  # cleared once the server does not answer a stats query
+
+    while True:
+        print("\nAvailable Tests:")
+        print("1. RTT Test")
+        print("2. Throughput Test")
+        print("3. Jitter Test")
+        print("4. Integrity Test")
+        print("5. Variable Frame Size Test")
+        print("6. RFC 2544 Benchmark Suite")
+        print("7. Multi-Flow Load Test")
+        print("8. Priority Isolation Test (bulk + critical probes)")
+        print("9. Soak Test (long-running fixed load)")
+        print("10. Server Counters")
+        print("11. Path MTU Discovery")
+        print("12. Exit")
+        choice = input("Select test: ").strip()
+
+        if choice == '1':
+            count = int(input("Enter packet count: "))
+            interval = float(input("Enter interval between packets (s): "))
+            timestamps = ask_timestamp_source()
+            dump_raw = input("Dump raw samples to CSV? (y/n): ").lower().strip() == 'y'
+            one_way = input("Measure one-way delay (server started with --stamp)? (y/n): ").lower().strip() == 'y'
+            payload = generate_payload(fit_payload(100, limit))
+            rtt_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count, interval,
+                     timestamps=timestamps, dump_raw=dump_raw, one_way=one_way, vlan_id=vlan_id, capture=capture)
+
+        elif choice == '2':
+            duration = float(input("Enter test duration (s): "))
+            payload = generate_payload(fit_payload(500, limit))
+            rate = parse_rate(input("Enter target rate (e.g., 10000pps or 50Mbps, empty = unlimited): "),
+                              len(payload) * 8)
+            throughput_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, duration,
+                            rate_pps=rate, vlan_id=vlan_id, capture=capture)
+
+        elif choice == '3':
+            count = int(input("Enter packet count: "))
+            interval = float(input("Enter interval between packets (s): "))
+            timestamps = ask_timestamp_source()
+            dump_raw = input("Dump raw samples to CSV? (y/n): ").lower().strip() == 'y'
+            payload = generate_payload(fit_payload(100, limit))
+            jitter_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count, interval,
+                        timestamps=timestamps, dump_raw=dump_raw, vlan_id=vlan_id, capture=capture)
+
+        elif choice == '4':
+            count = int(input("Enter packet count: "))
+            payload = generate_payload(fit_payload(100, limit))
+            rate = parse_rate(input("Enter rate (e.g., 1000pps, empty = unlimited): "), len(payload) * 8)
+            integrity_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, payload, count, rate,
+                           vlan_id=vlan_id, capture=capture)
+
+        elif choice == '5':
+            sizes = fit_sizes([64, 128, 256, 512, 1024, 1500], limit)
+            variable_frame_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, sizes, vlan_id=vlan_id)
+
+        elif choice == '6':
+            import l2_rfc2544
+            duration = input("Enter trial duration (s) [default 5]: ").strip()
+            sizes = input("Enter frame sizes (comma separated) [default RFC 2544 sizes]: ").strip()
+            config = {'trial_duration': float(duration)} if duration else {}
+            frame_sizes = [int(x) for x in sizes.split(',')] if sizes else None
+            if limit is not None:
+                frame_sizes = fit_sizes(frame_sizes or l2_rfc2544.RFC2544_FRAME_SIZES, limit,
+                                        l2_rfc2544.ETH_OVERHEAD)
+            try:
+                l2_rfc2544.run_suite(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE,
+                                     frame_sizes, vlan_id, config, meta={'interface': interface})
+            except ValueError as e:
+                print(f"RFC 2544: {e}")
+                continue
+
+        elif choice in ('7', '8') and l2_transport.is_unix(interface):
+            print("Multi-flow and priority tests need an AF_PACKET interface (per-process sockets, PCP).")
+            continue
+
+        elif choice == '7':
+            import l2_multiflow
+            count = int(input("Enter number of flows: "))
+            macs = input(f"Enter destination MACs (comma separated) [{dst_mac_str}]: ").strip()
+            vlans = input("Enter VLAN IDs (comma separated, empty entry = untagged) ["
+                          + (f"{vlan_id}" if vlan_id is not None else "untagged") + "]: ").strip()
+            pcps = input("Enter VLAN PCPs (comma separated) [0]: ").strip()
+            sizes = input(f"Enter payload sizes (comma separated) [{l2_multiflow.DEFAULT_PAYLOAD_SIZE}]: ").strip()
+            rate = input("Enter per-flow rate (e.g., 1000pps or 10Mbps, empty = unlimited): ")
+            workers = input("Enter worker processes [1]: ").strip()
+            duration = float(input("Enter test duration (s): "))
+            flows = l2_multiflow.make_flows(
+                count,
+                [mac_str_to_bytes(m) for m in macs.split(',')] if macs else [dst_mac],
+                [int(v) if v.strip() else None for v in vlans.split(',')] if vlans else [vlan_id],
+                [int(p) for p in pcps.split(',')] if pcps else None,
+                [fit_payload(int(x), limit) for x in sizes.split(',')] if sizes
+                else [fit_payload(l2_multiflow.DEFAULT_PAYLOAD_SIZE, limit)],
+                rate)
+            l2_multiflow.run_flows(interface, src_mac, DEFAULT_ETHERTYPE, flows, duration,
+                                   int(workers) if workers else 1)
+
+        elif choice == '8':
+            import l2_priority
+            count = int(input("Enter probe count: "))
+            interval = float(input("Enter interval between probes (s): "))
+            timestamps = ask_timestamp_source()
+            defaults = l2_priority.DEFAULTS
+            probe_pcp = input(f"Enter probe PCP / SO_PRIORITY [{defaults['probe_pcp']}]: ").strip()
+            bulk_pcp = input(f"Enter bulk PCP / SO_PRIORITY [{defaults['bulk_pcp']}]: ").strip()
+            bulk_rate = input("Enter bulk rate per worker (e.g., 50Mbps, empty = unlimited): ").strip()
+            workers = input("Enter bulk worker processes [1]: ").strip()
+            config = {'bulk_rate': bulk_rate or None}
+            if probe_pcp:
+                config['probe_pcp'] = config['probe_priority'] = int(probe_pcp)
+            if bulk_pcp:
+                config['bulk_pcp'] = config['bulk_priority'] = int(bulk_pcp)
+            if workers:
+                config['bulk_workers'] = int(workers)
+            if limit is not None:
+                config['bulk_payload'] = fit_payload(defaults['bulk_payload'], limit)
+            l2_priority.priority_test(interface, dst_mac, src_mac, DEFAULT_ETHERTYPE, count, interval,
+                                      vlan_id, timestamps, config)
+
+        elif choice == '9':
+            import l2_soak
+            payload_size = input(f"Enter payload size [{l2_soak.DEFAULT_PAYLOAD_SIZE}]: ").strip()
+            payload_size = fit_payload(int(payload_size) if payload_size else l2_soak.DEFAULT_PAYLOAD_SIZE, limit)
+            rate = parse_rate(input("Enter offered load (e.g., 1000pps or 20Mbps): "), payload_size * 8)
+            if not rate:
+                print("Soak test needs a fixed rate.")
+                continue
+            duration = input("Enter duration (s, empty = until Ctrl-C): ").strip()
+            window = input(f"Enter window length (s) [{l2_soak.DEFAULT_WINDOW:g}]: ").strip()
+            l2_soak.soak_test(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, rate,
+                              float(duration) if duration else None, payload_size, vlan_id,
+                              float(window) if window else l2_soak.DEFAULT_WINDOW)
+
+        elif choice == '10':
+            report_server_stats(interface, dst_mac, src_mac, limit=limit)
+            continue
+
+        elif choice == '11':
+            import l2_pmtu
+            result = l2_pmtu.discover(send_sock, recv_sock, dst_mac, src_mac, DEFAULT_ETHERTYPE, vlan_id,
+                                      interface=interface)
+            if result['limit'] is not None:
+                limit = result['limit']
+                print(f"Later tests keep payloads at or below {limit} bytes")
+
+        elif choice == '12':
+            break
+
+        else:
+            print("Invalid selection.")
+            continue
+
+        # A server without stats costs a timeout per query: stop asking after
+        # the first miss (option 10 still asks).
+        if server_stats and report_server_stats(interface, dst_mac, src_mac, own_only=True, limit=limit) is None:
+            server_stats = False
+            print("Not querying server counters after further tests (option 10 still does)")
+
+    send_sock.close()
+    recv_sock.close()
+    if capture is not None:
+        capture.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,85 +1,557 @@
-#!/usr/bin/env python3
-"""
-Enhanced Layer 2 Echo Server
-Supports:
-- Echoing frames with or without VLAN tags
-- Logging of source MAC, EtherType, VLAN ID (if present), and payload size
-"""
-
-import socket
-import sys
-import struct
-import binascii
-
-ETH_P_ALL = 0x0003
-ETH_P_8021Q = 0x8100
-
-
-def mac_str_to_bytes(mac_str):
-    return bytes(int(b, 16) for b in mac_str.split(':'))
-
-def bytes_to_mac_str(b):
-    return ':'.join(f'{x:02x}' for x in b)
-
-def main():
-    if len(sys.argv) != 3:
-        print(f"Usage: sudo {sys.argv[0]} <interface> <ethertype (e.g., 0x88B5)>")
-        sys.exit(1)
-
-    interface = sys.argv[1]
-    ethertype_str = sys.argv[2]
-    try:
-        ethertype = int(ethertype_str, 16)
-    except ValueError:
-        print("Invalid EtherType. Use hex, e.g., 0x88B5.")
-        sys.exit(1)
-
-    try:
-        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
-    except PermissionError:
-        print("Permission denied: run as root.")
-        sys.exit(1)
-
-    sock.bind((interface, 0))
-    print(f"Enhanced L2 Echo Server listening on {interface}, filtering EtherType 0x{ethertype:04X}")
-
-    while True:
-        frame, _ = sock.recvfrom(65535)
-        if len(frame) < 14:
-            continue
-
-        dst_mac = frame[0:6]
-        src_mac = frame[6:12]
-        ethertype_field = struct.unpack('!H', frame[12:14])[0]
-
-        vlan_tag = None
-        actual_ethertype = ethertype_field
-        payload_offset = 14
-
-        if ethertype_field == ETH_P_8021Q and len(frame) >= 18:
-            vlan_tag = frame[14:18]
-            actual_ethertype = struct.unpack('!H', frame[16:18])[0]
-            payload_offset = 18
-
-        if actual_ethertype != ethertype:
-            continue
-
-        payload = frame[payload_offset:]
-        src_mac_str = binascii.hexlify(src_mac).decode()
-
-        if vlan_tag:
-            vlan_id = struct.unpack('!H', vlan_tag[2:])[0] & 0x0FFF
-            print(f"[VLAN {vlan_id}] Received frame from {src_mac_str}, size = {len(payload)}")
-            echo_frame = src_mac + dst_mac + vlan_tag + struct.pack('!H', actual_ethertype) + payload
-        else:
-            print(f"Received frame from {src_mac_str}, size = {len(payload)}")
-            echo_frame = src_mac + dst_mac + struct.pack('!H', actual_ethertype) + payload
-
-        try:
-            sock.send(echo_frame)
-            print(f"Echoed back to {src_mac_str}")
-        except Exception as e:
-            print(f"Error sending echo: {e}")
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python3
+"""
+Enhanced Layer 2 Echo Server
+Supports:
+- Echoing frames with or without VLAN tags
+- Per-source MAC/VLAN counters (frames, bytes, errors, drops) with a summary
+  printed once per --stats-interval; per-frame logging only with --debug
+- Stats queries: frames with EtherType 0x88B6 are answered with the counters
+- Optional live OpenMetrics endpoint with the same counters (--metrics-port)
+- Optional PACKET_MMAP (TPACKET_V3) receive ring, falling back to recvfrom()
+- Multi-core mode: N worker processes sharing the interface via PACKET_FANOUT
+- In-kernel BPF filter on EtherType (and optionally VLAN ID)
+- Zero-copy echo: frames are received into a reusable buffer (or read from
+  the ring) and sent back after swapping the MACs in place
+- Optional server timestamps (--stamp): RX and echo time written into test
+  frames that ask for them, for one-way delay measurement by the client
+- Sampled pcapng capture (--capture): 1-in-N frames, optional header-only
+  snap length, written by a background thread with kernel RX timestamps
+  (see l2_capture.py)
+- unix:<name> instead of an interface: listen on a SOCK_SEQPACKET socket
+  (one datagram per frame, no root needed; see l2_transport.py)
+"""
+
+import socket
+import sys
+import struct
+import binascii
+import argparse
+import mmap
+import select
+import os
+import threading
+import time
+import multiprocessing
+import signal
+
+from l2_capture import Capture, worker_filename, DEFAULT_SAMPLE as CAPTURE_SAMPLE
+from l2_counters import (CounterTable, merge_entries, sum_entries, parse_stats_query, pack_stats_reply,
+                         STATS_ETHERTYPE)
+from l2_filter import build_ethertype_filter, attach_filter
+from l2_metrics import REGISTRY as metrics, serve_metrics, DEFAULT_ADDRESS as METRICS_ADDRESS
+from l2_proto import payload_offset, wants_server_stamps, pack_server_stamps, VLAN_TPIDS
+from l2_timestamps import (scm_timestamp_ns, SO_TIMESTAMPING, RX_FLAGS, ANCILLARY_SIZE,
+                           SOURCE_SOFTWARE)
+import l2_transport
+from l2_transport import (aux_vlan, ETH_P_ALL, SOL_PACKET, PACKET_AUXDATA, TP_STATUS_VLAN_VALID,
+                          AUXDATA_SIZE)
+
+ETH_P_8021Q = 0x8100
+
+# PACKET_MMAP constants (linux/if_packet.h)
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+TP_STATUS_VLAN_TPID_VALID = 0x40
+PACKET_FANOUT = 18
+FANOUT_MODES = {'hash': 0, 'lb': 1, 'cpu': 2}
+
+# Default ring geometry: 16 x 1 MiB blocks, handed to userspace when full
+# or after RING_BLOCK_TIMEOUT_MS, whichever comes first.
+RING_BLOCK_SIZE = 1 << 20
+RING_BLOCK_NR = 16
+RING_FRAME_SIZE = 2048
+RING_BLOCK_TIMEOUT_MS = 1
+
+# struct tpacket_block_desc / tpacket_hdr_v1 field offsets
+BLOCK_STATUS_OFFSET = 8
+BLOCK_NUM_PKTS_OFFSET = 12
+BLOCK_FIRST_PKT_OFFSET = 16
+RECV_BUF_SIZE = 65535
+ETH_HEADER = struct.Struct('!6s6sH')
+VLAN_HEADER = struct.Struct('!HH')
+MAC_PAIR = struct.Struct('6s6s')
+
+# struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net,
+# then hv1: rxhash, vlan_tci, vlan_tpid
+TPACKET3_HDR = struct.Struct('=IIIIIIHHIIH')
+
+TOP_SOURCES = 3  # busiest sources listed in each stats line
+
+# Guards the list of counter tables: unix connections add and remove theirs
+# while the reporter, stats replies and metrics scrapes read it.
+tables_lock = threading.Lock()
+
+
+def mac_str_to_bytes(mac_str):
+    return bytes(int(b, 16) for b in mac_str.split(':'))
+
+def bytes_to_mac_str(b):
+    return ':'.join(f'{x:02x}' for x in b)
+
+def echo_in_place(sock, frame, ethertype, stamp=False, rx_ns=None, table=None, debug=False):
+    # frame is a writable buffer (memoryview) over exactly one received frame.
+    # The MACs are swapped in place and the same buffer is sent back, so the
+    # payload is never copied and no new frame is built.
+    # With stamp set, test frames that ask for it get the RX time (rx_ns, or
+    # now) and the echo time written into their payload (CLOCK_REALTIME).
+    # Every frame is counted per source in table; log lines only with debug.
+    # Returns None for frames that are not ours, True if echoed, False on send error.
+    if stamp and rx_ns is None:
+        rx_ns = time.time_ns()
+    length = len(frame)
+    if length < 14:
+        return None
+
+    dst_mac, src_mac, actual_ethertype = ETH_HEADER.unpack_from(frame)
+    vlan_id = None
+    payload_len = length - 14
+
+    # The tag may have been put back from the ring header or auxdata, with
+    # the TPID the kernel reported (802.1ad included); count under its VLAN.
+    if actual_ethertype in VLAN_TPIDS and length >= 18:
+        tci, actual_ethertype = VLAN_HEADER.unpack_from(frame, 14)
+        vlan_id = tci & 0x0FFF
+        payload_len = length - 18
+
+    if actual_ethertype != ethertype:
+        if table is not None:
+            table.count(src_mac, vlan_id, length, None)
+        return None
+
+    MAC_PAIR.pack_into(frame, 0, src_mac, dst_mac)
+    if debug:
+        src_mac_str = binascii.hexlify(src_mac).decode()
+        if vlan_id is not None:
+            print(f"[VLAN {vlan_id}] Received frame from {src_mac_str}, size = {payload_len}")
+        else:
+            print(f"Received frame from {src_mac_str}, size = {payload_len}")
+
+    try:
+        if stamp and wants_server_stamps(frame, length - payload_len):
+            pack_server_stamps(frame, length - payload_len, rx_ns, time.time_ns())
+        sock.send(frame)
+        result = True
+        if debug:
+            print(f"Echoed back to {src_mac_str}")
+    except Exception as e:
+        if debug:
+            print(f"Error sending echo: {e}")
+        result = False
+    if table is not None:
+        table.count(src_mac, vlan_id, length, result)
+    return result
+
+def setup_rx_ring(sock, block_size=RING_BLOCK_SIZE, block_nr=RING_BLOCK_NR,
+                  frame_size=RING_FRAME_SIZE, timeout_ms=RING_BLOCK_TIMEOUT_MS):
+    # Raises OSError if the kernel or socket does not support TPACKET_V3.
+    sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+    frame_nr = (block_size * block_nr) // frame_size
+    req = struct.pack('IIIIIII', block_size, block_nr, frame_size, frame_nr, timeout_ms, 0, 0)
+    sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+    return mmap.mmap(sock.fileno(), block_size * block_nr,
+                     mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+def ring_frames(ring, block_offset):
+    """Yield (start, snaplen, status, vlan_tci, vlan_tpid, rx_ns) for every frame in a user-owned block."""
+    num_pkts = struct.unpack_from('I', ring, block_offset + BLOCK_NUM_PKTS_OFFSET)[0]
+    offset = block_offset + struct.unpack_from('I', ring, block_offset + BLOCK_FIRST_PKT_OFFSET)[0]
+    for _ in range(num_pkts):
+        (next_offset, sec, nsec, snaplen, _len, status, mac, _net,
+         _rxhash, vlan_tci, vlan_tpid) = TPACKET3_HDR.unpack_from(ring, offset)
+        start = offset + mac
+        yield start, snaplen, status, vlan_tci, vlan_tpid, sec * 1_000_000_000 + nsec
+        offset += next_offset
+
+def restore_vlan_tag(buf, frame, vlan_tci, vlan_tpid, status):
+    # With VLAN offload the kernel strips the 802.1Q header and reports it in
+    # the ring header instead; rebuild the wire format in buf and return its length.
+    tpid = vlan_tpid if status & TP_STATUS_VLAN_TPID_VALID else ETH_P_8021Q
+    length = len(frame) + 4
+    buf[0:12] = frame[0:12]
+    struct.pack_into('!HH', buf, 12, tpid, vlan_tci)
+    buf[16:length] = frame[12:]
+    return length
+
+def received_frame(view, n, ancdata, vlan_view):
+    # The n bytes received into view, with a stripped tag put back (in vlan_view).
+    frame = view[:n]
+    tag = aux_vlan(ancdata)
+    if tag is not None:
+        frame = vlan_view[:restore_vlan_tag(vlan_view, frame, *tag)]
+    return frame
+
+def ring_loop(sock, ring, ethertype, block_size=RING_BLOCK_SIZE, block_nr=RING_BLOCK_NR,
+              table=None, stamp=False, debug=False, capture=None):
+    poller = select.poll()
+    poller.register(sock.fileno(), select.POLLIN | select.POLLERR)
+    ring_view = memoryview(ring)
+    vlan_buf = bytearray(RECV_BUF_SIZE + 4)
+    vlan_view = memoryview(vlan_buf)
+    block = 0
+    while True:
+        block_offset = block * block_size
+        status = struct.unpack_from('I', ring, block_offset + BLOCK_STATUS_OFFSET)[0]
+        if not status & TP_STATUS_USER:
+            poller.poll(-1)
+            continue
+
+        # Frames are echoed straight out of the ring unless a stripped tag
+        # has to be reinserted. The ring's kernel RX timestamp is the RX stamp.
+        for start, snaplen, status, vlan_tci, vlan_tpid, rx_ns in ring_frames(ring, block_offset):
+            frame = ring_view[start:start + snaplen]
+            if status & TP_STATUS_VLAN_VALID:
+                frame = vlan_view[:restore_vlan_tag(vlan_buf, frame, vlan_tci, vlan_tpid, status)]
+            if capture is not None:
+                capture.offer(frame, rx_ns)
+            echo_in_place(sock, frame, ethertype, stamp, rx_ns, table, debug)
+
+        struct.pack_into('I', ring, block_offset + BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+        block = (block + 1) % block_nr
+
+def recv_loop(sock, ethertype, table=None, stamp=False, debug=False, capture=None):
+    # The kernel strips the 802.1Q tag here as well; PACKET_AUXDATA (enabled
+    # in open_socket) reports it, so the echo goes back on the same VLAN.
+    if capture is not None:
+        return capture_loop(sock, ethertype, table, stamp, debug, capture)
+    view = memoryview(bytearray(RECV_BUF_SIZE))
+    vlan_view = memoryview(bytearray(RECV_BUF_SIZE + 4))
+    while True:
+        n, ancdata, _, _ = sock.recvmsg_into([view], AUXDATA_SIZE)
+        echo_in_place(sock, received_frame(view, n, ancdata, vlan_view), ethertype, stamp, None, table, debug)
+
+def capture_loop(sock, ethertype, table, stamp, debug, capture):
+    # recv_loop with kernel RX timestamps for the capture (recvmsg_into
+    # instead of recv_into); the stamp is also the RX time for --stamp.
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, RX_FLAGS[SOURCE_SOFTWARE])
+    except OSError as e:
+        print(f"Kernel RX timestamps unavailable ({e}), capture uses time.time_ns()")
+    view = memoryview(bytearray(RECV_BUF_SIZE))
+    vlan_view = memoryview(bytearray(RECV_BUF_SIZE + 4))
+    while True:
+        n, ancdata, _, _ = sock.recvmsg_into([view], ANCILLARY_SIZE + AUXDATA_SIZE)
+        frame = received_frame(view, n, ancdata, vlan_view)
+        rx_ns = scm_timestamp_ns(ancdata, SOURCE_SOFTWARE)
+        capture.offer(frame, rx_ns)
+        echo_in_place(sock, frame, ethertype, stamp, rx_ns, table, debug)
+
+def open_socket(interface, ethertype, args):
+    # Protocol 0 until bind() so no unfiltered frames are queued in between.
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    try:
+        attach_filter(sock, build_ethertype_filter(ethertype, args.vlan))
+    except OSError as e:
+        print(f"BPF filter unavailable ({e}), filtering in userspace only")
+    ring = None
+    if args.ring:
+        try:
+            ring = setup_rx_ring(sock, args.ring_block_size, args.ring_blocks,
+                                 timeout_ms=args.ring_timeout)
+        except (OSError, ValueError) as e:
+            print(f"TPACKET_V3 ring unavailable ({e}), falling back to recvfrom()")
+    if ring is None:
+        sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+    sock.bind((interface, ETH_P_ALL))
+    return sock, ring
+
+def join_fanout(sock, group_id, mode):
+    # Must be called after bind(); every socket in the group shares the traffic.
+    sock.setsockopt(SOL_PACKET, PACKET_FANOUT, group_id | (FANOUT_MODES[mode] << 16))
+
+def serve(sock, ring, ethertype, args, table=None, capture=None):
+    if ring is not None:
+        ring_loop(sock, ring, ethertype, args.ring_block_size, args.ring_blocks, table, args.stamp, args.debug,
+                  capture)
+    else:
+        recv_loop(sock, ethertype, table, args.stamp, args.debug, capture)
+
+def open_capture(args, interface, index=None):
+    if not args.capture:
+        return None
+    filename = args.capture if index is None else worker_filename(args.capture, index)
+    capture = Capture(filename, args.capture_sample, args.capture_snaplen, interface)
+    # Exit through the callers' finally on SIGTERM too (the parent stops
+    # workers that way), so the writer queue is flushed to the file.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Capturing 1 in {args.capture_sample} frames to {filename}" if args.capture_sample
+          else f"Capture file {filename} open")
+    return capture
+
+def snapshot(tables):
+    with tables_lock:
+        return list(tables)
+
+def format_source(mac, vlan_id):
+    return bytes_to_mac_str(mac) + (f"/VLAN {vlan_id}" if vlan_id is not None else "")
+
+def report_loop(tables, interval, alive=lambda: True):
+    # One summary line per interval (skipped while idle) instead of a line per
+    # frame: totals, rate, and the busiest sources of the last interval.
+    last = {}
+    last_frames = 0
+    last_time = time.time()
+    while alive():
+        time.sleep(interval)
+        current = snapshot(tables)
+        entries = merge_entries(current)
+        totals = sum_entries(entries)
+        now = time.time()
+        elapsed = now - last_time
+        activity = totals['frames'] + totals['drops']
+        if activity == last_frames:
+            last_time = now
+            continue
+        rates = sorted(((entry[2] - last.get(entry[:2], 0), entry[:2]) for entry in entries), reverse=True)
+        top = ', '.join(f"{format_source(*key)} {delta / elapsed:.0f} pps"
+                        for delta, key in rates[:TOP_SOURCES] if delta)
+        per_worker = (' (' + ' '.join(f"w{i}={t.totals()['frames']}" for i, t in enumerate(current)) + ')'
+                      if len(current) > 1 else '')
+        print(f"[stats] frames={totals['frames']} bytes={totals['bytes']} errors={totals['errors']} "
+              f"drops={totals['drops']} sources={len(entries)} "
+              f"rate={(totals['frames'] - sum(last.values())) / elapsed:.0f} pps{per_worker}"
+              + (f" top: {top}" if top else ""))
+        last = {entry[:2]: entry[2] for entry in entries}
+        last_frames = activity
+        last_time = now
+
+def stats_reply(frame, tables):
+    # Reply frame for a stats query (one page of the counters of all tables,
+    # no larger than the payload the query allows),
+    # addressed back the way the query came; None if frame is not a query.
+    if len(frame) < 14:
+        return None
+    offset = payload_offset(frame)
+    query = parse_stats_query(frame[offset:])
+    if query is None:
+        return None
+    start, max_payload = query
+    dst_mac, src_mac, _ = ETH_HEADER.unpack_from(frame)
+    return (src_mac + dst_mac + bytes(frame[12:offset])
+            + pack_stats_reply(merge_entries(snapshot(tables)), start, max_payload))
+
+def stats_responder(interface, tables):
+    # Answers stats queries (STATS_ETHERTYPE) with the counters of all tables.
+    sock = l2_transport.open_protocol_socket(interface, STATS_ETHERTYPE)
+    while True:
+        reply = stats_reply(sock.recv(RECV_BUF_SIZE), tables)
+        if reply is None:
+            continue
+        try:
+            sock.send(reply)
+        except OSError as e:
+            print(f"Error sending stats reply: {e}")
+
+def frame_ethertype(frame):
+    ethertype = ETH_HEADER.unpack_from(frame)[2]
+    if ethertype in VLAN_TPIDS and len(frame) >= 18:
+        ethertype = VLAN_HEADER.unpack_from(frame, 14)[1]
+    return ethertype
+
+def connection_loop(conn, ethertype, table, tables, args, capture=None):
+    # One unix client: test frames are echoed, stats queries answered, on the
+    # same connection. Returns when the client disconnects.
+    buf = bytearray(RECV_BUF_SIZE)
+    view = memoryview(buf)
+    try:
+        while True:
+            n = conn.recv_into(buf)
+            if n == 0:
+                break
+            frame = view[:n]
+            if n >= 14 and frame_ethertype(frame) == STATS_ETHERTYPE:
+                reply = stats_reply(frame, tables)
+                if reply is not None:
+                    conn.send(reply)
+                continue
+            if capture is not None:
+                capture.offer(frame)
+            echo_in_place(conn, frame, ethertype, args.stamp, None, table, args.debug)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+        # Stats-only connections leave nothing worth keeping.
+        if not table.index:
+            with tables_lock:
+                tables.remove(table)
+
+def serve_unix(interface, ethertype, args):
+    # Each client connection gets a thread and its own CounterTable (one
+    # writer per table); the reporter and stats replies read all of them.
+    try:
+        listener = l2_transport.listen(interface)
+    except OSError as e:
+        print(f"Cannot listen on {l2_transport.describe(interface)}: {e}")
+        sys.exit(1)
+    ignored = [flag for flag, value in (('--vlan', args.vlan is not None), ('--ring', args.ring),
+                                        ('--workers', args.workers > 1)) if value]
+    if ignored:
+        print(f"{', '.join(ignored)} not applicable on a unix link, ignored")
+    print(f"Enhanced L2 Echo Server listening on {l2_transport.describe(interface)}, "
+          f"EtherType 0x{ethertype:04X}")
+    tables = []
+    capture = open_capture(args, interface)
+    start_metrics(tables, args)
+    start_background(report_loop, tables, args.stats_interval)
+    try:
+        with listener:
+            while True:
+                conn = l2_transport.accept(listener)
+                table = CounterTable()
+                with tables_lock:
+                    tables.append(table)
+                start_background(connection_loop, conn, ethertype, table, tables, args, capture)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if capture is not None:
+            capture.close()
+
+def counter_metrics(tables):
+    # Scrape-time view of the counter tables, labelled by source MAC and VLAN.
+    def collect():
+        families = {'server_frames': ("Test frames received", []),
+                    'server_frames_echoed': ("Test frames echoed", []),
+                    'server_bytes': ("Test frame bytes received", []),
+                    'server_errors': ("Echoes that failed to send", []),
+                    'server_drops': ("Frames received but not echoed", [])}
+        for mac, vlan_id, frames, nbytes, errors, drops in merge_entries(snapshot(tables)):
+            labels = {'src_mac': bytes_to_mac_str(mac), 'vlan': vlan_id if vlan_id is not None else ''}
+            for name, value in (('server_frames', frames), ('server_frames_echoed', frames - errors),
+                                ('server_bytes', nbytes), ('server_errors', errors), ('server_drops', drops)):
+                families[name][1].append((labels, value))
+        return [(name, text, samples) for name, (text, samples) in families.items()]
+    return collect
+
+def start_metrics(tables, args):
+    if args.metrics_port:
+        metrics.add_collector(counter_metrics(tables))
+        serve_metrics(args.metrics_port, args.metrics_address)
+
+def start_background(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+def worker_main(index, interface, ethertype, args, group_id, table):
+    sock, ring = open_socket(interface, ethertype, args)
+    join_fanout(sock, group_id, args.fanout)
+    print(f"Worker {index} (pid {os.getpid()}) joined fanout group {group_id} ({args.fanout})")
+    capture = open_capture(args, interface, index)
+    try:
+        serve(sock, ring, ethertype, args, table, capture)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if capture is not None:
+            capture.close()
+
+def run_workers(interface, ethertype, args):
+    group_id = os.getpid() & 0xFFFF
+    tables = [CounterTable.shared() for _ in range(args.workers)]
+    workers = []
+    for i in range(args.workers):
+        p = multiprocessing.Process(target=worker_main,
+                                    args=(i, interface, ethertype, args, group_id, tables[i]),
+                                    daemon=True)
+        p.start()
+        workers.append(p)
+
+    print(f"Enhanced L2 Echo Server listening on {interface}, filtering EtherType 0x{ethertype:04X} "
+          f"({args.workers} workers, fanout {args.fanout})")
+    start_background(stats_responder, interface, tables)
+    start_metrics(tables, args)
+    try:
+        report_loop(tables, args.stats_interval, lambda: any(p.is_alive() for p in workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in workers:
+            p.terminate()
+        for p in workers:
+            p.join()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enhanced L2 Echo Server")
+    parser.add_argument('interface')
+    parser.add_argument('ethertype', help="EtherType in hex, e.g., 0x88B5")
+    parser.add_argument('--vlan', type=int, default=None,
+                        help="only echo frames tagged with this VLAN ID (enforced by the BPF filter)")
+    parser.add_argument('--ring', action='store_true',
+                        help="receive through a TPACKET_V3 mmap ring (falls back to recvfrom)")
+    parser.add_argument('--ring-blocks', type=int, default=RING_BLOCK_NR,
+                        help=f"number of ring blocks (default {RING_BLOCK_NR})")
+    parser.add_argument('--ring-block-size', type=int, default=RING_BLOCK_SIZE,
+                        help=f"ring block size in bytes, multiple of the page size (default {RING_BLOCK_SIZE})")
+    parser.add_argument('--ring-timeout', type=int, default=RING_BLOCK_TIMEOUT_MS,
+                        help=f"block retire timeout in ms; bounds added latency (default {RING_BLOCK_TIMEOUT_MS})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of echo worker processes sharing the interface via PACKET_FANOUT")
+    parser.add_argument('--fanout', choices=sorted(FANOUT_MODES), default='hash',
+                        help="fanout mode: hash (per flow), cpu (per RX queue/CPU) or lb (round robin)")
+    parser.add_argument('--stamp', action='store_true',
+                        help="write RX and echo timestamps into test frames that request them "
+                             "(client one-way delay measurement)")
+    parser.add_argument('--stats-interval', type=float, default=1.0,
+                        help="seconds between per-source stats summary lines (default 1.0)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve the counters in OpenMetrics format on this HTTP port (default off)")
+    parser.add_argument('--metrics-address', default=METRICS_ADDRESS,
+                        help=f"address for the metrics endpoint (default {METRICS_ADDRESS})")
+    parser.add_argument('--capture', default=None, metavar='FILE',
+                        help="write sampled received frames to this pcapng file (one file per worker)")
+    parser.add_argument('--capture-sample', type=int, default=CAPTURE_SAMPLE, metavar='N',
+                        help=f"capture 1 in N frames (default {CAPTURE_SAMPLE})")
+    parser.add_argument('--capture-snaplen', type=int, default=0, metavar='BYTES',
+                        help="bytes kept per captured frame, e.g. 64 for headers only (default: whole frame)")
+    parser.add_argument('--debug', action='store_true',
+                        help="log every received and echoed frame (slow; for troubleshooting only)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    interface = args.interface
+    try:
+        ethertype = int(args.ethertype, 16)
+    except ValueError:
+        print("Invalid EtherType. Use hex, e.g., 0x88B5.")
+        sys.exit(1)
+
+    if l2_transport.is_unix(interface):
+        serve_unix(interface, ethertype, args)
+        return
+
+    if args.workers > 1:
+        if os.geteuid() != 0:
+            print("Permission denied: run as root.")
+            sys.exit(1)
+        run_workers(interface, ethertype, args)
+        return
+
+    try:
+        sock, ring = open_socket(interface, ethertype, args)
+    except PermissionError:
+        print("Permission denied: run as root.")
+        sys.exit(1)
+
+    mode = "mmap ring" if ring is not None else "recvfrom"
+    vlan = f", VLAN {args.vlan}" if args.vlan is not None else ""
+    print(f"Enhanced L2 Echo Server listening on {interface}, filtering EtherType 0x{ethertype:04X}{vlan} ({mode})")
+    table = CounterTable()
+    start_background(stats_responder, interface, [table])
+    start_metrics([table], args)
+    start_background(report_loop, [table], args.stats_interval)
+    capture = open_capture(args, interface)
+    try:
+        serve(sock, ring, ethertype, args, table, capture)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if capture is not None:
+            capture.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Sampled pcapng capture for the client and server (instead of tcpdump on the side)
+- sampling: 1-in-N frames, optionally cut to a header-only snap length
+- triggers: frames recorded regardless of sampling, with a comment saying
+  why (lost probe, latency outlier, corrupted payload)
+- the packet loop only copies the selected frame (cut to the snap length)
+  into a queue bounded in bytes; a background thread turns the queue into pcapng blocks and writes them in
+  batches, so disk I/O never stalls the loop (a full queue drops the frame
+  from the capture and counts it)
+- timestamps in nanoseconds (if_tsresol 9): the kernel RX stamp where the
+  caller has one, so the file lines up with the tests' own timestamps in
+  Wireshark
+"""
+
+import collections
+import struct
+import threading
+import time
+
+# pcapng block types and option codes
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 0x00000001
+BLOCK_EPB = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+LINKTYPE_ETHERNET = 1
+OPT_ENDOFOPT = 0
+OPT_COMMENT = 1
+OPT_SHB_USERAPPL = 4
+OPT_IF_NAME = 2
+OPT_IF_TSRESOL = 9
+TSRESOL_NS = 9
+
+BLOCK_HEADER = struct.Struct('<II')
+SHB_BODY = struct.Struct('<IHHq')
+IDB_BODY = struct.Struct('<HHI')
+EPB_BODY = struct.Struct('<IIIII')
+OPTION = struct.Struct('<HH')
+
+DEFAULT_SAMPLE = 100        # 1 in N frames
+DEFAULT_QUEUE_BYTES = 16 << 20   # captured bytes waiting for the writer before new frames are dropped
+FLUSH_INTERVAL = 0.05       # seconds between writer batches
+MAX_SNAPLEN = 65535
+
+
+def _pad(data):
+    return data + bytes(-len(data) % 4)
+
+def _options(options):
+    if not options:
+        return b''
+    parts = [OPTION.pack(code, len(value)) + _pad(value) for code, value in options]
+    return b''.join(parts) + OPTION.pack(OPT_ENDOFOPT, 0)
+
+def _block(block_type, body):
+    length = BLOCK_HEADER.size + len(body) + 4
+    return BLOCK_HEADER.pack(block_type, length) + body + struct.pack('<I', length)
+
+def section_header(application='l2 test tools'):
+    return _block(BLOCK_SHB, SHB_BODY.pack(BYTE_ORDER_MAGIC, 1, 0, -1)
+                  + _options([(OPT_SHB_USERAPPL, application.encode())]))
+
+def interface_description(name, snaplen=0):
+    options = [(OPT_IF_TSRESOL, bytes([TSRESOL_NS]))]
+    if name:
+        options.insert(0, (OPT_IF_NAME, name.encode()))
+    return _block(BLOCK_IDB, IDB_BODY.pack(LINKTYPE_ETHERNET, 0, snaplen) + _options(options))
+
+def enhanced_packet(ts_ns, data, orig_len, comment=None, interface_id=0):
+    options = [(OPT_COMMENT, comment.encode())] if comment else None
+    return _block(BLOCK_EPB, EPB_BODY.pack(interface_id, ts_ns >> 32, ts_ns & 0xFFFFFFFF, len(data), orig_len)
+                  + _pad(data) + _options(options))
+
+
+class Capture:
+    """pcapng file fed from a packet loop; offer() samples, trigger() always records.
+
+    Both only copy the frame into a bounded deque; close() drains it and
+    closes the file. Safe to share between threads of one process: the
+    sampling countdown and the queue are updated under one lock.
+    """
+
+    def __init__(self, filename, sample=DEFAULT_SAMPLE, snaplen=0, interface='', outlier_ns=None,
+                 queue_bytes=DEFAULT_QUEUE_BYTES):
+        self.filename = filename
+        self.sample = sample          # 0: triggers only
+        self.snaplen = snaplen or MAX_SNAPLEN
+        self.outlier_ns = outlier_ns
+        self.queue_bytes = queue_bytes
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.lock = threading.Lock()
+        self.countdown = sample
+        self.offered = 0
+        self.dropped = 0
+        self.written = 0
+        self.file = open(filename, 'wb')
+        self.file.write(section_header() + interface_description(interface, snaplen))
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _enqueue(self, frame, ts_ns, comment):
+        # Called with self.lock held.
+        data = frame[:self.snaplen]
+        if self.queued_bytes + len(data) > self.queue_bytes:
+            self.dropped += 1
+            return
+        # The caller's buffer is reused for the next frame: copy now.
+        self.queue.append((ts_ns or time.time_ns(), bytes(data), len(frame), comment))
+        self.queued_bytes += len(data)
+
+    def offer(self, frame, ts_ns=None, latency_ns=None):
+        """Record every sample-th frame, and any frame whose latency_ns exceeds the outlier threshold."""
+        with self.lock:
+            self.offered += 1
+            if self.outlier_ns is not None and latency_ns is not None and latency_ns > self.outlier_ns:
+                self._enqueue(frame, ts_ns, f"latency outlier: {latency_ns / 1e6:.3f} ms")
+                return
+            if not self.sample:
+                return
+            self.countdown -= 1
+            if self.countdown <= 0:
+                self.countdown = self.sample
+                self._enqueue(frame, ts_ns, None)
+
+    def trigger(self, frame, ts_ns=None, comment=None):
+        """Record frame regardless of sampling (loss, corruption, ...)."""
+        with self.lock:
+            self._enqueue(frame, ts_ns, comment)
+
+    def _flush(self):
+        with self.lock:
+            queue, self.queue = self.queue, collections.deque()
+            self.queued_bytes = 0
+        blocks = [enhanced_packet(ts_ns, data, orig_len, comment) for ts_ns, data, orig_len, comment in queue]
+        if blocks:
+            self.file.write(b''.join(blocks))
+            self.file.flush()
+            self.written += len(blocks)
+
+    def _write_loop(self):
+        while not self._stop.wait(FLUSH_INTERVAL):
+            self._flush()
+
+    def close(self):
+        self._stop.set()
+        self._writer.join()
+        self._flush()
+        self.file.close()
+        print(f"Capture {self.filename}: {self.written} frames written"
+              + (f", {self.dropped} dropped (writer queue full)" if self.dropped else ""))
+
+    def summary(self):
+        return {'file': self.filename, 'offered': self.offered, 'written': self.written, 'dropped': self.dropped}
+
+
+def worker_filename(filename, index):
+    # One file per server worker process: capture.pcapng -> capture-w0.pcapng
+    stem, dot, ext = filename.rpartition('.')
+    return f"{stem}-w{index}.{ext}" if dot else f"{filename}-w{index}"
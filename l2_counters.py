@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Per-source counters for the L2 echo server
+- CounterTable: fixed-size open-addressing table keyed by (source MAC, VLAN ID)
+  holding frames, bytes, errors and drops. It lives in one flat buffer, so it
+  can sit in shared memory: a worker updates it, the parent process (or a
+  reporter thread) reads it without locks
+- stats query/reply frames (STATS_ETHERTYPE), so a client can fetch the
+  server's counters over the wire at the end of a test
+Counters: frames/bytes = test frames received from the source (echoed or
+not), errors = echoes that failed to send, drops = frames from the source
+that were not echoed (wrong EtherType, truncated).
+"""
+
+import multiprocessing
+import struct
+
+TABLE_SLOTS = 1024
+NO_VLAN = 0xFFFF
+FIELDS = ('frames', 'bytes', 'errors', 'drops')
+
+# mac, vlan, used, pad to 8-byte alignment, then the counters as native u64
+SLOT = struct.Struct('=6sHH6x')
+COUNTS = struct.Struct('=QQQQ')
+SLOT_SIZE = SLOT.size + COUNTS.size
+FRAMES, BYTES, ERRORS, DROPS = range(4)
+
+# IEEE 802 Local Experimental EtherType 2 (test frames default to 1, 0x88B5)
+STATS_ETHERTYPE = 0x88B6
+STATS_MAGIC = 0x4C53  # 'LS'
+STATS_VERSION = 1
+OP_QUERY = 1
+OP_REPLY = 2
+# magic, version, op, first record index, total records, records in this frame
+# (in a query: the largest reply payload the client's path carries, 0 = 1500)
+STATS_HEADER = struct.Struct('!HBBIIH')
+STATS_RECORD = struct.Struct('!6sHQQQQ')
+DEFAULT_REPLY_PAYLOAD = 1500
+
+
+class CounterTable:
+    """(source MAC, VLAN) -> frames/bytes/errors/drops in a flat buffer; one writer, any number of readers."""
+
+    def __init__(self, buffer=None, slots=TABLE_SLOTS):
+        self.slots = slots
+        self.buf = buffer if buffer is not None else bytearray(slots * SLOT_SIZE)
+        self.counters = memoryview(self.buf).cast('B').cast('Q')
+        self.index = {}     # writer side: key -> index of the frames counter in self.counters
+        self.overflow = 0   # frames from sources that did not fit (writer side only)
+
+    @classmethod
+    def shared(cls, slots=TABLE_SLOTS):
+        """A table in shared memory, for a worker process to fill and the parent to read."""
+        return cls(multiprocessing.RawArray('B', slots * SLOT_SIZE), slots)
+
+    def __getstate__(self):
+        # The memoryview cannot be pickled (spawn/forkserver start methods).
+        return self.buf, self.slots
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _lookup(self, key):
+        mac, vlan = key
+        slot = hash(key) % self.slots
+        for _ in range(self.slots):
+            offset = slot * SLOT_SIZE
+            slot_mac, slot_vlan, used = SLOT.unpack_from(self.buf, offset)
+            if not used:
+                # Counters first, then the used flag, so readers never see
+                # a claimed slot with stale counts.
+                COUNTS.pack_into(self.buf, offset + SLOT.size, 0, 0, 0, 0)
+                SLOT.pack_into(self.buf, offset, mac, vlan, 1)
+                return (offset + SLOT.size) // 8
+            if slot_mac == mac and slot_vlan == vlan:
+                return (offset + SLOT.size) // 8
+            slot = (slot + 1) % self.slots
+        return None
+
+    def count(self, mac, vlan_id, length, result):
+        """Count one frame: result is True (echoed), False (send error) or None (dropped); mac is bytes."""
+        key = (mac, NO_VLAN if vlan_id is None else vlan_id)
+        i = self.index.get(key)
+        if i is None:
+            i = self._lookup(key)
+            if i is None:
+                self.overflow += 1
+                return
+            self.index[key] = i
+        counters = self.counters
+        if result is None:
+            counters[i + DROPS] += 1
+            return
+        counters[i + FRAMES] += 1
+        counters[i + BYTES] += length
+        if not result:
+            counters[i + ERRORS] += 1
+
+    def entries(self):
+        """Yield (mac, vlan_id or None, frames, bytes, errors, drops) for every source seen."""
+        for slot in range(self.slots):
+            offset = slot * SLOT_SIZE
+            mac, vlan, used = SLOT.unpack_from(self.buf, offset)
+            if used:
+                yield (mac, None if vlan == NO_VLAN else vlan) + COUNTS.unpack_from(self.buf, offset + SLOT.size)
+
+    def totals(self):
+        return sum_entries(self.entries())
+
+
+def merge_entries(tables):
+    """Per-source counters summed over several tables (e.g., one per worker), busiest first."""
+    merged = {}
+    for table in tables:
+        for entry in table.entries():
+            counts = merged.setdefault(entry[:2], [0] * len(FIELDS))
+            for i, value in enumerate(entry[2:]):
+                counts[i] += value
+    return sorted((key + tuple(counts) for key, counts in merged.items()), key=lambda e: -e[2])
+
+def sum_entries(entries):
+    totals = [0] * len(FIELDS)
+    for entry in entries:
+        for i, value in enumerate(entry[2:]):
+            totals[i] += value
+    return dict(zip(FIELDS, totals))
+
+def records_per_frame(max_payload):
+    return max((max_payload - STATS_HEADER.size) // STATS_RECORD.size, 1)
+
+def pack_stats_query(start=0, max_payload=None):
+    # max_payload: e.g. the payload limit found by Path MTU discovery.
+    return STATS_HEADER.pack(STATS_MAGIC, STATS_VERSION, OP_QUERY, start, 0, min(max_payload or 0, 0xFFFF))
+
+def parse_stats_query(payload):
+    """Return (first record index, largest reply payload), or None if payload is not a stats query."""
+    if len(payload) < STATS_HEADER.size:
+        return None
+    magic, version, op, start, _, max_payload = STATS_HEADER.unpack_from(payload)
+    if magic != STATS_MAGIC or version != STATS_VERSION or op != OP_QUERY:
+        return None
+    return start, max_payload or DEFAULT_REPLY_PAYLOAD
+
+def pack_stats_reply(entries, start, max_payload=DEFAULT_REPLY_PAYLOAD):
+    """Reply payload of at most max_payload bytes (at least one entry) starting at index start."""
+    page = entries[start:start + records_per_frame(max_payload)]
+    parts = [STATS_HEADER.pack(STATS_MAGIC, STATS_VERSION, OP_REPLY, start, len(entries), len(page))]
+    for mac, vlan_id, frames, nbytes, errors, drops in page:
+        parts.append(STATS_RECORD.pack(mac, NO_VLAN if vlan_id is None else vlan_id, frames, nbytes, errors, drops))
+    return b''.join(parts)
+
+def parse_stats_reply(payload):
+    """Return (start, total, entries) from a reply payload, or None."""
+    if len(payload) < STATS_HEADER.size:
+        return None
+    magic, version, op, start, total, count = STATS_HEADER.unpack_from(payload)
+    if magic != STATS_MAGIC or version != STATS_VERSION or op != OP_REPLY:
+        return None
+    if len(payload) < STATS_HEADER.size + count * STATS_RECORD.size:
+        return None
+    entries = []
+    for i in range(count):
+        mac, vlan, *counts = STATS_RECORD.unpack_from(payload, STATS_HEADER.size + i * STATS_RECORD.size)
+        entries.append((mac, None if vlan == NO_VLAN else vlan, *counts))
+    return start, total, entries
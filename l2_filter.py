@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Classic BPF filter generator for the L2 test sockets
+Builds SO_ATTACH_FILTER programs that accept only:
+- the configured EtherType (untagged, in-band 802.1Q or VLAN-offloaded)
+- optionally a single VLAN ID
+- optionally a single source MAC (e.g., the echo server seen by the client)
+- optionally one test flow, or one shard of the test flows (flow ID in the
+  test header modulo the shard count) so several receivers can split them
+Everything else is dropped in the kernel before it is copied to userspace.
+"""
+
+import ctypes
+import socket
+import struct
+
+SO_ATTACH_FILTER = 26
+SO_DETACH_FILTER = 27
+ETH_P_8021Q = 0x8100
+
+# Opcodes (linux/filter.h)
+BPF_LD_W_ABS = 0x20
+BPF_LD_H_ABS = 0x28
+BPF_ALU_AND_K = 0x54
+BPF_ALU_MOD_K = 0x94
+BPF_JEQ_K = 0x15
+BPF_RET_K = 0x06
+
+# Ancillary loads: VLAN tag stripped by the kernel/NIC lives outside the packet
+SKF_AD_OFF = -0x1000
+SKF_AD_VLAN_TAG = 44
+SKF_AD_VLAN_TAG_PRESENT = 48
+
+ACCEPT_SNAPLEN = 0x40000
+
+ACCEPT = 'accept'
+ACCEPT_INBAND = 'accept_inband'
+ACCEPT_FRAME = 'accept_frame'
+REJECT = 'reject'
+
+# Flow ID in the test header (l2_proto.TEST_HEADER), after magic/version/flags
+FLOW_ID_OFFSET = 4
+
+
+def _ancillary(offset):
+    return (SKF_AD_OFF + offset) & 0xFFFFFFFF
+
+def _assemble(insns):
+    # insns: list of (code, jt, jf, k) or label strings; jt/jf may be labels.
+    # Jump offsets are relative to the next instruction, as classic BPF expects.
+    labels = {}
+    pc = 0
+    for insn in insns:
+        if isinstance(insn, str):
+            labels[insn] = pc
+        else:
+            pc += 1
+    program = []
+    for insn in insns:
+        if isinstance(insn, str):
+            continue
+        code, jt, jf, k = insn
+        pos = len(program)
+        jt = labels[jt] - pos - 1 if isinstance(jt, str) else jt
+        jf = labels[jf] - pos - 1 if isinstance(jf, str) else jf
+        program.append((code, jt, jf, k))
+    return program
+
+def _match_src_mac(src_mac, fail):
+    hi = struct.unpack('!I', src_mac[0:4])[0]
+    lo = struct.unpack('!H', src_mac[4:6])[0]
+    return [
+        (BPF_LD_W_ABS, 0, 0, 6),
+        (BPF_JEQ_K, 0, fail, hi),
+        (BPF_LD_H_ABS, 0, 0, 10),
+        (BPF_JEQ_K, 0, fail, lo),
+    ]
+
+def _match_flow_shard(payload_offset, flow_shard, fail):
+    shard, shards = flow_shard
+    insns = [(BPF_LD_H_ABS, 0, 0, payload_offset + FLOW_ID_OFFSET)]
+    if shards is not None:
+        insns.append((BPF_ALU_MOD_K, 0, 0, shards))
+    insns.append((BPF_JEQ_K, ACCEPT_FRAME, fail, shard))
+    return insns
+
+def build_ethertype_filter(ethertype, vlan_id=None, src_mac=None, flow_shard=None, flow_id=None):
+    """Return a list of (code, jt, jf, k) instructions for attach_filter().
+
+    flow_shard=(shard, shards) additionally keeps only test frames whose
+    flow ID % shards == shard; flow_id keeps only that one test flow.
+    """
+    if flow_id is not None:
+        flow_shard = (flow_id, None)
+    insns = []
+    if src_mac is not None:
+        insns += _match_src_mac(src_mac, REJECT)
+
+    if vlan_id is None:
+        # Untagged or offloaded tag: EtherType at 12. In-band tag: EtherType at 16.
+        insns += [
+            (BPF_LD_H_ABS, 0, 0, 12),
+            (BPF_JEQ_K, ACCEPT, 0, ethertype),
+            (BPF_JEQ_K, 0, REJECT, ETH_P_8021Q),
+            (BPF_LD_H_ABS, 0, 0, 16),
+            (BPF_JEQ_K, ACCEPT_INBAND, REJECT, ethertype),
+        ]
+    else:
+        vlan_id &= 0x0FFF
+        insns += [
+            (BPF_LD_W_ABS, 0, 0, _ancillary(SKF_AD_VLAN_TAG_PRESENT)),
+            (BPF_JEQ_K, 'inband', 0, 0),
+            (BPF_LD_W_ABS, 0, 0, _ancillary(SKF_AD_VLAN_TAG)),
+            (BPF_ALU_AND_K, 0, 0, 0x0FFF),
+            (BPF_JEQ_K, 0, REJECT, vlan_id),
+            (BPF_LD_H_ABS, 0, 0, 12),
+            (BPF_JEQ_K, ACCEPT, REJECT, ethertype),
+            'inband',
+            (BPF_LD_H_ABS, 0, 0, 12),
+            (BPF_JEQ_K, 0, REJECT, ETH_P_8021Q),
+            (BPF_LD_H_ABS, 0, 0, 14),
+            (BPF_ALU_AND_K, 0, 0, 0x0FFF),
+            (BPF_JEQ_K, 0, REJECT, vlan_id),
+            (BPF_LD_H_ABS, 0, 0, 16),
+            (BPF_JEQ_K, ACCEPT_INBAND, REJECT, ethertype),
+        ]
+
+    # Payload at 18 with an in-band tag, at 14 otherwise.
+    insns.append(ACCEPT_INBAND)
+    if flow_shard is not None:
+        insns += _match_flow_shard(18, flow_shard, REJECT)
+    insns.append(ACCEPT)
+    if flow_shard is not None:
+        insns += _match_flow_shard(14, flow_shard, REJECT)
+    insns += [
+        ACCEPT_FRAME,
+        (BPF_RET_K, 0, 0, ACCEPT_SNAPLEN),
+        REJECT,
+        (BPF_RET_K, 0, 0, 0),
+    ]
+    return _assemble(insns)
+
+def attach_filter(sock, program):
+    # struct sock_filter { u16 code; u8 jt; u8 jf; u32 k; }
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    filters = ctypes.create_string_buffer(b''.join(struct.pack('HBBI', *insn) for insn in program))
+    fprog = struct.pack('HL', len(program), ctypes.addressof(filters))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+def detach_filter(sock):
+    sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
+
+def open_filtered_socket(interface, protocol, program):
+    # Create the socket unbound (protocol 0) so nothing is queued before the
+    # filter is in place, then bind to the interface with the real protocol.
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    attach_filter(sock, program)
+    sock.bind((interface, protocol))
+    return sock
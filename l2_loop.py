@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Non-blocking receive loop for the L2 test client
+- EventLoop: selectors (epoll) readiness callbacks plus a timer heap of
+  deadlines on time.perf_counter_ns(), so a lost frame costs exactly its own
+  timeout and nothing ever blocks on a socket timeout
+The loop runs in the receive thread; call_at() and stop() may be called from
+the sending thread and wake the selector when needed.
+"""
+
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+
+
+class EventLoop:
+    """Single-threaded dispatcher: add_reader() callbacks and call_at() timers."""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+        # Writing to the socketpair interrupts select() when another thread
+        # schedules an earlier deadline or stops the loop.
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeup)
+
+    def add_reader(self, fileobj, callback):
+        """callback() runs whenever fileobj is readable (or has a pending error)."""
+        self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def call_at(self, deadline_ns, callback, *args):
+        with self._lock:
+            earliest = not self.timers or deadline_ns < self.timers[0][0]
+            heapq.heappush(self.timers, (deadline_ns, next(self._order), callback, args))
+        if earliest and threading.current_thread() is not self._thread:
+            self._wakeup()
+
+    def call_later(self, delay, callback, *args):
+        self.call_at(time.perf_counter_ns() + int(delay * 1e9), callback, *args)
+
+    def stop(self):
+        self._stopped = True
+        if threading.current_thread() is not self._thread:
+            self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wake_w.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _run_timers(self):
+        now = time.perf_counter_ns()
+        while True:
+            with self._lock:
+                if not self.timers or self.timers[0][0] > now:
+                    return
+                _, _, callback, args = heapq.heappop(self.timers)
+            callback(*args)
+
+    def run(self):
+        """Dispatch events and timers until stop() is called."""
+        self._thread = threading.current_thread()
+        while not self._stopped:
+            with self._lock:
+                timeout = (max(self.timers[0][0] - time.perf_counter_ns(), 0) / 1e9) if self.timers else None
+            for key, _ in self.selector.select(timeout):
+                key.data()
+            self._run_timers()
+
+    def run_in_thread(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Live OpenMetrics (Prometheus) endpoint for long-running client and server runs
+- Registry: counters and latency histograms updated in place from the packet
+  path (one dict update per event under an uncontended lock, since server
+  connections update it from several threads; no I/O)
+- collectors: callables run at scrape time for state kept elsewhere, e.g. the
+  server's per-source CounterTables in shared memory
+- serve_metrics(): HTTP server in a daemon thread rendering /metrics in the
+  OpenMetrics text format; a scrape only reads the counters, so a slow or
+  stuck scraper never delays the packet path
+"""
+
+import copy
+import http.server
+import threading
+
+from l2_stats import LatencyHistogram
+
+DEFAULT_ADDRESS = '127.0.0.1'
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+# Bucket bounds exported for latency histograms (seconds); the underlying
+# log-linear histogram is much finer and is summed up at scrape time.
+LATENCY_BUCKETS = (10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3,
+                   50e-3, 100e-3, 250e-3, 500e-3, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _snapshot(histogram):
+    # Copy of a histogram's state; the bucket list is copied in one C-level step.
+    snapshot = copy.copy(histogram)
+    snapshot.counts = histogram.counts[:]
+    return snapshot
+
+
+class Registry:
+    """Named counter and histogram families, keyed by label set."""
+
+    def __init__(self, prefix='l2'):
+        self.prefix = prefix
+        self.help = {}
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.counters.get(name)
+            if family is None:
+                family = self.counters[name] = {}
+            family[key] = family.get(key, 0) + value
+
+    def observe(self, name, value_ns, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.histograms.get(name)
+            if family is None:
+                family = self.histograms[name] = {}
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = LatencyHistogram()
+            histogram.record(value_ns)
+
+    def merge(self, name, histogram, **labels):
+        """Add a whole LatencyHistogram (e.g., a closed aggregation window) to a histogram family."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.histograms.get(name)
+            if family is None:
+                family = self.histograms[name] = {}
+            if key not in family:
+                family[key] = LatencyHistogram(histogram.sub_bucket_bits, histogram.max_value)
+            family[key].merge(histogram)
+
+    def add_collector(self, collector):
+        """collector() returns [(name, help, [(labels dict, value), ...])] counter families at scrape time."""
+        self.collectors.append(collector)
+
+    def _counter_lines(self, name, text, samples):
+        full = f"{self.prefix}_{name}"
+        lines = [f"# TYPE {full} counter"]
+        if text:
+            lines.append(f"# HELP {full} {text}")
+        for labels, value in samples:
+            lines.append(f"{full}_total{format_labels(labels)} {value}")
+        return lines
+
+    def render(self):
+        # Counters and histogram buckets are copied under the lock, so a scrape
+        # sees each one consistent, and formatted after releasing it, so the
+        # packet path only waits for the copy; collectors read their own state.
+        with self.lock:
+            counters = [(name, list(family.items())) for name, family in self.counters.items()]
+            histograms = [(name, [(labels, _snapshot(histogram)) for labels, histogram in family.items()])
+                          for name, family in self.histograms.items()]
+        lines = []
+        for name, samples in counters:
+            lines += self._counter_lines(name, self.help.get(name), samples)
+        for collector in self.collectors:
+            for name, text, samples in collector():
+                lines += self._counter_lines(name, text, [(tuple(sorted(labels.items())), value)
+                                                          for labels, value in samples])
+        lines += self._histogram_lines(histograms)
+        lines.append("# EOF")
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, histograms):
+        lines = []
+        for name, family in histograms:
+            full = f"{self.prefix}_{name}_seconds"
+            lines += [f"# TYPE {full} histogram", f"# UNIT {full} seconds"]
+            if name in self.help:
+                lines.append(f"# HELP {full} {self.help[name]}")
+            for labels, histogram in family:
+                count = histogram.count
+                cumulative = histogram.cumulative_counts([bound * 1e9 for bound in LATENCY_BUCKETS])
+                for bound, seen in zip(LATENCY_BUCKETS, cumulative):
+                    lines.append(f"{full}_bucket{format_labels(labels + (('le', bound),))} {min(seen, count)}")
+                lines.append(f"{full}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{full}_count{format_labels(labels)} {count}")
+                lines.append(f"{full}_sum{format_labels(labels)} {histogram.total / 1e9}")
+        return lines
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, address=DEFAULT_ADDRESS, registry=REGISTRY):
+    """Serve registry on http://address:port/metrics from a daemon thread; returns the server or None."""
+    handler = type('Handler', (MetricsHandler,), {'registry': registry})
+    try:
+        server = http.server.ThreadingHTTPServer((address, port), handler)
+    except OSError as e:
+        print(f"Metrics endpoint unavailable on {address}:{port} ({e})")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving OpenMetrics on http://{address}:{port}/metrics")
+    return server
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Batched frame I/O for AF_PACKET sockets
+- MmsgSender: transmit a batch of preallocated frames with one sendmmsg() call
+- MmsgReceiver: drain up to a batch of frames with one recvmmsg() call,
+  optionally with per-frame ancillary data (e.g., kernel timestamps)
+Both use libc through ctypes (the GIL is released during the call) and fall
+back to per-frame send()/recv_into() where sendmmsg/recvmmsg are missing.
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+
+MSG_DONTWAIT = 0x40
+DEFAULT_SNAPLEN = 2048
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_sendmmsg = getattr(_libc, 'sendmmsg', None)
+_recvmmsg = getattr(_libc, 'recvmmsg', None)
+if _sendmmsg is not None:
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+if _recvmmsg is not None:
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+
+HAVE_MMSG = _sendmmsg is not None and _recvmmsg is not None
+
+# struct cmsghdr { size_t cmsg_len; int cmsg_level; int cmsg_type; } + data
+CMSG_HEADER = struct.Struct('Nii')
+CMSG_ALIGN = ctypes.sizeof(ctypes.c_size_t)
+
+
+def _build_msgs(buffers, lengths):
+    count = len(buffers)
+    iovs = (iovec * count)()
+    msgs = (mmsghdr * count)()
+    for i, (buf, length) in enumerate(zip(buffers, lengths)):
+        iovs[i].iov_base = ctypes.addressof(buf)
+        iovs[i].iov_len = length
+        msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovs[i])
+        msgs[i].msg_hdr.msg_iovlen = 1
+    return iovs, msgs
+
+def parse_cmsgs(buf, length):
+    """Split a raw control buffer into (level, type, data) tuples like socket.recvmsg()."""
+    cmsgs = []
+    offset = 0
+    while offset + CMSG_HEADER.size <= length:
+        cmsg_len, level, cmsg_type = CMSG_HEADER.unpack_from(buf, offset)
+        if cmsg_len < CMSG_HEADER.size:
+            break
+        cmsgs.append((level, cmsg_type, bytes(buf[offset + CMSG_HEADER.size:offset + cmsg_len])))
+        offset += (cmsg_len + CMSG_ALIGN - 1) & ~(CMSG_ALIGN - 1)
+    return cmsgs
+
+def _raise_errno():
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+class MmsgSender:
+    """Preallocated batch of frames; frames are cycled to fill the batch.
+
+    buffers[i] is writable (e.g., struct.pack_into) so per-frame fields such
+    as sequence numbers can be updated between send() calls.
+    """
+
+    def __init__(self, sock, frames, batch):
+        self.sock = sock
+        self.batch = batch
+        self.buffers = [ctypes.create_string_buffer(frames[i % len(frames)], len(frames[i % len(frames)]))
+                        for i in range(batch)]
+        self.lengths = [len(frames[i % len(frames)]) for i in range(batch)]
+        self._iovs, self._msgs = _build_msgs(self.buffers, self.lengths)
+
+    def send(self, count=None):
+        """Send the first count frames of the batch; returns how many the kernel took."""
+        count = self.batch if count is None else count
+        if _sendmmsg is None:
+            for i in range(count):
+                self.sock.send(memoryview(self.buffers[i]).cast('B')[:self.lengths[i]])
+            return count
+        sent = _sendmmsg(self.sock.fileno(), self._msgs, count, 0)
+        if sent < 0:
+            if ctypes.get_errno() in (errno.EAGAIN, errno.ENOBUFS):
+                return 0
+            _raise_errno()
+        return sent
+
+
+class MmsgReceiver:
+    """Preallocated receive batch; after recv() frame(i) is the i-th frame.
+
+    With control_size > 0 each message also gets a control buffer and
+    ancillary(i) returns its (level, type, data) tuples.
+    """
+
+    def __init__(self, sock, batch, snaplen=DEFAULT_SNAPLEN, control_size=0):
+        self.sock = sock
+        self.batch = batch
+        self.buffers = [ctypes.create_string_buffer(snaplen) for _ in range(batch)]
+        self.lengths = [0] * batch
+        self._iovs, self._msgs = _build_msgs(self.buffers, [snaplen] * batch)
+        self.control_size = control_size
+        self._controls = [ctypes.create_string_buffer(control_size) for _ in range(batch)] if control_size else []
+        self._ancdata = [[] for _ in range(batch)]
+        for i, control in enumerate(self._controls):
+            self._msgs[i].msg_hdr.msg_control = ctypes.addressof(control)
+
+    def recv(self):
+        """Non-blocking: receive up to batch frames, returns the count (0 if none queued)."""
+        if _recvmmsg is None:
+            count = 0
+            while count < self.batch:
+                try:
+                    self.lengths[count], self._ancdata[count], _, _ = self.sock.recvmsg_into(
+                        [self.buffers[count]], self.control_size, MSG_DONTWAIT)
+                except (BlockingIOError, socket.timeout):
+                    break
+                count += 1
+            return count
+        # The kernel shrinks msg_controllen to what it used; reset it every call.
+        for i in range(len(self._controls)):
+            self._msgs[i].msg_hdr.msg_controllen = self.control_size
+        count = _recvmmsg(self.sock.fileno(), self._msgs, self.batch, MSG_DONTWAIT, None)
+        if count < 0:
+            if ctypes.get_errno() == errno.EAGAIN:
+                return 0
+            _raise_errno()
+        for i in range(count):
+            self.lengths[i] = self._msgs[i].msg_len
+        return count
+
+    def frame(self, i):
+        return memoryview(self.buffers[i]).cast('B')[:self.lengths[i]]
+
+    def ancillary(self, i):
+        if _recvmmsg is None or not self._controls:
+            return self._ancdata[i]
+        return parse_cmsgs(self._controls[i], self._msgs[i].msg_hdr.msg_controllen)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Multi-flow load generation for the L2 echo path
+N flows run in parallel, each with its own destination MAC, VLAN ID/PCP,
+payload size and (optionally) rate. Flows are spread over worker processes;
+each worker sends its flows with sendmmsg() and receives their echoes on a
+socket whose BPF filter only passes its own share of the flow IDs, so TX and
+RX both scale with the worker count. Per-flow and aggregate loss, reordering
+and latency are reported and saved as CSV.
+"""
+
+import heapq
+import itertools
+import multiprocessing
+import queue
+import socket
+import time
+
+from enhanced_l2_client import build_frame, save_csv, bytes_to_mac_str, ms, DEFAULT_BATCH, DRAIN_TIME
+from l2_filter import build_ethertype_filter, open_filtered_socket
+from l2_loop import EventLoop
+from l2_mmsg import MmsgSender, MmsgReceiver
+from l2_pacing import Pacer, parse_rate
+from l2_proto import payload_offset, pack_test_header, parse_test_header
+from l2_stats import SequenceTracker, LatencyStats
+
+# Flow IDs below this are used by the single-flow tests.
+FIRST_FLOW_ID = 0x100
+DEFAULT_PAYLOAD_SIZE = 500
+RESULT_MARGIN = 10.0  # seconds on top of duration + drain before giving up on a worker
+
+
+def make_flows(count, dst_macs, vlan_ids=None, pcps=None, payload_sizes=None, rate=None, priority=None):
+    """Build count flow specs; each list is cycled over the flows (None/empty = default).
+
+    priority is the SO_PRIORITY of the flows' send socket (None = leave the default).
+    """
+    vlan_ids = vlan_ids or [None]
+    pcps = pcps or [0]
+    payload_sizes = payload_sizes or [DEFAULT_PAYLOAD_SIZE]
+    flows = []
+    for i in range(count):
+        payload_size = payload_sizes[i % len(payload_sizes)]
+        flows.append({
+            'flow_id': FIRST_FLOW_ID + i,
+            'dst_mac': dst_macs[i % len(dst_macs)],
+            'vlan_id': vlan_ids[i % len(vlan_ids)],
+            'pcp': pcps[i % len(pcps)],
+            'payload_size': payload_size,
+            'rate_pps': parse_rate(rate, payload_size * 8),
+            'priority': priority,
+        })
+    return flows
+
+def flow_frame(flow, src_mac, ethertype):
+    payload = bytes(flow['payload_size'])
+    return build_frame(flow['dst_mac'], src_mac, ethertype, payload, flow['vlan_id'], flow['pcp'])
+
+def open_send_socket(interface, priority=None):
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    if priority is not None:
+        # skb->priority: picks the egress qdisc band / queue and, on VLAN
+        # devices, the PCP through the egress QoS map.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, priority)
+    sock.bind((interface, 0))
+    return sock
+
+def worker_main(index, workers, interface, src_mac, ethertype, flows, duration, batch, drain, results):
+    # The worker owns the flows with flow_id % workers == index; flows with
+    # different SO_PRIORITY values get separate send sockets.
+    send_socks = {}
+    for flow in flows:
+        if flow.get('priority') not in send_socks:
+            send_socks[flow.get('priority')] = open_send_socket(interface, flow.get('priority'))
+    dst_macs = {flow['dst_mac'] for flow in flows}
+    recv_filter = build_ethertype_filter(ethertype, src_mac=dst_macs.pop() if len(dst_macs) == 1 else None,
+                                         flow_shard=(index, workers))
+    recv_sock = open_filtered_socket(interface, ethertype, recv_filter)
+
+    state = {}
+    for flow in flows:
+        frame = flow_frame(flow, src_mac, ethertype)
+        pacer = Pacer(flow['rate_pps']) if flow['rate_pps'] else None
+        state[flow['flow_id']] = {
+            'flow': flow,
+            'sender': MmsgSender(send_socks[flow.get('priority')], [frame], batch),
+            'offset': payload_offset(frame),
+            'pacer': pacer,
+            'count': pacer.batch_size(batch) if pacer else batch,
+            'sent': 0,
+            'tracker': SequenceTracker(),
+            'latency': LatencyStats(),
+        }
+
+    loop = EventLoop()
+    receiver = MmsgReceiver(recv_sock, batch)
+    rx = {'frames': 0, 'expected': None}
+
+    def on_readable():
+        n = receiver.recv()
+        t_recv = time.perf_counter_ns()
+        for i in range(n):
+            header = parse_test_header(receiver.frame(i))
+            flow_state = state.get(header[0]) if header is not None else None
+            if flow_state is None:
+                continue
+            flow_state['tracker'].add(header[1])
+            flow_state['latency'].add(header[1], t_recv - header[2])
+            rx['frames'] += 1
+        if rx['expected'] is not None and rx['frames'] >= rx['expected']:
+            loop.stop()
+
+    loop.add_reader(recv_sock, on_readable)
+    rx_thread = loop.run_in_thread()
+
+    # Earliest-release-first over the flows: paced flows are keyed by their
+    # next scheduled release, unpaced ones by now, which round-robins them.
+    order = itertools.count()
+    schedule = [(0, next(order), flow_id) for flow_id in state]
+    heapq.heapify(schedule)
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        _, _, flow_id = heapq.heappop(schedule)
+        flow_state = state[flow_id]
+        pacer = flow_state['pacer']
+        count = flow_state['count']
+        if pacer:
+            pacer.wait(count)
+        sender = flow_state['sender']
+        t_send = time.perf_counter_ns()
+        for i in range(count):
+            pack_test_header(sender.buffers[i], flow_state['offset'], flow_id, flow_state['sent'] + i, t_send)
+        flow_state['sent'] += sender.send(count)
+        key = pacer.next_release_ns() if pacer else time.perf_counter_ns()
+        heapq.heappush(schedule, (key, next(order), flow_id))
+    tx_elapsed = time.perf_counter() - start
+
+    rx['expected'] = sum(flow_state['sent'] for flow_state in state.values())
+    loop.call_at(0, on_readable)
+    loop.call_later(drain, loop.stop)
+    rx_thread.join()
+    loop.close()
+    for sock in send_socks.values():
+        sock.close()
+    recv_sock.close()
+
+    results.put([{
+        'flow': flow_state['flow'],
+        'sent': flow_state['sent'],
+        'tx_elapsed': tx_elapsed,
+        'stats': flow_state['tracker'].finish(flow_state['sent'] - 1),
+        'latency': flow_state['latency'].to_dict(),
+    } for flow_state in state.values()])
+
+def summarize(result):
+    stats = result['stats']
+    sent = result['sent']
+    elapsed = result['tx_elapsed'] or 1.0
+    latency = LatencyStats.from_dict(result['latency']).summary()
+    return {
+        'sent': sent,
+        'received': stats['received'],
+        'lost': stats['lost'],
+        'loss_pct': stats['lost'] / sent * 100 if sent else 0.0,
+        'reordered': stats['reordered'],
+        'duplicates': stats['duplicates'],
+        'offered_pps': sent / elapsed,
+        'delivered_pps': stats['received'] / elapsed,
+        'latency': latency,
+    }
+
+def format_summary(label, summary):
+    latency = summary['latency']
+    lat = (f", latency p50/p99/max {latency['p50'] / 1e6:.3f}/{latency['p99'] / 1e6:.3f}/"
+           f"{latency['max'] / 1e6:.3f} ms" if latency['count'] else "")
+    return (f"{label}: sent {summary['sent']}, received {summary['received']}, lost {summary['lost']} "
+            f"({summary['loss_pct']:.2f}%), reordered {summary['reordered']}, "
+            f"{summary['offered_pps']:.0f} -> {summary['delivered_pps']:.0f} pps{lat}")
+
+def csv_row(name, flow, summary):
+    latency = summary['latency']
+    return [name,
+            bytes_to_mac_str(flow['dst_mac']) if flow else '',
+            flow['vlan_id'] if flow and flow['vlan_id'] is not None else '',
+            flow['pcp'] if flow else '',
+            flow['payload_size'] if flow else '',
+            (flow['rate_pps'] or '') if flow else '',
+            summary['sent'], summary['received'], summary['lost'], summary['loss_pct'],
+            summary['reordered'], summary['duplicates'], summary['offered_pps'], summary['delivered_pps'],
+            ms(latency['p50']), ms(latency['p99']), ms(latency['max']), ms(latency['jitter'])]
+
+def run_flows(interface, src_mac, ethertype, flows, duration, workers=1, batch=DEFAULT_BATCH,
+              drain=DRAIN_TIME, filename='multiflow_test.csv'):
+    """Run all flows concurrently over `workers` processes; returns per-flow and aggregate results."""
+    workers = max(1, min(workers, len(flows)))
+    results = multiprocessing.Queue()
+    procs = []
+    for index in range(workers):
+        owned = [flow for flow in flows if flow['flow_id'] % workers == index]
+        p = multiprocessing.Process(target=worker_main,
+                                    args=(index, workers, interface, src_mac, ethertype, owned,
+                                          duration, batch, drain, results),
+                                    daemon=True)
+        p.start()
+        procs.append(p)
+
+    print(f"Running {len(flows)} flows on {workers} worker(s) for {duration} s...")
+    flow_results = []
+    deadline = time.time() + duration + drain + RESULT_MARGIN
+    try:
+        for _ in procs:
+            flow_results += results.get(timeout=max(deadline - time.time(), 0.1))
+    except queue.Empty:
+        print("Warning: not all workers reported back; results are partial")
+    finally:
+        for p in procs:
+            p.join(timeout=1.0)
+            if p.is_alive():
+                p.terminate()
+
+    flow_results.sort(key=lambda r: r['flow']['flow_id'])
+    rows = []
+    merged = LatencyStats()
+    aggregate = {'sent': 0, 'tx_elapsed': 0.0,
+                 'stats': {'received': 0, 'lost': 0, 'reordered': 0, 'duplicates': 0}}
+    for result in flow_results:
+        flow = result['flow']
+        summary = summarize(result)
+        result['summary'] = summary
+        label = (f"Flow {flow['flow_id']} -> {bytes_to_mac_str(flow['dst_mac'])}"
+                 + (f" VLAN {flow['vlan_id']}/PCP {flow['pcp']}" if flow['vlan_id'] is not None else "")
+                 + f" {flow['payload_size']} B")
+        print(format_summary(label, summary))
+        merged.merge(LatencyStats.from_dict(result['latency']))
+        aggregate['sent'] += result['sent']
+        aggregate['tx_elapsed'] = max(aggregate['tx_elapsed'], result['tx_elapsed'])
+        for key in aggregate['stats']:
+            aggregate['stats'][key] += result['stats'][key]
+        rows.append(csv_row(flow['flow_id'], flow, summary))
+
+    aggregate['latency'] = merged.to_dict()
+    total = summarize(aggregate)
+    print(format_summary(f"All {len(flow_results)} flows", total))
+    rows.append(csv_row('all', None, total))
+    save_csv(filename,
+             ['Flow', 'Dst_MAC', 'VLAN', 'PCP', 'Payload_Bytes', 'Target_pps', 'Sent', 'Received', 'Lost',
+              'Loss_pct', 'Reordered', 'Duplicates', 'Offered_pps', 'Delivered_pps',
+              'Latency_p50_ms', 'Latency_p99_ms', 'Latency_max_ms', 'Jitter_ms'], rows)
+    return {'flows': flow_results, 'aggregate': total}
+
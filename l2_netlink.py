@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+VXLAN testbed provisioning over rtnetlink (replaces vxlanconf2.sh / vxlan_teardown.sh)
+- Netlink: NETLINK_ROUTE socket that queues requests and sends them in
+  batches (many nlmsgs per datagram), then collects one ACK per request, so
+  dozens of VXLANs cost a few syscalls instead of four `ip` processes each
+- vxlan links are created with their MAC (02:00:<VNI hi>:<VNI lo>:00:<NODE>),
+  UDP port and IFF_UP in one RTM_NEWLINK; addresses follow in one batch
+- named network namespaces (/run/netns, compatible with `ip netns`), and a
+  self-contained testbed: two namespaces joined by a veth pair carrying
+  VXLANs, so client and server can be benchmarked with no external network
+
+    l2_netlink.py up 42 43 --dev enp0s8 --base 10.10.10.0/24 --node 3 --remote 192.168.1.20
+    l2_netlink.py down 42 43 [--links br42]
+    l2_netlink.py testbed up --vni 42 ; l2_netlink.py exec l2tb-b -- python3 enhanced_l2_server.py vxlan42 0x88B5
+    l2_netlink.py testbed down
+"""
+
+import argparse
+import contextlib
+import ctypes
+import errno
+import ipaddress
+import os
+import socket
+import struct
+import sys
+
+# linux/netlink.h, linux/rtnetlink.h, linux/if_link.h
+NETLINK_ROUTE = 0
+NLMSG_HEADER = struct.Struct('=IHHII')   # len, type, flags, seq, pid
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+IFINFOMSG = struct.Struct('=BxHiII')     # family, type, index, flags, change
+IFADDRMSG = struct.Struct('=BBBBI')      # family, prefixlen, flags, scope, index
+RTATTR = struct.Struct('=HH')
+IFF_UP = 0x1
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_NET_NS_FD = 28
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+IFLA_VXLAN_ID = 1
+IFLA_VXLAN_GROUP = 2
+IFLA_VXLAN_LINK = 3
+IFLA_VXLAN_LOCAL = 4
+IFLA_VXLAN_PORT = 15
+VETH_INFO_PEER = 1
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+CLONE_NEWNET = 0x40000000
+MS_BIND = 0x1000
+MNT_DETACH = 0x2
+NETNS_RUN_DIR = '/run/netns'
+
+VXLAN_PORT = 4789
+BATCH_SIZE = 64          # requests per datagram
+RECV_BUF_SIZE = 1 << 16
+
+# Testbed: namespaces A (client, node 1) and B (server, node 2) joined by a
+# veth pair carrying the VXLAN underlay.
+TESTBED_NS = ('l2tb-a', 'l2tb-b')
+TESTBED_VETH = ('l2tb-a0', 'l2tb-b0')
+TESTBED_UNDERLAY = '192.168.77.0/24'
+TESTBED_OVERLAY = '10.10.10.0/24'
+TESTBED_VNI = 42
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class NetlinkError(OSError):
+    pass
+
+
+def _check(result, what):
+    if result != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, f"{what}: {os.strerror(err)}")
+
+def attr(attr_type, data):
+    """One rtattr, padded to 4 bytes; data is bytes or a list of nested attrs."""
+    if isinstance(data, list):
+        data = b''.join(data)
+    length = RTATTR.size + len(data)
+    return RTATTR.pack(length, attr_type) + data + bytes(-length % 4)
+
+def attr_str(attr_type, text):
+    return attr(attr_type, text.encode() + b'\0')
+
+def attr_u32(attr_type, value):
+    return attr(attr_type, struct.pack('=I', value))
+
+def vxlan_mac(vni, node):
+    # Same scheme as vxlanconf2.sh: 02:00:<VNI hi>:<VNI lo>:00:<NODE>
+    return bytes([0x02, 0x00, (vni >> 8) & 0xFF, vni & 0xFF, 0x00, node & 0xFF])
+
+def vxlan_name(vni):
+    return f"vxlan{vni}"
+
+def node_address(base, node, offset=0):
+    """Address node in the offset-th subnet after base (e.g. one subnet per VNI), as an interface."""
+    network = ipaddress.ip_network(base, strict=False)
+    first = int(network.network_address) + offset * network.num_addresses
+    return ipaddress.ip_interface(f"{ipaddress.ip_address(first + node)}/{network.prefixlen}")
+
+
+class Netlink:
+    """rtnetlink socket with batched, acknowledged requests."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        self.queue = []
+
+    def close(self):
+        self.sock.close()
+
+    def add(self, msg_type, flags, body, description):
+        """Queue one request; body is the family header plus attributes."""
+        self.seq += 1
+        message = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body), msg_type, flags | NLM_F_REQUEST | NLM_F_ACK,
+                                    self.seq, 0) + body
+        self.queue.append((self.seq, message, description))
+
+    def commit(self, ignore=()):
+        """Send everything queued; returns [(description, errno)] for failed requests not in ignore."""
+        failures = []
+        queue, self.queue = self.queue, []
+        for start in range(0, len(queue), BATCH_SIZE):
+            batch = queue[start:start + BATCH_SIZE]
+            self.sock.send(b''.join(message for _, message, _ in batch))
+            pending = {seq: description for seq, _, description in batch}
+            while pending:
+                data = self.sock.recv(RECV_BUF_SIZE)
+                offset = 0
+                while offset + NLMSG_HEADER.size <= len(data):
+                    length, msg_type, _, seq, _ = NLMSG_HEADER.unpack_from(data, offset)
+                    if msg_type == NLMSG_ERROR and seq in pending:
+                        code = -struct.unpack_from('=i', data, offset + NLMSG_HEADER.size)[0]
+                        description = pending.pop(seq)
+                        if code and code not in ignore:
+                            failures.append((description, code))
+                    offset += max((length + 3) & ~3, NLMSG_HEADER.size)
+        return failures
+
+    def commit_or_raise(self, ignore=()):
+        failures = self.commit(ignore)
+        if failures:
+            raise NetlinkError(failures[0][1], '; '.join(f"{description}: {os.strerror(code)}"
+                                                         for description, code in failures))
+
+    def new_link(self, name, kind=None, data=None, mac=None, up=False, netns_fd=None, extra=None):
+        attrs = [attr_str(IFLA_IFNAME, name)]
+        if mac:
+            attrs.append(attr(IFLA_ADDRESS, mac))
+        if netns_fd is not None:
+            attrs.append(attr_u32(IFLA_NET_NS_FD, netns_fd))
+        if kind:
+            info = [attr_str(IFLA_INFO_KIND, kind)]
+            if data:
+                info.append(attr(IFLA_INFO_DATA, data))
+            attrs.append(attr(IFLA_LINKINFO, info))
+        attrs += extra or []
+        flags = IFF_UP if up else 0
+        self.add(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, IFINFOMSG.pack(0, 0, 0, flags, flags) + b''.join(attrs),
+                 f"create {name}")
+
+    def new_vxlan(self, name, vni, dev_index=None, remote=None, local=None, port=VXLAN_PORT, mac=None, up=True):
+        data = [attr_u32(IFLA_VXLAN_ID, vni), attr(IFLA_VXLAN_PORT, struct.pack('!H', port))]
+        if dev_index:
+            data.append(attr_u32(IFLA_VXLAN_LINK, dev_index))
+        if remote:
+            data.append(attr(IFLA_VXLAN_GROUP, ipaddress.IPv4Address(remote).packed))
+        if local:
+            data.append(attr(IFLA_VXLAN_LOCAL, ipaddress.IPv4Address(local).packed))
+        self.new_link(name, 'vxlan', data, mac, up)
+
+    def new_veth(self, name, peer, netns_fd=None, peer_netns_fd=None):
+        peer_attrs = [attr_str(IFLA_IFNAME, peer)]
+        if peer_netns_fd is not None:
+            peer_attrs.append(attr_u32(IFLA_NET_NS_FD, peer_netns_fd))
+        peer_info = IFINFOMSG.pack(0, 0, 0, 0, 0) + b''.join(peer_attrs)
+        self.new_link(name, 'veth', [attr(VETH_INFO_PEER, peer_info)], netns_fd=netns_fd)
+
+    def set_up(self, index, name):
+        self.add(RTM_NEWLINK, 0, IFINFOMSG.pack(0, 0, index, IFF_UP, IFF_UP), f"set {name} up")
+
+    def delete_link(self, name):
+        self.add(RTM_DELLINK, 0, IFINFOMSG.pack(0, 0, 0, 0, 0) + attr_str(IFLA_IFNAME, name), f"delete {name}")
+
+    def new_address(self, index, interface, name):
+        """Add an ipaddress.IPv4Interface to link index."""
+        packed = interface.ip.packed
+        body = (IFADDRMSG.pack(socket.AF_INET, interface.network.prefixlen, 0, 0, index)
+                + attr(IFA_LOCAL, packed) + attr(IFA_ADDRESS, packed))
+        self.add(RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL, body, f"add {interface} to {name}")
+
+
+# Named network namespaces, as `ip netns add/del/exec` does them.
+
+def netns_path(name):
+    return os.path.join(NETNS_RUN_DIR, name)
+
+def create_netns(name):
+    os.makedirs(NETNS_RUN_DIR, exist_ok=True)
+    path = netns_path(name)
+    open(path, 'x').close()
+    # unshare() in a child so this process stays in its namespace; the bind
+    # mount keeps the new namespace alive after the child exits.
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _check(_libc.unshare(CLONE_NEWNET), "unshare")
+            _check(_libc.mount(b'/proc/self/ns/net', path.encode(), b'none', MS_BIND, None), "mount")
+            os._exit(0)
+        except OSError:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        os.unlink(path)
+        raise OSError(f"could not create network namespace {name}")
+
+def delete_netns(name):
+    path = netns_path(name)
+    if not os.path.exists(path):
+        return False
+    _libc.umount2(path.encode(), MNT_DETACH)
+    os.unlink(path)
+    return True
+
+@contextlib.contextmanager
+def netns(name):
+    """Run the block (this thread) inside namespace name; sockets opened there stay in it."""
+    own = os.open('/proc/thread-self/ns/net', os.O_RDONLY)
+    target = os.open(netns_path(name), os.O_RDONLY)
+    try:
+        _check(_libc.setns(target, CLONE_NEWNET), f"setns {name}")
+        try:
+            yield
+        finally:
+            _check(_libc.setns(own, CLONE_NEWNET), "setns back")
+    finally:
+        os.close(target)
+        os.close(own)
+
+
+# Provisioning
+
+def provision_vxlans(vnis, dev, base, node, remote=None, local=None, port=VXLAN_PORT):
+    """Create, address and bring up vxlan<VNI> for every VNI; the i-th VNI gets the i-th subnet after base."""
+    nl = Netlink()
+    try:
+        dev_index = socket.if_nametoindex(dev)
+        for vni in vnis:
+            nl.new_vxlan(vxlan_name(vni), vni, dev_index, remote, local, port, vxlan_mac(vni, node))
+        nl.commit_or_raise()
+        addresses = []
+        for offset, vni in enumerate(vnis):
+            address = node_address(base, node, offset)
+            nl.new_address(socket.if_nametoindex(vxlan_name(vni)), address, vxlan_name(vni))
+            addresses.append((vxlan_name(vni), vxlan_mac(vni, node), address))
+        nl.commit_or_raise()
+        return addresses
+    finally:
+        nl.close()
+
+def delete_links(names):
+    """Delete links by name in one batch; links that do not exist are skipped."""
+    nl = Netlink()
+    try:
+        for name in names:
+            nl.delete_link(name)
+        nl.commit_or_raise(ignore=(errno.ENODEV,))
+    finally:
+        nl.close()
+
+def testbed_up(vnis=(TESTBED_VNI,), underlay=TESTBED_UNDERLAY, overlay=TESTBED_OVERLAY, port=VXLAN_PORT):
+    """Two namespaces joined by a veth pair, with vxlan<VNI> over it in each; returns the layout."""
+    for name in TESTBED_NS:
+        create_netns(name)
+    fds = [os.open(netns_path(name), os.O_RDONLY) for name in TESTBED_NS]
+    try:
+        nl = Netlink()
+        try:
+            nl.new_veth(TESTBED_VETH[0], TESTBED_VETH[1], fds[0], fds[1])
+            nl.commit_or_raise()
+        finally:
+            nl.close()
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    underlay_ips = [node_address(underlay, node) for node in (1, 2)]
+    layout = []
+    for side, (ns, veth) in enumerate(zip(TESTBED_NS, TESTBED_VETH)):
+        node = side + 1
+        with netns(ns):
+            nl = Netlink()
+            try:
+                nl.set_up(socket.if_nametoindex('lo'), 'lo')
+                veth_index = socket.if_nametoindex(veth)
+                nl.set_up(veth_index, veth)
+                nl.new_address(veth_index, underlay_ips[side], veth)
+                for vni in vnis:
+                    nl.new_vxlan(vxlan_name(vni), vni, veth_index, str(underlay_ips[1 - side].ip),
+                                 str(underlay_ips[side].ip), port, vxlan_mac(vni, node))
+                nl.commit_or_raise()
+                for offset, vni in enumerate(vnis):
+                    address = node_address(overlay, node, offset)
+                    nl.new_address(socket.if_nametoindex(vxlan_name(vni)), address, vxlan_name(vni))
+                    layout.append({'netns': ns, 'interface': vxlan_name(vni), 'mac': vxlan_mac(vni, node),
+                                   'address': address})
+                nl.commit_or_raise()
+            finally:
+                nl.close()
+    return layout
+
+def testbed_down():
+    # Deleting the namespaces destroys the veth pair and the VXLANs in them.
+    return [name for name in TESTBED_NS if delete_netns(name)]
+
+def exec_in_netns(name, argv):
+    fd = os.open(netns_path(name), os.O_RDONLY)
+    _check(_libc.setns(fd, CLONE_NEWNET), f"setns {name}")
+    os.execvp(argv[0], argv)
+
+
+def format_mac(mac):
+    return ':'.join(f'{x:02x}' for x in mac)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="VXLAN provisioning over rtnetlink")
+    sub = parser.add_subparsers(dest='command', required=True)
+    up = sub.add_parser('up', help="create vxlan<VNI> links with MAC, address and link up")
+    up.add_argument('vnis', type=int, nargs='+')
+    up.add_argument('--dev', required=True, help="underlay (physical) interface")
+    up.add_argument('--base', required=True, help="overlay subnet, e.g. 10.10.10.0/24; VNI i uses the i-th subnet")
+    up.add_argument('--node', type=int, default=1, help="node ID: last address byte and MAC byte (default 1)")
+    up.add_argument('--remote', default=None, help="remote VTEP IPv4 address")
+    up.add_argument('--local', default=None, help="local VTEP IPv4 address")
+    up.add_argument('--port', type=int, default=VXLAN_PORT)
+    down = sub.add_parser('down', help="delete vxlan<VNI> links (and any --links)")
+    down.add_argument('vnis', type=int, nargs='*')
+    down.add_argument('--links', nargs='*', default=[], help="further links to delete, e.g. bridges")
+    testbed = sub.add_parser('testbed', help="two namespaces joined by veth with VXLANs over it")
+    testbed.add_argument('action', choices=('up', 'down'))
+    testbed.add_argument('--vni', type=int, nargs='+', default=[TESTBED_VNI])
+    run = sub.add_parser('exec', help="run a command inside a network namespace")
+    run.add_argument('netns')
+    run.add_argument('argv', nargs=argparse.REMAINDER)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if os.geteuid() != 0:
+        print("Permission denied: run as root.")
+        sys.exit(1)
+    try:
+        if args.command == 'up':
+            for name, mac, address in provision_vxlans(args.vnis, args.dev, args.base, args.node, args.remote,
+                                                       args.local, args.port):
+                print(f"{name}: MAC {format_mac(mac)}, address {address}, up")
+        elif args.command == 'down':
+            names = [vxlan_name(vni) for vni in args.vnis] + args.links
+            delete_links(names)
+            print(f"Deleted (where present): {', '.join(names)}")
+        elif args.command == 'testbed' and args.action == 'up':
+            for entry in testbed_up(args.vni):
+                print(f"{entry['netns']}: {entry['interface']} MAC {format_mac(entry['mac'])}, address {entry['address']}")
+            print(f"Server: {sys.argv[0]} exec {TESTBED_NS[1]} -- python3 enhanced_l2_server.py "
+                  f"{vxlan_name(args.vni[0])} 0x88B5")
+            print(f"Client: {sys.argv[0]} exec {TESTBED_NS[0]} -- python3 enhanced_l2_client.py")
+        elif args.command == 'testbed':
+            removed = testbed_down()
+            print(f"Removed namespaces: {', '.join(removed) or 'none'}")
+        else:
+            argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+            if not argv:
+                print("exec: no command given")
+                sys.exit(1)
+            exec_in_netns(args.netns, argv)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
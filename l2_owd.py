@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+One-way delay from client and server timestamps
+Each probe yields four stamps: t1 client TX, t2 server RX, t3 server echo,
+t4 client RX. Client and server clocks differ by an unknown offset that
+drifts, so as in NTP:
+- offset = ((t2 - t1) + (t3 - t4)) / 2 and delay = (t4 - t1) - (t3 - t2)
+  per probe, trusting only the minimum-delay probe of each window (the one
+  least disturbed by queueing)
+- a least-squares line through those minima gives offset and drift, and is
+  used to put t2/t3 on the client's clock
+Uplink (t2 - t1) and downlink (t4 - t3) delay and jitter then come out
+separately. The split of the *minimum* delay assumes the base delay is
+symmetric (nothing can observe that without synchronised clocks); every
+variation above it, e.g. uplink scheduling or queueing on the 5G side, is
+attributed to the right direction.
+"""
+
+from l2_stats import LatencyHistogram, LatencyStats
+
+DEFAULT_WINDOW = 64  # probes per min-filter window
+
+
+class OneWayDelay:
+    """Streaming offset/drift estimator and per-direction delay stats (bounded memory)."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.pending = []
+        self.uplink = LatencyStats()
+        self.downlink = LatencyStats()
+        self.server = LatencyHistogram()  # time the frame spent in the server
+        self.origin = None
+        self.base = None
+        # Running least-squares sums over the window minima: x = t1 in s since
+        # the first probe, y = offset in ns.
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.negative = 0
+
+    def add(self, seq, t1, t2, t3, t4):
+        """Add one probe's stamps (ns); samples must be added in arrival order."""
+        if self.origin is None:
+            # The clocks may be decades apart (e.g., monotonic vs. realtime);
+            # work relative to the first raw offset to keep float precision.
+            self.origin = t1
+            self.base = t2 - t1
+        self.pending.append((seq, t1, t2 - self.base, t3 - self.base, t4))
+        if len(self.pending) >= self.window:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        _, t1, t2, t3, t4 = min(self.pending, key=lambda s: (s[4] - s[1]) - (s[3] - s[2]))
+        x = (t1 - self.origin) / 1e9
+        y = ((t2 - t1) + (t3 - t4)) / 2
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+        for seq, t1, t2, t3, t4 in self.pending:
+            offset = self.offset_at(t1)
+            uplink = t2 - offset - t1
+            downlink = t4 - (t3 - offset)
+            if uplink < 0 or downlink < 0:
+                # Estimation noise around the minimum; recorded as 0.
+                self.negative += 1
+            self.uplink.add(seq, max(uplink, 0))
+            self.downlink.add(seq, max(downlink, 0))
+            self.server.record(t3 - t2)
+        self.pending = []
+
+    def fit(self):
+        """Return (offset ns at the first probe, drift in ns per s)."""
+        if not self.n:
+            return 0.0, 0.0
+        denom = self.n * self.sxx - self.sx * self.sx
+        drift = (self.n * self.sxy - self.sx * self.sy) / denom if self.n > 1 and denom else 0.0
+        return (self.sy - drift * self.sx) / self.n, drift
+
+    def offset_at(self, t1):
+        offset, drift = self.fit()
+        return offset + drift * (t1 - self.origin) / 1e9
+
+    def finish(self):
+        self._flush()
+        return self.summary()
+
+    def summary(self):
+        offset, drift = self.fit()
+        return {
+            'offset_ns': (self.base or 0) + offset,
+            'drift_ppm': drift / 1e3,
+            'windows': self.n,
+            'clamped': self.negative,
+            'uplink': self.uplink.summary(),
+            'downlink': self.downlink.summary(),
+            'server': self.server.summary(),
+        }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Rate pacing for the L2 test client
+- Pacer: token bucket on time.perf_counter_ns() that holds a target packet
+  rate; waits sleep for the bulk of the gap and spin for the last part, so
+  releases land within a few microseconds of schedule
+- parse_rate(): turn "10000pps" / "50Mbps" style input into packets/s
+The pacer records how late each release was against its scheduled time and
+reports the achieved rate and that pacing error.
+"""
+
+import re
+import time
+
+# Below this much remaining wait time we spin instead of sleeping, since
+# time.sleep() routinely overshoots by 50-100 us or more.
+SPIN_THRESHOLD_NS = 200_000
+# When sending in batches, a batch never covers more than this window of the
+# schedule, so low rates are not turned into large bursts.
+BATCH_WINDOW_NS = 1_000_000
+# Default token bucket depth, as time: a sender stalled for longer than this
+# does not make up the difference.
+MAX_DEBT_NS = 5_000_000
+
+_RATE_RE = re.compile(r'^\s*([0-9]*\.?[0-9]+)\s*([kKmMgG]?)\s*(pps|bps|b/s|p/s)?\s*$')
+_MULTIPLIERS = {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9}
+
+
+def parse_rate(text, frame_bits):
+    """Return the packet rate for text such as '5000', '20kpps' or '50Mbps' (None if empty)."""
+    if not text or not text.strip():
+        return None
+    match = _RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r}")
+    value = float(match.group(1)) * _MULTIPLIERS[match.group(2).lower()]
+    unit = (match.group(3) or 'pps').lower()
+    if unit in ('bps', 'b/s'):
+        return value / frame_bits
+    return value
+
+def wait_until(deadline_ns, spin_threshold_ns=SPIN_THRESHOLD_NS):
+    """Hybrid wait: sleep while far from the deadline, spin for the last stretch."""
+    remaining = deadline_ns - time.perf_counter_ns()
+    if remaining > spin_threshold_ns:
+        time.sleep((remaining - spin_threshold_ns) / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+
+
+class Pacer:
+    """Token bucket holding rate_pps, kept as a virtual schedule of release times.
+
+    burst is the bucket depth beyond the next packet: if the sender falls
+    behind (GC pause, blocking send) it may catch up by at most `burst`
+    packets back to back; any further debt is forgotten, so the achieved
+    rate drops instead of the line seeing a large burst. By default the
+    bucket holds MAX_DEBT_NS worth of packets (at least one).
+    """
+
+    def __init__(self, rate_pps, burst=None, spin_threshold_ns=SPIN_THRESHOLD_NS):
+        if rate_pps <= 0:
+            raise ValueError("rate_pps must be positive")
+        self.rate_pps = rate_pps
+        self.interval_ns = 1e9 / rate_pps
+        if burst is None:
+            burst = int(MAX_DEBT_NS / self.interval_ns)
+        self.burst = max(burst, 1)
+        self.spin_threshold_ns = spin_threshold_ns
+        self.start_ns = None
+        self.released = 0
+        self.waits = 0
+        self.err_sum_ns = 0
+        self.err_max_ns = 0
+
+    def start(self):
+        self.start_ns = time.perf_counter_ns()
+        self._next_ns = self.start_ns
+
+    def batch_size(self, batch):
+        """Largest batch that stays within BATCH_WINDOW_NS of the schedule."""
+        return max(1, min(batch, int(BATCH_WINDOW_NS / self.interval_ns)))
+
+    def next_release_ns(self):
+        """Scheduled time of the next release, e.g. to pick the most urgent of several pacers."""
+        if self.start_ns is None:
+            self.start()
+        return int(max(self._next_ns, time.perf_counter_ns() - self.burst * self.interval_ns))
+
+    def wait(self, tokens=1):
+        """Block until `tokens` packets may be sent, then consume them."""
+        if self.start_ns is None:
+            self.start()
+        now = time.perf_counter_ns()
+        max_debt = self.burst * self.interval_ns
+        if now - self._next_ns > max_debt:
+            self._next_ns = now - max_debt
+        if self._next_ns > now:
+            wait_until(int(self._next_ns), self.spin_threshold_ns)
+            now = time.perf_counter_ns()
+
+        # Pacing error: how late the release was against its scheduled time.
+        late = max(now - self._next_ns, 0)
+        self.waits += 1
+        self.err_sum_ns += late
+        if late > self.err_max_ns:
+            self.err_max_ns = late
+
+        self._next_ns += tokens * self.interval_ns
+        self.released += tokens
+        self._last_release_ns = now
+        self._last_tokens = tokens
+
+    def report(self):
+        """Return achieved rate, rate error and how late releases were (mean/max)."""
+        # The last release opens an interval that has not elapsed yet, so the
+        # rate is measured over the packets released before it.
+        elapsed_ns = self._last_release_ns - self.start_ns if self.released else 0
+        achieved = (self.released - self._last_tokens) / (elapsed_ns / 1e9) if elapsed_ns else 0.0
+        waits = max(self.waits, 1)
+        return {
+            'target_pps': self.rate_pps,
+            'achieved_pps': achieved,
+            'rate_error_pct': (achieved - self.rate_pps) / self.rate_pps * 100,
+            'mean_abs_error_us': self.err_sum_ns / waits / 1e3,
+            'max_abs_error_us': self.err_max_ns / 1e3,
+        }
+
+def format_report(report):
+    return (f"Target: {report['target_pps']:.1f} pps, achieved: {report['achieved_pps']:.1f} pps "
+            f"({report['rate_error_pct']:+.3f}%), pacing error mean {report['mean_abs_error_us']:.1f} us, "
+            f"max {report['max_abs_error_us']:.1f} us")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Path MTU discovery for the L2 echo path
+Binary search over the payload size: a size passes when a probe of that size
+comes back whole (same payload length, CRC32 intact). Frames too big for the
+path (VXLAN's 50 bytes, the modem's own encapsulation) just vanish, so a
+size gets a few probes before it counts as too big.
+- untagged and 802.1Q-tagged frames are searched separately
+- the local interface MTU is the upper bound and is tried first, so a clean
+  path costs one probe; otherwise the search takes about log2(MTU) probes
+- an echo only passes on the VLAN the probe went out on: the probes are
+  read on their own ETH_P_ALL socket with PACKET_AUXDATA, since the kernel
+  drops an unclaimed tag before sockets bound to the test EtherType see it
+- the result (largest intact payload) is the limit the client applies to
+  every other test's payload sizes (and l2_scenario to later runs)
+"""
+
+import errno
+import select
+import struct
+import time
+
+import l2_transport
+from enhanced_l2_client import build_frame, generate_payload, save_csv
+from l2_filter import build_ethertype_filter, open_filtered_socket
+from l2_proto import payload_offset, pack_test_header, parse_test_header, checksum_ok, TEST_HEADER, FLAG_CHECKSUM
+from l2_transport import aux_vlan, ETH_P_ALL, SOL_PACKET, PACKET_AUXDATA, AUXDATA_SIZE
+
+PMTU_FLOW = 5
+MIN_PAYLOAD = TEST_HEADER.size
+DEFAULT_MAX_PAYLOAD = 9000   # upper bound when the interface MTU is unknown (unix links)
+DEFAULT_ATTEMPTS = 2         # probes per size before it counts as too big
+DEFAULT_TIMEOUT = 0.3        # seconds to wait for each probe's echo
+
+
+def echo_vlan(frame, ancdata):
+    # VLAN ID the echo came back on: its in-band tag, or the tag the kernel stripped.
+    if payload_offset(frame) == 18:
+        return struct.unpack_from('!H', frame, 14)[0] & 0x0FFF
+    tag = aux_vlan(ancdata)
+    return tag[0] & 0x0FFF if tag is not None else None
+
+def open_probe_socket(interface, ethertype, vlan_id, dst_mac):
+    # Echoes from dst_mac on vlan_id (or untagged), tags still visible.
+    sock = open_filtered_socket(interface, ETH_P_ALL, build_ethertype_filter(ethertype, vlan_id, src_mac=dst_mac))
+    sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+    return sock
+
+def probe_size(send_sock, recv_sock, frame, seq, attempts, timeout, vlan_id=None):
+    """True if frame (a test frame, header packed per attempt) echoes back whole on vlan_id; seq is the first to use."""
+    offset = payload_offset(frame)
+    size = len(frame) - offset
+    for attempt in range(attempts):
+        pack_test_header(frame, offset, PMTU_FLOW, seq + attempt, time.perf_counter_ns(), FLAG_CHECKSUM)
+        try:
+            send_sock.send(frame)
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:
+                return False  # larger than the local interface takes
+            if e.errno == errno.ENOBUFS:
+                continue      # dropped on the way out (veth peer MTU, full queue)
+            raise
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not select.select([recv_sock], [], [], remaining)[0]:
+                break
+            echoed, ancdata, _, _ = recv_sock.recvmsg(65535, AUXDATA_SIZE)
+            header = parse_test_header(echoed)
+            # Earlier probes' late echoes carry other sequence numbers.
+            if header is None or header[0] != PMTU_FLOW or header[1] != seq + attempt:
+                continue
+            vlan = echo_vlan(echoed, ancdata)
+            if vlan != vlan_id:
+                print(f"  echo of a {size}-byte payload came back "
+                      + (f"on VLAN {vlan}" if vlan is not None else "untagged") + ", not counted")
+                continue
+            # Compare payloads: the kernel may strip the VLAN tag on receive.
+            if len(echoed) - payload_offset(echoed) >= size and checksum_ok(echoed):
+                return True
+    return False
+
+def search(send_sock, recv_sock, dst_mac, src_mac, ethertype, vlan_id, max_payload, attempts, timeout, probes):
+    """Largest payload in [MIN_PAYLOAD, max_payload] that echoes intact, or None; probes collects the trials."""
+    mode = f"VLAN {vlan_id}" if vlan_id is not None else "untagged"
+
+    def passes(size):
+        frame = bytearray(build_frame(dst_mac, src_mac, ethertype, generate_payload(size), vlan_id))
+        ok = probe_size(send_sock, recv_sock, frame, len(probes) * attempts, attempts, timeout, vlan_id)
+        probes.append((mode, size, ok))
+        print(f"  {mode}: payload {size} bytes {'echoed' if ok else 'lost'}")
+        return ok
+
+    if passes(max_payload):
+        return max_payload
+    if not passes(MIN_PAYLOAD):
+        return None
+    lo, hi = MIN_PAYLOAD, max_payload   # lo passes, hi fails
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if passes(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def discover(send_sock, recv_sock, dst_mac, src_mac, ethertype, vlan_id=None, max_payload=None, interface=None,
+             attempts=DEFAULT_ATTEMPTS, timeout=DEFAULT_TIMEOUT, filename='pmtu_test.csv'):
+    """Search untagged and (with vlan_id) tagged payloads; 'limit' in the result is the smaller of the two."""
+    mtu = l2_transport.interface_mtu(interface) if interface else None
+    max_payload = max_payload or mtu or DEFAULT_MAX_PAYLOAD
+    print(f"Path MTU discovery: payloads {MIN_PAYLOAD}..{max_payload} bytes, {attempts} probe(s) per size")
+    probes = []
+    result = {'interface_mtu': mtu, 'max_payload': max_payload}
+    modes = [('untagged', None)] + ([('tagged', vlan_id)] if vlan_id is not None else [])
+    for key, mode_vlan in modes:
+        # A unix link keeps tags in band: its one socket will do.
+        probe_sock = (recv_sock if not interface or l2_transport.is_unix(interface)
+                      else open_probe_socket(interface, ethertype, mode_vlan, dst_mac))
+        try:
+            result[key] = search(send_sock, probe_sock, dst_mac, src_mac, ethertype, mode_vlan, max_payload,
+                                 attempts, timeout, probes)
+        finally:
+            if probe_sock is not recv_sock:
+                probe_sock.close()
+    found = [result[key] for key, _ in modes if result[key] is not None]
+    result['limit'] = min(found) if len(found) == len(modes) else None
+    result['probes'] = len(probes)
+
+    for key, mode_vlan in modes:
+        label = f"VLAN {mode_vlan}" if mode_vlan is not None else "Untagged"
+        if result[key] is None:
+            print(f"{label}: no echo even at {MIN_PAYLOAD} bytes (server down or path broken"
+                  + (", or the tag is lost on the way)" if mode_vlan is not None else ")"))
+            continue
+        overhead = f", {mtu - result[key]} bytes below the interface MTU {mtu}" if mtu else ""
+        print(f"{label}: largest intact payload {result[key]} bytes{overhead}")
+    print(f"{len(probes)} sizes probed")
+    save_csv(filename, ['Mode', 'Payload_Bytes', 'Echoed'], probes)
+    return result
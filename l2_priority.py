@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Mixed-priority latency isolation test for the L2 echo path
+A low-rate critical probe flow is measured twice: on an idle path, then
+while a bulk flow saturates it. The two flows differ in 802.1Q PCP (in the
+TCI built by add_vlan_tag) and in the SO_PRIORITY of their send sockets.
+Comparing the probe latency percentiles of both phases shows whether the
+priority marking survives the path (VXLAN, 5G, ...) or the probes queue up
+behind the bulk traffic.
+"""
+
+import threading
+import time
+
+import l2_multiflow
+from enhanced_l2_client import (build_frame, generate_payload, save_csv, sibling_filename, send_probes, format_latency,
+                                format_timestamp_source, ms, PROBE_TIMEOUT)
+from l2_filter import build_ethertype_filter, open_filtered_socket
+from l2_timestamps import SOURCE_SOFTWARE, SOURCE_USER
+
+PRIORITY_FLOW = 3
+PROBE_PAYLOAD = 64
+BULK_PAYLOAD = 1400
+BULK_WARMUP = 1.0  # seconds of bulk load before the loaded probe phase starts
+COMPARED = ('p50', 'p90', 'p99', 'p99.9', 'max')
+
+DEFAULTS = {
+    'probe_pcp': 6,
+    'probe_priority': 6,
+    'bulk_pcp': 0,
+    'bulk_priority': 0,
+    'bulk_rate': None,       # None = as fast as the workers can send
+    'bulk_workers': 1,
+    'bulk_payload': BULK_PAYLOAD,
+}
+
+
+def probe_phase(interface, dst_mac, src_mac, ethertype, vlan_id, count, interval, timestamps, config):
+    # Probes get their own sockets: SO_PRIORITY on the sender, and a receiver
+    # that only accepts the probe flow, so bulk echoes never delay matching.
+    send_sock = l2_multiflow.open_send_socket(interface, config['probe_priority'])
+    recv_sock = open_filtered_socket(interface, ethertype,
+                                     build_ethertype_filter(ethertype, src_mac=dst_mac, flow_id=PRIORITY_FLOW))
+    frame = build_frame(dst_mac, src_mac, ethertype, generate_payload(PROBE_PAYLOAD), vlan_id,
+                        config['probe_pcp'])
+    try:
+        stats, received, source, _ = send_probes(send_sock, recv_sock, frame, count, interval, PROBE_TIMEOUT,
+                                                 PRIORITY_FLOW, timestamps)
+    finally:
+        send_sock.close()
+        recv_sock.close()
+    # Compare like with like: the source most samples were taken with.
+    primary = source if source in stats else SOURCE_USER
+    return {'stats': stats, 'received': received, 'source': source,
+            'summary': stats[primary].summary() if primary in stats else None, 'summary_source': primary}
+
+def priority_test(interface, dst_mac, src_mac, ethertype, count, interval, vlan_id=None,
+                  timestamps=SOURCE_SOFTWARE, config=None, filename='priority_test.csv'):
+    """Probe latency idle vs. under bulk load, with the probe flow marked as higher priority."""
+    config = dict(DEFAULTS, **(config or {}))
+    # Untagged runs still carry the PCP, in a priority tag (VLAN ID 0).
+    vlan_id = 0 if vlan_id is None else vlan_id
+    print(f"Priority test: probes PCP {config['probe_pcp']}/SO_PRIORITY {config['probe_priority']}, "
+          f"bulk PCP {config['bulk_pcp']}/SO_PRIORITY {config['bulk_priority']}, VLAN {vlan_id}")
+
+    print("Phase 1: probes on an idle path...")
+    idle = probe_phase(interface, dst_mac, src_mac, ethertype, vlan_id, count, interval, timestamps, config)
+
+    print("Phase 2: probes under bulk load...")
+    bulk_flows = l2_multiflow.make_flows(config['bulk_workers'], [dst_mac], [vlan_id], [config['bulk_pcp']],
+                                         [config['bulk_payload']], config['bulk_rate'],
+                                         config['bulk_priority'])
+    bulk_duration = BULK_WARMUP + count * interval + PROBE_TIMEOUT
+    bulk = {}
+    bulk_thread = threading.Thread(
+        target=lambda: bulk.update(l2_multiflow.run_flows(interface, src_mac, ethertype, bulk_flows,
+                                                          bulk_duration, config['bulk_workers'],
+                                                          filename=sibling_filename(filename, 'bulk'))),
+        daemon=True)
+    bulk_thread.start()
+    time.sleep(BULK_WARMUP)
+    loaded = probe_phase(interface, dst_mac, src_mac, ethertype, vlan_id, count, interval, timestamps, config)
+    bulk_thread.join()
+
+    rows = []
+    for phase, result in (('idle', idle), ('loaded', loaded)):
+        print(f"[{phase}] received {result['received']}/{count}")
+        for sample_source, sample_stats in result['stats'].items():
+            summary = sample_stats.summary()
+            print(f"[{phase}] {format_latency('Probe latency', sample_source, summary)}")
+            rows.append([phase, sample_source, summary['count'], count - result['received']]
+                        + [ms(summary[k]) for k in ('min',) + COMPARED + ('mean', 'jitter')])
+        print(f"[{phase}] {format_timestamp_source(result['stats'], result['source'])}")
+
+    if idle['summary'] and loaded['summary']:
+        print("Probe latency under load vs idle:")
+        for key in COMPARED:
+            before, after = idle['summary'][key], loaded['summary'][key]
+            ratio = f" (x{after / before:.2f})" if before else ""
+            print(f"  {key:>6}: {ms(before):.3f} -> {ms(after):.3f} ms, {ms(after - before):+.3f} ms{ratio}")
+        if idle['summary_source'] != loaded['summary_source']:
+            print("Warning: phases used different timestamp sources; the comparison is approximate")
+    if bulk.get('aggregate'):
+        aggregate = bulk['aggregate']
+        print(f"Bulk: {aggregate['offered_pps']:.0f} pps offered, {aggregate['delivered_pps']:.0f} pps delivered, "
+              f"loss {aggregate['loss_pct']:.2f}%")
+
+    save_csv(filename,
+             ['Phase', 'Timestamp_source', 'Count', 'Lost', 'Min_ms', 'P50_ms', 'P90_ms', 'P99_ms', 'P99.9_ms',
+              'Max_ms', 'Mean_ms', 'Jitter_ms'], rows)
+    return {'idle': idle, 'loaded': loaded, 'bulk': bulk.get('aggregate')}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test payload header shared by the L2 client and server
+Every test frame starts its payload with a compact header:
+- magic (0x4C32, "L2") and version, so test frames are recognised without
+  comparing the payload
+- flags
+- flow ID and sequence number, which identify a reply in O(1)
+- payload length as sent (padding added on the wire is ignored)
+- TX timestamp in ns (sender's monotonic clock)
+- CRC32 over the header and the rest of the payload (when FLAG_CHECKSUM is set)
+With FLAG_SERVER_STAMPS the header is followed by two 64-bit stamps that a
+server started with --stamp fills in: when it received the frame and when it
+echoed it (ns, server's CLOCK_REALTIME). The stamp area is excluded from the
+CRC, since the server writes it after the client computed the checksum.
+The rest of the payload is filler and is echoed unchanged.
+"""
+
+import struct
+import zlib
+
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88A8
+VLAN_TPIDS = (ETH_P_8021Q, ETH_P_8021AD)
+TEST_MAGIC = 0x4C32
+TEST_VERSION = 1
+
+FLAG_CHECKSUM = 0x01
+FLAG_SERVER_STAMPS = 0x02
+
+# magic, version, flags, flow_id, length, seq, tx_ns, crc32
+TEST_HEADER = struct.Struct('!HBBHHIQI')
+LENGTH_OFFSET = 6
+CRC_OFFSET = 20
+CHECKSUM = struct.Struct('!I')
+# server RX ns, server echo ns
+SERVER_STAMPS = struct.Struct('!QQ')
+STAMPS_OFFSET = TEST_HEADER.size
+STAMPED_SIZE = STAMPS_OFFSET + SERVER_STAMPS.size
+
+
+def payload_offset(frame):
+    """Offset of the payload in an Ethernet frame, with or without an 802.1Q/802.1ad tag."""
+    return 18 if len(frame) >= 18 and struct.unpack_from('!H', frame, 12)[0] in VLAN_TPIDS else 14
+
+def pack_test_header(buf, offset, flow_id, seq, tx_ns, flags=0):
+    # With FLAG_CHECKSUM the header must be packed last, once the payload is final.
+    if flags & FLAG_SERVER_STAMPS:
+        SERVER_STAMPS.pack_into(buf, offset + STAMPS_OFFSET, 0, 0)
+    TEST_HEADER.pack_into(buf, offset, TEST_MAGIC, TEST_VERSION, flags, flow_id, len(buf) - offset,
+                          seq & 0xFFFFFFFF, tx_ns & 0xFFFFFFFFFFFFFFFF, 0)
+    if flags & FLAG_CHECKSUM:
+        CHECKSUM.pack_into(buf, offset + CRC_OFFSET, payload_checksum(buf, offset))
+
+def payload_checksum(frame, offset):
+    # CRC32 over the payload as sent, except the crc32 field and the server stamps.
+    view = memoryview(frame)
+    end = offset + struct.unpack_from('!H', frame, offset + LENGTH_OFFSET)[0]
+    crc = zlib.crc32(view[offset:offset + CRC_OFFSET])
+    body = offset + (STAMPED_SIZE if frame[offset + 3] & FLAG_SERVER_STAMPS else TEST_HEADER.size)
+    return zlib.crc32(view[body:end], crc)
+
+def checksum_ok(frame):
+    """True if the test frame's checksum matches (or it carries none); False if truncated."""
+    offset = payload_offset(frame)
+    flags = frame[offset + 3]
+    if not flags & FLAG_CHECKSUM:
+        return True
+    if len(frame) < offset + struct.unpack_from('!H', frame, offset + LENGTH_OFFSET)[0]:
+        return False
+    return CHECKSUM.unpack_from(frame, offset + CRC_OFFSET)[0] == payload_checksum(frame, offset)
+
+def parse_test_header(frame):
+    """Return (flow_id, seq, tx_ns, flags) for a test frame, None for anything else."""
+    offset = payload_offset(frame)
+    if len(frame) < offset + TEST_HEADER.size:
+        return None
+    magic, version, flags, flow_id, _length, seq, tx_ns, _crc = TEST_HEADER.unpack_from(frame, offset)
+    if magic != TEST_MAGIC or version != TEST_VERSION:
+        return None
+    return flow_id, seq, tx_ns, flags
+
+def wants_server_stamps(frame, offset):
+    """True if the frame is a test frame asking for server stamps and has room for them."""
+    return (len(frame) >= offset + STAMPED_SIZE
+            and frame[offset + 3] & FLAG_SERVER_STAMPS
+            and struct.unpack_from('!HB', frame, offset) == (TEST_MAGIC, TEST_VERSION))
+
+def pack_server_stamps(frame, offset, rx_ns, tx_ns):
+    SERVER_STAMPS.pack_into(frame, offset + STAMPS_OFFSET, rx_ns, tx_ns)
+
+def parse_server_stamps(frame):
+    """Return (server RX ns, server echo ns), or None if the server did not stamp the frame."""
+    offset = payload_offset(frame)
+    if not wants_server_stamps(frame, offset):
+        return None
+    rx_ns, tx_ns = SERVER_STAMPS.unpack_from(frame, offset + STAMPS_OFFSET)
+    return (rx_ns, tx_ns) if rx_ns and tx_ns else None
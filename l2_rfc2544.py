@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+RFC 2544-style benchmark suite for the L2 echo path
+For every frame size, untagged and (optionally) VLAN-tagged:
+- Throughput: highest offered rate with zero loss, by binary search
+- Latency: probe latency while loading the path at that rate
+- Frame loss rate: loss versus offered load, stepping down from the maximum rate
+- Back-to-back: longest burst at maximum rate that is echoed without loss
+Results are written as one JSON report that can be diffed between runs.
+"""
+
+import json
+import platform
+import time
+from datetime import datetime
+
+from enhanced_l2_client import build_frame, generate_payload, run_load, ms, DEFAULT_BATCH
+from l2_proto import TEST_HEADER
+
+# Ethernet frame sizes from RFC 2544 section 9.1 (including the 4-byte FCS).
+# A VLAN tag adds 4 bytes on top, the payload stays the same.
+RFC2544_FRAME_SIZES = [64, 128, 256, 512, 1024, 1280, 1518]
+ETH_OVERHEAD = 18  # 14-byte header + 4-byte FCS
+# Every payload carries a test header; the 64-byte minimum frame (46-byte
+# payload) already has room for it.
+MIN_FRAME_SIZE = TEST_HEADER.size + ETH_OVERHEAD
+
+DEFAULTS = {
+    'trial_duration': 5.0,       # seconds per throughput / loss trial (RFC: 60)
+    'latency_duration': 10.0,    # seconds of load for the latency measurement (RFC: 120)
+    'probe_interval': 0.1,       # seconds between latency probes
+    'resolution': 0.01,          # binary search stops within 1% of the max rate
+    'max_iterations': 12,
+    'loss_tolerance_pct': 0.0,   # 0 = RFC 2544 zero-loss throughput
+    'loss_step_pct': 10,         # frame loss rate: step down by 10% of max rate
+    'burst_max_frames': 100000,
+    'burst_trials': 3,
+    'drain': 1.0,
+}
+
+
+def payload_size(frame_size):
+    return max(frame_size - ETH_OVERHEAD, TEST_HEADER.size)
+
+def trial(send_sock, recv_sock, frame, rate_pps, duration, config, **kwargs):
+    result = run_load(send_sock, recv_sock, frame, duration=duration, rate_pps=rate_pps,
+                      batch=DEFAULT_BATCH, drain=config['drain'], **kwargs)
+    sent = result['sent']
+    lost = max(sent - result['received'], 0)
+    result['lost'] = lost
+    result['loss_pct'] = (lost / sent * 100) if sent else 0.0
+    result['offered_pps'] = sent / result['tx_elapsed'] if result['tx_elapsed'] else 0.0
+    return result
+
+def measure_max_rate(send_sock, recv_sock, frame, config):
+    # Unpaced trial: the fastest this host can offer frames of this size.
+    result = trial(send_sock, recv_sock, frame, None, min(config['trial_duration'], 2.0), config)
+    return result['offered_pps']
+
+def find_throughput(send_sock, recv_sock, frame, max_rate, config):
+    lo, hi = 0.0, max_rate
+    rate = max_rate
+    best = None
+    iterations = []
+    for _ in range(config['max_iterations']):
+        result = trial(send_sock, recv_sock, frame, rate, config['trial_duration'], config)
+        passed = result['loss_pct'] <= config['loss_tolerance_pct']
+        iterations.append({'rate_pps': rate, 'sent': result['sent'], 'lost': result['lost'],
+                           'loss_pct': result['loss_pct'], 'passed': passed})
+        print(f"  throughput trial {rate:.0f} pps: loss {result['loss_pct']:.3f}% {'PASS' if passed else 'FAIL'}")
+        if passed:
+            best = rate
+            lo = rate
+        else:
+            hi = rate
+        if hi - lo <= config['resolution'] * max_rate:
+            break
+        rate = (lo + hi) / 2
+    return best, iterations
+
+def measure_latency(send_sock, recv_sock, frame, rate_pps, config):
+    result = trial(send_sock, recv_sock, frame, rate_pps, config['latency_duration'], config,
+                   probe_interval=config['probe_interval'])
+    # Same summary as the other tests: percentiles, RFC 3550 jitter and IPDV.
+    summary = result['latency'].summary()
+    received = summary['count']
+    report = {'rate_pps': rate_pps, 'probes_sent': result['probes_sent'], 'probes_received': received}
+    if received:
+        report.update({f"{key}_ms": ms(value) for key, value in summary.items()
+                       if key != 'count' and value is not None})
+    print(f"  latency at {rate_pps:.0f} pps: {received}/{result['probes_sent']} probes"
+          + (f", p50/p99/max {report['p50_ms']:.3f}/{report['p99_ms']:.3f}/{report['max_ms']:.3f} ms, "
+             f"jitter {report['jitter_ms']:.3f} ms" if received else ""))
+    return report
+
+def measure_loss_curve(send_sock, recv_sock, frame, max_rate, config):
+    # RFC 2544 26.3: start at the maximum rate, step down until two
+    # successive trials see no loss.
+    curve = []
+    clean = 0
+    pct = 100
+    while pct > 0 and clean < 2:
+        rate = max_rate * pct / 100
+        result = trial(send_sock, recv_sock, frame, rate, config['trial_duration'], config)
+        curve.append({'offered_pct': pct, 'offered_pps': result['offered_pps'],
+                      'sent': result['sent'], 'lost': result['lost'], 'loss_pct': result['loss_pct']})
+        print(f"  loss at {pct}% ({rate:.0f} pps): {result['loss_pct']:.3f}%")
+        clean = clean + 1 if result['lost'] == 0 else 0
+        pct -= config['loss_step_pct']
+    return curve
+
+def measure_back_to_back(send_sock, recv_sock, frame, config):
+    # Longest burst, sent as fast as possible, that comes back without loss;
+    # binary search per trial, the report keeps the smallest over all trials.
+    results = []
+    for _ in range(config['burst_trials']):
+        lo, hi = 0, config['burst_max_frames']
+        while lo < hi:
+            burst = (lo + hi + 1) // 2
+            result = run_load(send_sock, recv_sock, frame, max_frames=burst, drain=config['drain'])
+            if result['received'] >= result['sent']:
+                lo = burst
+            else:
+                hi = burst - 1
+        results.append(lo)
+    print(f"  back-to-back: {min(results)} frames")
+    return {'frames': min(results), 'trials': results}
+
+def benchmark_frame(send_sock, recv_sock, dst_mac, src_mac, ethertype, frame_size, vlan_id, config):
+    payload = generate_payload(payload_size(frame_size))
+    frame = build_frame(dst_mac, src_mac, ethertype, payload, vlan_id)
+    max_rate = config.get('max_rate_pps') or measure_max_rate(send_sock, recv_sock, frame, config)
+    print(f"Frame size {frame_size}{f' (VLAN {vlan_id})' if vlan_id is not None else ''}: "
+          f"max offered rate {max_rate:.0f} pps")
+    throughput, iterations = find_throughput(send_sock, recv_sock, frame, max_rate, config)
+    entry = {
+        'frame_size': frame_size,
+        'payload_size': len(payload),
+        'vlan_id': vlan_id,
+        'max_rate_pps': max_rate,
+        'throughput': {
+            'rate_pps': throughput,
+            'rate_bps': throughput * frame_size * 8 if throughput else None,
+            'iterations': iterations,
+        },
+        'loss_curve': measure_loss_curve(send_sock, recv_sock, frame, max_rate, config),
+        'back_to_back': measure_back_to_back(send_sock, recv_sock, frame, config),
+    }
+    entry['latency'] = (measure_latency(send_sock, recv_sock, frame, throughput, config)
+                        if throughput else None)
+    return entry
+
+def run_suite(send_sock, recv_sock, dst_mac, src_mac, ethertype, frame_sizes=None, vlan_id=None,
+              config=None, filename='rfc2544_report.json', meta=None):
+    """Run all four tests per frame size, untagged and (if vlan_id is set) tagged."""
+    config = dict(DEFAULTS, **(config or {}))
+    frame_sizes = frame_sizes or RFC2544_FRAME_SIZES
+    too_small = [size for size in frame_sizes if size < MIN_FRAME_SIZE]
+    if too_small:
+        raise ValueError(f"frame sizes below {MIN_FRAME_SIZE} bytes leave no room for the test header: "
+                         f"{', '.join(map(str, too_small))}")
+    modes = [None] if vlan_id is None else [None, vlan_id]
+    report = {
+        'started': datetime.now().isoformat(),
+        'host': platform.node(),
+        'kernel': platform.release(),
+        'ethertype': f"0x{ethertype:04X}",
+        'config': config,
+        'meta': meta or {},
+        'results': [],
+    }
+    start = time.time()
+    for mode in modes:
+        for frame_size in frame_sizes:
+            report['results'].append(benchmark_frame(send_sock, recv_sock, dst_mac, src_mac, ethertype,
+                                                     frame_size, mode, config))
+    report['duration_s'] = time.time() - start
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"RFC 2544 report written to {filename}")
+    return report
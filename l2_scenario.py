@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Non-interactive, config-driven test runner
+A TOML scenario file lists tests; list-valued matrix parameters (interface,
+vlan, payload_size, rate, pcp) expand into one run per combination.
+Needs Python 3.11 (tomllib), or the tomli package on older versions.
+How runs are executed:
+- AF_PACKET sockets are opened once per (interface, destination MAC,
+  EtherType) and reused by every run on them
+- runs on different interfaces execute concurrently, one process per
+  interface (as l2_multiflow's workers, so groups do not share a GIL and
+  one group's pacing does not disturb another's); runs on the same
+  interface stay sequential, in file order
+- every run's result, including the server's counters for this client, goes
+  into one JSON result set; per-test CSVs are written next to it, named
+  after the run
+- a "pmtu" run (path MTU discovery, see l2_pmtu.py) caps the payload sizes
+  of the later runs on its interface at the largest size that echoed
+
+Example:
+
+    output = "results"
+    metrics_port = 9100              # optional live OpenMetrics endpoints,
+                                     # one per interface on consecutive ports
+
+    [defaults]
+    dst_mac = "02:00:00:00:00:02"
+
+    [[scenario]]
+    test = "pmtu"
+    interface = ["vxlan0", "vxlan1"]
+    vlan = 100                       # searches tagged and untagged
+
+    [[scenario]]
+    name = "rtt"
+    test = "rtt"
+    interface = ["vxlan0", "vxlan1"]
+    vlan = ["none", 100]
+    payload_size = [64, 1400]
+    count = 1000
+    interval = 0.01
+
+    [[scenario]]
+    name = "load"
+    test = "throughput"
+    interface = "vxlan0"
+    rate = ["10Mbps", "50Mbps"]
+    duration = 10
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import time
+from datetime import datetime
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+from enhanced_l2_client import (get_src_mac, mac_str_to_bytes, bytes_to_mac_str, generate_payload,
+                                open_test_sockets, fetch_server_stats, rtt_test, jitter_test, throughput_test,
+                                integrity_test, variable_frame_test, fit_payload, fit_sizes, DEFAULT_ETHERTYPE)
+from l2_metrics import serve_metrics
+from l2_pacing import parse_rate
+from l2_transport import is_unix
+
+MATRIX_KEYS = ('interface', 'vlan', 'payload_size', 'rate', 'pcp')
+PCP_TESTS = ('multiflow',)   # the others send PCP 0 (priority has probe_pcp/bulk_pcp)
+RATE_TESTS = ('soak',)       # need a fixed offered load
+DEFAULTS = {
+    'ethertype': f"0x{DEFAULT_ETHERTYPE:04X}",
+    'vlan': None,
+    'pcp': 0,
+    'payload_size': 100,
+    'count': 100,
+    'interval': 0.01,
+    'duration': 5.0,
+    'rate': None,
+    'timestamps': 'software',
+    'one_way': False,
+    'sizes': [64, 128, 256, 512, 1024, 1500],
+    'flows': 4,
+    'workers': 1,
+}
+DEFAULT_OUTPUT = 'scenario_results'
+
+
+def run_rtt(ctx, p, out):
+    return rtt_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                    generate_payload(p['payload_size']), p['count'], p['interval'], timestamps=p['timestamps'],
+                    one_way=p['one_way'], vlan_id=p['vlan'], filename=out('csv'))
+
+def run_jitter(ctx, p, out):
+    return jitter_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                       generate_payload(p['payload_size']), p['count'], p['interval'], timestamps=p['timestamps'],
+                       vlan_id=p['vlan'], filename=out('csv'))
+
+def run_throughput(ctx, p, out):
+    return throughput_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                           generate_payload(p['payload_size']), p['duration'], rate_pps=p['rate_pps'],
+                           vlan_id=p['vlan'], filename=out('csv'))
+
+def run_integrity(ctx, p, out):
+    return integrity_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                          generate_payload(p['payload_size']), p['count'], p['rate_pps'], vlan_id=p['vlan'],
+                          filename=out('csv'))
+
+def run_variable(ctx, p, out):
+    return variable_frame_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                               p['sizes'], vlan_id=p['vlan'], filename=out('csv'))
+
+def run_rfc2544(ctx, p, out):
+    import l2_rfc2544
+    config = {key: p[key] for key in l2_rfc2544.DEFAULTS if key in p}
+    return l2_rfc2544.run_suite(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                                p.get('frame_sizes'), p['vlan'], config, filename=out('json'),
+                                meta={'interface': p['interface']})
+
+def run_multiflow(ctx, p, out):
+    import l2_multiflow
+    flows = l2_multiflow.make_flows(p['flows'], [ctx['dst_mac']], [p['vlan']], [p['pcp']], [p['payload_size']],
+                                    p['rate'])
+    return l2_multiflow.run_flows(p['interface'], ctx['src_mac'], ctx['ethertype'], flows, p['duration'],
+                                  p['workers'], filename=out('csv'))
+
+def run_priority(ctx, p, out):
+    import l2_priority
+    config = {key: p[key] for key in l2_priority.DEFAULTS if key in p}
+    return l2_priority.priority_test(p['interface'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'], p['count'],
+                                     p['interval'], p['vlan'], p['timestamps'], config, filename=out('csv'))
+
+def run_soak(ctx, p, out):
+    import l2_soak
+    result = l2_soak.soak_test(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'],
+                               p['rate_pps'], p['duration'], p['payload_size'], p['vlan'],
+                               p.get('window', l2_soak.DEFAULT_WINDOW), filename=out('csv'))
+    result.pop('windows')  # already streamed to the CSV
+    return result
+
+def run_pmtu(ctx, p, out):
+    import l2_pmtu
+    return l2_pmtu.discover(ctx['send'], ctx['recv'], ctx['dst_mac'], ctx['src_mac'], ctx['ethertype'], p['vlan'],
+                            p.get('max_payload'), p['interface'], filename=out('csv'))
+
+TESTS = {
+    'rtt': run_rtt,
+    'jitter': run_jitter,
+    'throughput': run_throughput,
+    'integrity': run_integrity,
+    'variable': run_variable,
+    'rfc2544': run_rfc2544,
+    'multiflow': run_multiflow,
+    'priority': run_priority,
+    'soak': run_soak,
+    'pmtu': run_pmtu,
+}
+
+
+def parse_vlan(value):
+    if value is None or (isinstance(value, str) and value.strip().lower() in ('', 'none', 'untagged')):
+        return None
+    return int(value)
+
+def expand(scenarios, defaults):
+    """One params dict per run: scenario settings over defaults, matrix lists expanded."""
+    runs = []
+    for number, scenario in enumerate(scenarios):
+        base = {**DEFAULTS, **defaults, **scenario}
+        if base.get('test') not in TESTS:
+            raise ValueError(f"scenario {scenario.get('name', number)}: unknown test {base.get('test')!r} "
+                             f"(one of {', '.join(TESTS)})")
+        if not base.get('interface') or not base.get('dst_mac'):
+            raise ValueError(f"scenario {scenario.get('name', number)}: interface and dst_mac are required")
+        axes = [key for key in MATRIX_KEYS if isinstance(base.get(key), list)]
+        if 'pcp' in axes and base['test'] not in PCP_TESTS:
+            raise ValueError(f"scenario {scenario.get('name', number)}: test {base['test']!r} ignores pcp, "
+                             f"a pcp matrix would only repeat its runs")
+        for values in itertools.product(*(base[key] for key in axes)):
+            params = dict(base, **dict(zip(axes, values)))
+            params['vlan'] = parse_vlan(params['vlan'])
+            params['rate_pps'] = parse_rate(params['rate'], params['payload_size'] * 8) if params['rate'] else None
+            label = ','.join(f"{key}={value}" for key, value in zip(axes, values))
+            params['name'] = f"{scenario.get('name', base['test'])}" + (f"[{label}]" if label else "")
+            if params['test'] in RATE_TESTS and not params['rate_pps']:
+                raise ValueError(f"scenario {params['name']}: test {params['test']!r} needs a rate "
+                                 f"(e.g. rate = \"1000pps\")")
+            runs.append(params)
+    return runs
+
+def apply_limit(params, limit):
+    """params with every payload size capped at limit (from a pmtu run)."""
+    import l2_rfc2544
+    params = dict(params, payload_size=fit_payload(params['payload_size'], limit))
+    if params['test'] == 'variable':
+        params['sizes'] = fit_sizes(params['sizes'], limit)
+    if params['rate']:
+        params['rate_pps'] = parse_rate(params['rate'], params['payload_size'] * 8)
+    if params['test'] == 'rfc2544':
+        params['frame_sizes'] = fit_sizes(params.get('frame_sizes') or l2_rfc2544.RFC2544_FRAME_SIZES, limit,
+                                          l2_rfc2544.ETH_OVERHEAD)
+    if 'bulk_payload' in params:
+        params['bulk_payload'] = fit_payload(params['bulk_payload'], limit)
+    elif params['test'] == 'priority':
+        import l2_priority
+        params['bulk_payload'] = fit_payload(l2_priority.DEFAULTS['bulk_payload'], limit)
+    return params
+
+def safe_name(text):
+    return ''.join(c if c.isalnum() or c in '-_.=' else '_' for c in text)
+
+def run_group(interface, runs, output, results):
+    # Sequential runs on one interface, sharing its sockets.
+    sockets = {}
+    limits = {}   # (dst_mac, ethertype) -> payload limit found by a pmtu run
+    no_stats = set()   # destinations that did not answer a stats query
+    src_mac = get_src_mac(interface)
+    try:
+        for index, params in runs:
+            dst_mac = mac_str_to_bytes(params['dst_mac'])
+            ethertype = params['ethertype']
+            ethertype = ethertype if isinstance(ethertype, int) else int(ethertype, 16)
+            key = (dst_mac, ethertype)
+            if key not in sockets:
+                sockets[key] = open_test_sockets(interface, dst_mac, ethertype)
+            send_sock, recv_sock = sockets[key]
+            ctx = {'send': send_sock, 'recv': recv_sock, 'dst_mac': dst_mac, 'src_mac': src_mac,
+                   'ethertype': ethertype}
+
+            if key in limits and params['test'] != 'pmtu':
+                params = apply_limit(params, limits[key])
+
+            def out(extension, index=index, name=params['name']):
+                return os.path.join(output, f"{index:03d}_{safe_name(name)}.{extension}")
+
+            print(f"=== [{index}] {params['name']} on {interface}")
+            record = {'index': index, 'name': params['name'], 'test': params['test'], 'interface': interface,
+                      'params': params, 'started': datetime.now().isoformat()}
+            start = time.time()
+            try:
+                record['result'] = TESTS[params['test']](ctx, params, out)
+                if params['test'] == 'pmtu' and record['result']['limit'] is not None:
+                    limits[key] = record['result']['limit']
+            except Exception as e:
+                print(f"=== [{index}] {params['name']} failed: {e}")
+                record['error'] = f"{type(e).__name__}: {e}"
+            record['duration_s'] = time.time() - start
+            # Each unanswered query costs a timeout: ask a silent server once.
+            entries = None if dst_mac in no_stats else fetch_server_stats(interface, dst_mac, src_mac,
+                                                                          limit=limits.get(key))
+            if entries is None:
+                no_stats.add(dst_mac)
+            record['server_counters'] = None if entries is None else [
+                {'vlan': vlan_id, 'frames': frames, 'bytes': nbytes, 'errors': errors, 'drops': drops}
+                for mac, vlan_id, frames, nbytes, errors, drops in entries if mac == src_mac]
+            results[index] = record
+    finally:
+        for send_sock, recv_sock in sockets.values():
+            send_sock.close()
+            recv_sock.close()
+
+def group_main(interface, runs, output, metrics_port, results):
+    # Body of an interface group's process; its records go back through results.
+    if metrics_port:
+        serve_metrics(metrics_port)
+    records = {}
+    try:
+        run_group(interface, runs, output, records)
+    finally:
+        results.put(records)
+
+def json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes_to_mac_str(value) if len(value) == 6 else value.hex()
+    return str(value)
+
+def run_scenarios(config, output=None, config_name=None):
+    """Run every expanded scenario in config (a parsed TOML dict); returns the result set."""
+    metrics_port = int(config['metrics_port']) if config.get('metrics_port') else None
+    runs = expand(config.get('scenario', []), config.get('defaults', {}))
+    output = output or config.get('output', DEFAULT_OUTPUT)
+    os.makedirs(output, exist_ok=True)
+    groups = {}
+    for index, params in enumerate(runs):
+        groups.setdefault(params['interface'], []).append((index, params))
+
+    print(f"{len(runs)} runs on {len(groups)} interface(s): {', '.join(groups)}")
+    results = [None] * len(runs)
+    started = datetime.now().isoformat()
+    start = time.time()
+    records = multiprocessing.Queue()
+    # Not daemonic: a multiflow run starts worker processes of its own.
+    procs = [multiprocessing.Process(target=group_main,
+                                     args=(interface, group, output,
+                                           metrics_port + number if metrics_port else None, records))
+             for number, (interface, group) in enumerate(groups.items())]
+    for p in procs:
+        p.start()
+    reported = 0
+    while reported < len(procs):
+        try:
+            for index, record in records.get(timeout=1.0).items():
+                results[index] = record
+            reported += 1
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                print("Warning: not all interface groups reported back; results are partial")
+                break
+    for p in procs:
+        p.join()
+
+    result_set = {
+        'started': started,
+        'duration_s': time.time() - start,
+        'host': platform.node(),
+        'kernel': platform.release(),
+        'scenario_file': config_name,
+        'runs': [record for record in results if record is not None],
+    }
+    filename = os.path.join(output, 'results.json')
+    with open(filename, 'w') as f:
+        json.dump(result_set, f, indent=2, sort_keys=True, default=json_default)
+    failed = [record['name'] for record in result_set['runs'] if 'error' in record]
+    print(f"{len(result_set['runs'])} runs done in {result_set['duration_s']:.1f} s"
+          + (f", {len(failed)} failed: {', '.join(failed)}" if failed else "") + f"; results in {filename}")
+    return result_set
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run L2 test scenarios from a TOML file")
+    parser.add_argument('scenario_file')
+    parser.add_argument('--output', default=None,
+                        help=f"directory for results.json and per-run CSVs (default: file's 'output' "
+                             f"or {DEFAULT_OUTPUT})")
+    parser.add_argument('--dry-run', action='store_true', help="list the expanded runs and exit")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    try:
+        with open(args.scenario_file, 'rb') as f:
+            config = tomllib.load(f)
+        runs = expand(config.get('scenario', []), config.get('defaults', {}))
+    except (OSError, tomllib.TOMLDecodeError, ValueError) as e:
+        print(f"Invalid scenario file: {e}")
+        sys.exit(1)
+
+    if args.dry_run:
+        for index, params in enumerate(runs):
+            print(f"[{index}] {params['name']}: {params['test']} on {params['interface']} -> {params['dst_mac']}")
+        return
+    if os.geteuid() != 0 and not all(is_unix(params['interface']) for params in runs):
+        print("Permission denied: run as root (or use unix: interfaces only).")
+        sys.exit(1)
+    run_scenarios(config, args.output, args.scenario_file)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Soak test: hours or days of fixed offered load with time-windowed results
+Every frame carries a test header (sequence number, TX time), so each one
+yields a latency sample and is attributed to the window it was *sent* in.
+A window closes once its frames can no longer arrive (window end + timeout);
+its pps, bps (payload bits, as the offered load is given and as the
+throughput test reports), loss and latency percentiles are then
+- streamed to CSV (one row per window, flushed as it is written),
+- kept in a fixed-size ring buffer for the end-of-run report,
+- merged into run totals of fixed size (so the totals always agree with the
+  rows; echoes arriving after their window closed stay counted lost there and
+  are reported separately as late),
+so memory stays flat however long the run is. Degradation over time (modem
+thermal throttling, VXLAN FDB churn, ...) shows up as a trend in the rows.
+"""
+
+import collections
+import csv
+import time
+from datetime import datetime
+
+from enhanced_l2_client import build_frame, ms, DEFAULT_BATCH, PROBE_TIMEOUT
+from l2_loop import EventLoop
+from l2_metrics import REGISTRY as metrics
+from l2_mmsg import MmsgSender, MmsgReceiver
+from l2_pacing import Pacer
+from l2_proto import payload_offset, pack_test_header, parse_test_header
+from l2_stats import SequenceTracker, LatencyHistogram
+
+SOAK_FLOW = 4
+DEFAULT_WINDOW = 1.0     # seconds per aggregation window
+DEFAULT_HISTORY = 3600   # closed windows kept in memory for the final report
+DEFAULT_PAYLOAD_SIZE = 500
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+WORST_WINDOWS = 5
+
+CSV_HEADER = ['Window_start', 'Elapsed_s', 'Sent', 'Received', 'Lost', 'Loss_pct', 'Offered_pps',
+              'Delivered_pps', 'Offered_bps', 'Delivered_bps', 'Min_ms', 'P50_ms', 'P90_ms', 'P99_ms',
+              'P99.9_ms', 'Max_ms', 'Mean_ms']
+
+
+def new_window():
+    return {'sent': 0, 'received': 0, 'latency': LatencyHistogram()}
+
+def window_row(start_wall, elapsed, window_s, payload_bits, window):
+    # window_s is the time the window actually covered (the last one is cut
+    # short when sending stops).
+    latency = window['latency'].summary(REPORT_PERCENTILES)
+    sent, received = window['sent'], min(window['received'], window['sent'])
+    lost = sent - received
+    return {
+        'start': datetime.fromtimestamp(start_wall).isoformat(timespec='seconds'),
+        'elapsed_s': elapsed,
+        'sent': sent,
+        'received': received,
+        'lost': lost,
+        'loss_pct': lost / sent * 100 if sent else 0.0,
+        'offered_pps': sent / window_s,
+        'delivered_pps': received / window_s,
+        'offered_bps': sent * payload_bits / window_s,
+        'delivered_bps': received * payload_bits / window_s,
+        'latency': latency,
+    }
+
+def csv_values(row):
+    latency = row['latency']
+    return ([row['start'], f"{row['elapsed_s']:.1f}", row['sent'], row['received'], row['lost'],
+             f"{row['loss_pct']:.4f}", f"{row['offered_pps']:.1f}", f"{row['delivered_pps']:.1f}",
+             f"{row['offered_bps']:.0f}", f"{row['delivered_bps']:.0f}"]
+            + [ms(latency[key]) if latency[key] is not None else ''
+               for key in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max', 'mean')])
+
+def format_window(row):
+    latency = row['latency']
+    lat = (f", p50/p99/max {ms(latency['p50']):.3f}/{ms(latency['p99']):.3f}/{ms(latency['max']):.3f} ms"
+           if latency['count'] else "")
+    return (f"[{row['start']}] {row['delivered_pps']:.0f}/{row['offered_pps']:.0f} pps, "
+            f"loss {row['lost']} ({row['loss_pct']:.2f}%){lat}")
+
+def report(history, totals, tracker, elapsed):
+    stats = tracker.summary()
+    sent, received = totals['sent'], totals['received']
+    latency = totals['latency'].summary(REPORT_PERCENTILES)
+    print(f"Soak test: {elapsed:.0f} s, {totals['windows']} windows, sent {sent}, received {received}, "
+          f"lost {sent - received} ({(sent - received) / sent * 100 if sent else 0:.4f}%), "
+          f"late {totals['late']}, reordered {stats['reordered']}, duplicates {stats['duplicates']}")
+    if latency['count']:
+        print("Latency min/p50/p90/p99/p99.9/max: "
+              + '/'.join(f"{ms(latency[k]):.3f}" for k in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max')) + " ms")
+    if not history:
+        return
+    lossy = [row for row in history if row['lost']]
+    print(f"Windows with loss: {len(lossy)} of the last {len(history)}")
+    for row in sorted(lossy, key=lambda r: -r['loss_pct'])[:WORST_WINDOWS]:
+        print(f"  {format_window(row)}")
+    measured = [row for row in history if row['latency']['count']]
+    if measured:
+        print(f"Worst p99 windows of the last {len(history)}:")
+        for row in sorted(measured, key=lambda r: -r['latency']['p99'])[:WORST_WINDOWS]:
+            print(f"  {format_window(row)}")
+    # Trend: first vs. last tenth of the retained windows.
+    tenth = max(len(measured) // 10, 1)
+    if len(measured) >= 2 * tenth + 1:
+        head = sorted(row['latency']['p99'] for row in measured[:tenth])[tenth // 2]
+        tail = sorted(row['latency']['p99'] for row in measured[-tenth:])[tenth // 2]
+        print(f"Median window p99, first vs. last {tenth} windows: {ms(head):.3f} -> {ms(tail):.3f} ms")
+
+def soak_test(send_sock, recv_sock, dst_mac, src_mac, ethertype, rate_pps, duration=None,
+              payload_size=DEFAULT_PAYLOAD_SIZE, vlan_id=None, window=DEFAULT_WINDOW, history=DEFAULT_HISTORY,
+              timeout=PROBE_TIMEOUT, batch=DEFAULT_BATCH, filename='soak_test.csv'):
+    """Send at rate_pps until duration (None = until Ctrl-C), one result row per window."""
+    frame = build_frame(dst_mac, src_mac, ethertype, bytes(payload_size), vlan_id)
+    payload_bits = payload_size * 8
+    offset = payload_offset(frame)
+    window_ns = int(window * 1e9)
+    timeout_ns = int(timeout * 1e9)
+    sender = MmsgSender(send_sock, [frame], batch)
+    receiver = MmsgReceiver(recv_sock, batch)
+    tracker = SequenceTracker()
+    windows = {}        # window index -> counters, while frames sent in it can still arrive
+    closed = collections.deque(maxlen=history)
+    totals = {'sent': 0, 'received': 0, 'late': 0, 'windows': 0, 'latency': LatencyHistogram()}
+    loop = EventLoop()
+    start_ns = time.perf_counter_ns()
+    sending = {'end_ns': None}   # set when the send loop stops
+    start_wall = time.time()
+
+    csvfile = open(filename, 'w', newline='')
+    writer = csv.writer(csvfile)
+    writer.writerow(CSV_HEADER)
+    csvfile.flush()
+
+    def on_readable():
+        t_recv = time.perf_counter_ns()
+        for i in range(receiver.recv()):
+            header = parse_test_header(receiver.frame(i))
+            if header is None or header[0] != SOAK_FLOW:
+                continue
+            received = tracker.received
+            tracker.add(header[1])
+            if tracker.received == received:
+                continue  # duplicate or later than the tracker's window
+            current = windows.get((header[2] - start_ns) // window_ns)
+            if current is None:
+                totals['late'] += 1  # its window is closed and counted it lost
+                continue
+            current['received'] += 1
+            current['latency'].record(t_recv - header[2])
+
+    def close_windows(final=False):
+        limit = (time.perf_counter_ns() - timeout_ns - start_ns) // window_ns
+        for index in sorted(windows):
+            if index >= limit and not final:
+                break
+            current = windows.pop(index)
+            window_end_ns = (index + 1) * window_ns
+            if sending['end_ns'] is not None:
+                window_end_ns = min(window_end_ns, sending['end_ns'] - start_ns)
+            row = window_row(start_wall + index * window, window_end_ns / 1e9,
+                             (window_end_ns - index * window_ns) / 1e9, payload_bits, current)
+            closed.append(row)
+            writer.writerow(csv_values(row))
+            csvfile.flush()
+            print(format_window(row))
+            totals['windows'] += 1
+            totals['received'] += row['received']
+            totals['latency'].merge(current['latency'])
+            metrics.inc('client_frames_received', row['received'], flow=SOAK_FLOW)
+            metrics.inc('client_bytes_received', row['received'] * len(frame), flow=SOAK_FLOW)
+            metrics.inc('client_frames_lost', row['lost'], flow=SOAK_FLOW)
+            metrics.merge('client_rtt', current['latency'], flow=SOAK_FLOW, source='user')
+        if not final:
+            loop.call_later(window, close_windows)
+
+    loop.add_reader(recv_sock, on_readable)
+    loop.call_later(window, close_windows)
+    rx_thread = loop.run_in_thread()
+
+    pacer = Pacer(rate_pps)
+    count = pacer.batch_size(batch)
+    end_ns = start_ns + int(duration * 1e9) if duration else None
+    print(f"Soak test: {rate_pps:.0f} pps of {len(frame)}-byte frames, {window:g} s windows, "
+          + (f"{duration:g} s" if duration else "until Ctrl-C") + f", rows streamed to {filename}")
+    seq = 0
+    try:
+        while end_ns is None or time.perf_counter_ns() < end_ns:
+            pacer.wait(count)
+            t_send = time.perf_counter_ns()
+            for i in range(count):
+                pack_test_header(sender.buffers[i], offset, SOAK_FLOW, seq + i, t_send)
+            # The window must exist before the echoes can come back.
+            index = (t_send - start_ns) // window_ns
+            current = windows.get(index)
+            if current is None:
+                current = windows[index] = new_window()
+            n = sender.send(count)
+            seq += n
+            current['sent'] += n
+            totals['sent'] += n
+            metrics.inc('client_frames_sent', n, flow=SOAK_FLOW)
+            metrics.inc('client_bytes_sent', n * len(frame), flow=SOAK_FLOW)
+    except KeyboardInterrupt:
+        print("Soak test interrupted, finishing the open windows...")
+    sending['end_ns'] = time.perf_counter_ns()
+    elapsed = (sending['end_ns'] - start_ns) / 1e9
+    # Give the last frames their timeout, then close everything still open.
+    time.sleep(timeout)
+    loop.call_at(0, close_windows, True)
+    loop.call_at(0, loop.stop)
+    rx_thread.join()
+    loop.close()
+    csvfile.close()
+    tracker.finish(seq - 1)
+    report(closed, totals, tracker, elapsed)
+    return {'windows': list(closed), 'sent': totals['sent'], 'received': totals['received'],
+            'lost': totals['sent'] - totals['received'], 'late': totals['late'], 'tracker': tracker.summary(),
+            'latency': totals['latency'].summary(REPORT_PERCENTILES)}
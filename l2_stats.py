@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Receive-side statistics for the L2 test client
+- SequenceTracker: per-flow loss, reordering and duplicate accounting over a
+  bounded sliding window of sequence numbers (constant memory)
+- LatencyHistogram: log-linear (HDR-style) histogram of integer values with
+  fixed memory and mergeable buckets, for percentiles over millions of samples
+- LatencyStats: latency histogram plus RFC 3550 interarrival jitter and IPDV
+"""
+
+DEFAULT_WINDOW = 4096
+SEQ_MASK = 0xFFFFFFFF
+
+# 2**(8-1) = 128 sub-buckets per power of two (values below 2**8 are exact):
+# values are kept within 1/128 (0.8%), reported at the bucket midpoint. Values up to 60 s in ns fit in ~3800 buckets.
+DEFAULT_SUB_BUCKET_BITS = 8
+DEFAULT_MAX_VALUE = 60_000_000_000
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class SequenceTracker:
+    """Sliding-window bitmap over the last `window` sequence numbers of one flow.
+
+    A sequence number is counted lost once it slides out of the window without
+    having been received. Arrivals below the highest sequence seen are
+    reordered (displacement = highest - seq); arrivals that were already seen
+    are duplicates; arrivals older than the window are late (they were
+    already counted lost and stay counted that way).
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, first_seq=0):
+        self.window = window
+        self.bitmap = bytearray((window + 7) // 8)
+        self.first_seq = first_seq
+        self.highest = first_seq - 1
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.max_displacement = 0
+        self.duplicates = 0
+        self.late = 0
+        self.corrupted = 0
+
+    def _test(self, seq):
+        pos = seq % self.window
+        return self.bitmap[pos >> 3] & (1 << (pos & 7))
+
+    def _set(self, seq):
+        pos = seq % self.window
+        self.bitmap[pos >> 3] |= 1 << (pos & 7)
+
+    def _clear(self, seq):
+        pos = seq % self.window
+        self.bitmap[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+
+    def _advance(self, seq):
+        # Slide the window so that seq is the highest entry; every sequence
+        # number that leaves it unreceived is lost.
+        window = self.window
+        if seq - self.highest > window:
+            # The whole old window leaves, and everything between it and the
+            # new window never had a chance to arrive.
+            for old in range(max(self.highest - window + 1, self.first_seq), self.highest + 1):
+                if not self._test(old):
+                    self.lost += 1
+            self.lost += seq - window - max(self.highest, self.first_seq - 1)
+            self.bitmap[:] = bytes(len(self.bitmap))
+        else:
+            for new in range(self.highest + 1, seq + 1):
+                old = new - window
+                if old >= self.first_seq and not self._test(old):
+                    self.lost += 1
+                self._clear(new)
+        self.highest = seq
+
+    def unwrap(self, seq):
+        # Sequence numbers are 32 bits on the wire; extend them relative to
+        # the highest one seen so multi-day runs keep counting past 2**32.
+        delta = (seq - self.highest) & SEQ_MASK
+        if delta > SEQ_MASK >> 1:
+            delta -= SEQ_MASK + 1
+        return self.highest + delta
+
+    def add(self, seq):
+        """Record the arrival of wire sequence number seq."""
+        seq = self.unwrap(seq)
+        if seq > self.highest:
+            self._advance(seq)
+            self._set(seq)
+            self.received += 1
+        elif seq <= self.highest - self.window:
+            self.late += 1
+        elif self._test(seq):
+            self.duplicates += 1
+        else:
+            self._set(seq)
+            self.received += 1
+            self.reordered += 1
+            displacement = self.highest - seq
+            if displacement > self.max_displacement:
+                self.max_displacement = displacement
+
+    def add_corrupted(self):
+        # The sequence number of a frame that fails its checksum cannot be
+        # trusted, so it is not marked received and ends up counted lost too.
+        self.corrupted += 1
+
+    def finish(self, last_seq):
+        """Account for everything up to last_seq (the last one sent); returns summary()."""
+        for seq in range(max(self.highest - self.window + 1, self.first_seq), min(self.highest, last_seq) + 1):
+            if not self._test(seq):
+                self.lost += 1
+        if last_seq > self.highest:
+            self.lost += last_seq - max(self.highest, self.first_seq - 1)
+        self.highest = max(self.highest, last_seq)
+        self.bitmap[:] = bytes(len(self.bitmap))
+        return self.summary()
+
+    def summary(self):
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'reordered': self.reordered,
+            'max_displacement': self.max_displacement,
+            'duplicates': self.duplicates,
+            'late': self.late,
+            'corrupted': self.corrupted,
+        }
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative integers (e.g. latencies in ns).
+
+    Values below 2**sub_bucket_bits get a bucket each; above that every power
+    of two is split into 2**(sub_bucket_bits - 1) equal buckets. Values above
+    max_value are counted in the top bucket (and in `overflow`); min, max and
+    the mean are kept exactly. Histograms with the same layout merge by adding
+    bucket counts.
+    """
+
+    def __init__(self, sub_bucket_bits=DEFAULT_SUB_BUCKET_BITS, max_value=DEFAULT_MAX_VALUE):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_count = 1 << sub_bucket_bits
+        self.half = self.sub_count >> 1
+        self.max_value = max_value
+        self.counts = [0] * (self._index(max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.overflow = 0
+
+    def _index(self, value):
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_count + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def _value_at(self, index):
+        # Midpoint of the bucket's value range.
+        if index < self.sub_count:
+            return index
+        shift, sub = divmod(index - self.sub_count, self.half)
+        shift += 1
+        return ((sub + self.half) << shift) + ((1 << shift) >> 1)
+
+    def record(self, value, count=1):
+        value = max(int(value), 0)
+        if value > self.max_value:
+            self.overflow += count
+            self.counts[-1] += count
+        else:
+            self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add other's samples to this histogram; both must have the same layout."""
+        if (other.sub_bucket_bits, other.max_value) != (self.sub_bucket_bits, self.max_value):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.overflow += other.overflow
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                return min(max(self._value_at(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def cumulative_counts(self, bounds):
+        """Samples at or below each of the ascending bounds, at bucket resolution."""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            last = self._index(int(bound)) if bound <= self.max_value else len(self.counts) - 1
+            while index <= last:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def summary(self, percentiles=PERCENTILES):
+        result = {'count': self.count, 'min': self.min, 'max': self.max, 'mean': self.mean()}
+        for pct in percentiles:
+            result[f"p{pct:g}"] = self.percentile(pct)
+        return result
+
+    def to_dict(self):
+        """Sparse, JSON-serialisable form, e.g. to merge histograms from other processes."""
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'max_value': self.max_value,
+            'buckets': {index: bucket for index, bucket in enumerate(self.counts) if bucket},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'overflow': self.overflow,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['sub_bucket_bits'], data['max_value'])
+        for index, bucket in data['buckets'].items():
+            histogram.counts[int(index)] = bucket
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.overflow = data['overflow']
+        return histogram
+
+
+class LatencyStats:
+    """Streaming latency statistics for one flow, in constant memory.
+
+    add() takes samples in arrival order. Interarrival jitter follows
+    RFC 3550 6.4.1 (J += (|D| - J) / 16, D being the change in transit time
+    between consecutive arrivals); IPDV (RFC 5481) is the delay difference
+    between packets with consecutive sequence numbers that also arrive back
+    to back, and its magnitude is kept in a histogram.
+    """
+
+    def __init__(self, sub_bucket_bits=DEFAULT_SUB_BUCKET_BITS, max_value=DEFAULT_MAX_VALUE):
+        self.latency = LatencyHistogram(sub_bucket_bits, max_value)
+        self.ipdv = LatencyHistogram(sub_bucket_bits, max_value)
+        self.jitter = 0.0
+        self._prev_seq = None
+        self._prev_latency = None
+
+    def add(self, seq, latency):
+        self.latency.record(latency)
+        if self._prev_latency is not None:
+            delta = latency - self._prev_latency
+            self.jitter += (abs(delta) - self.jitter) / 16
+            if seq == self._prev_seq + 1:
+                self.ipdv.record(abs(delta))
+        self._prev_seq = seq
+        self._prev_latency = latency
+
+    def merge(self, other):
+        # RFC 3550 jitter is a per-flow running estimate; merged flows report
+        # the sample-weighted mean of their estimates.
+        total = self.latency.count + other.latency.count
+        if total:
+            self.jitter = (self.jitter * self.latency.count + other.jitter * other.latency.count) / total
+        self.latency.merge(other.latency)
+        self.ipdv.merge(other.ipdv)
+        return self
+
+    def to_dict(self):
+        return {'latency': self.latency.to_dict(), 'ipdv': self.ipdv.to_dict(), 'jitter': self.jitter}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.latency = LatencyHistogram.from_dict(data['latency'])
+        stats.ipdv = LatencyHistogram.from_dict(data['ipdv'])
+        stats.jitter = data['jitter']
+        return stats
+
+    def summary(self, percentiles=PERCENTILES):
+        result = self.latency.summary(percentiles)
+        result['jitter'] = self.jitter
+        ipdv = self.ipdv.summary(percentiles)
+        for key in ('p50', 'p99', 'max'):
+            result[f"ipdv_{key}"] = ipdv[key]
+        return result
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Kernel packet timestamps for latency measurements
+- software: SO_TIMESTAMPING RX/TX software stamps taken by the kernel
+  (CLOCK_REALTIME), read from recvmsg() ancillary data and the TX error queue
+- hardware: NIC stamps (raw PHC clock), enabled with SIOCSHWTSTAMP
+- user: time.perf_counter_ns() taken around send()/recv() in Python
+enable_timestamps() falls back hardware -> software -> user and returns the
+source actually in effect, so every run can report what it measured with.
+"""
+
+import ctypes
+import fcntl
+import socket
+import struct
+
+SO_TIMESTAMPING = 37
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+
+SOF_TIMESTAMPING_TX_HARDWARE = 1 << 0
+SOF_TIMESTAMPING_TX_SOFTWARE = 1 << 1
+SOF_TIMESTAMPING_RX_HARDWARE = 1 << 2
+SOF_TIMESTAMPING_RX_SOFTWARE = 1 << 3
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_RAW_HARDWARE = 1 << 6
+
+SIOCSHWTSTAMP = 0x89B0
+HWTSTAMP_TX_ON = 1
+HWTSTAMP_FILTER_ALL = 1
+
+SOURCE_HARDWARE = 'hardware'
+SOURCE_SOFTWARE = 'software'
+SOURCE_USER = 'user'
+SOURCES = (SOURCE_HARDWARE, SOURCE_SOFTWARE, SOURCE_USER)
+
+# struct scm_timestamping: ts[0] software, ts[1] legacy, ts[2] raw hardware
+SCM_TIMESTAMPING_FMT = struct.Struct('qqqqqq')
+ANCILLARY_SIZE = 256
+
+RX_FLAGS = {
+    SOURCE_SOFTWARE: SOF_TIMESTAMPING_RX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE,
+    SOURCE_HARDWARE: SOF_TIMESTAMPING_RX_HARDWARE | SOF_TIMESTAMPING_RAW_HARDWARE,
+}
+TX_FLAGS = {
+    SOURCE_SOFTWARE: SOF_TIMESTAMPING_TX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE,
+    SOURCE_HARDWARE: SOF_TIMESTAMPING_TX_HARDWARE | SOF_TIMESTAMPING_RAW_HARDWARE,
+}
+
+
+def enable_hw_timestamping(sock, interface):
+    # struct hwtstamp_config { int flags; int tx_type; int rx_filter; }
+    config = ctypes.create_string_buffer(struct.pack('iii', 0, HWTSTAMP_TX_ON, HWTSTAMP_FILTER_ALL))
+    ifreq = struct.pack('16sP', interface.encode()[:15], ctypes.addressof(config))
+    fcntl.ioctl(sock.fileno(), SIOCSHWTSTAMP, ifreq)
+
+def enable_timestamps(send_sock, recv_sock, source=SOURCE_SOFTWARE):
+    """Turn on the requested timestamp source; returns the one that could be enabled."""
+    if source == SOURCE_HARDWARE:
+        interface = send_sock.getsockname()[0]
+        try:
+            enable_hw_timestamping(send_sock, interface)
+            send_sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, TX_FLAGS[SOURCE_HARDWARE])
+            recv_sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, RX_FLAGS[SOURCE_HARDWARE])
+            return SOURCE_HARDWARE
+        except OSError as e:
+            print(f"Hardware timestamps unavailable on {interface} ({e}), trying software")
+            source = SOURCE_SOFTWARE
+    if source == SOURCE_SOFTWARE:
+        try:
+            send_sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, TX_FLAGS[SOURCE_SOFTWARE])
+            recv_sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, RX_FLAGS[SOURCE_SOFTWARE])
+            return SOURCE_SOFTWARE
+        except OSError as e:
+            print(f"Kernel timestamps unavailable ({e}), using perf_counter_ns()")
+    disable_timestamps(send_sock, recv_sock)
+    return SOURCE_USER
+
+def disable_timestamps(send_sock, recv_sock):
+    # TX stamps pile up in the error queue if nobody reads them, so switch
+    # them off again once a run is over.
+    for sock in (send_sock, recv_sock):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, 0)
+        except OSError:
+            pass
+
+def scm_timestamp_ns(ancdata, source):
+    """Kernel timestamp in ns from recvmsg() ancillary data, or None."""
+    for level, cmsg_type, data in ancdata:
+        if level == socket.SOL_SOCKET and cmsg_type == SCM_TIMESTAMPING and len(data) >= SCM_TIMESTAMPING_FMT.size:
+            stamps = SCM_TIMESTAMPING_FMT.unpack_from(data)
+            sec, nsec = (stamps[4], stamps[5]) if source == SOURCE_HARDWARE else (stamps[0], stamps[1])
+            if sec or nsec:
+                return sec * 1_000_000_000 + nsec
+    return None
+
+def read_tx_timestamps(sock, source, snaplen=2048):
+    """Drain the TX error queue; yields (looped frame, kernel TX timestamp in ns)."""
+    while True:
+        try:
+            data, ancdata, _flags, _addr = sock.recvmsg(snaplen, ANCILLARY_SIZE,
+                                                       socket.MSG_ERRQUEUE | socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return
+        stamp = scm_timestamp_ns(ancdata, source)
+        if stamp is not None:
+            yield data, stamp
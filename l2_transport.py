@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Frame transports under the client and server
+- packet (default): AF_PACKET on a network interface, root required
+- unix:<name>: AF_UNIX SOCK_SEQPACKET on an abstract address, one datagram
+  per Ethernet frame; the server listens on it and the client connects, so
+  the full client/server stack runs with no root and no hardware
+- loopback_pair(): a connected SOCK_SEQPACKET socketpair, for running client
+  and server paths in one process (benchmarks)
+All backends hand out real sockets (send/recv_into/fileno), so the batched
+sendmmsg/recvmmsg paths, the event loop and select() work unchanged.
+Test frames, echoes and stats queries on a unix link share one connection:
+the server tells them apart by EtherType, as on the wire.
+"""
+
+import fcntl
+import os
+import socket
+import struct
+
+from l2_filter import build_ethertype_filter, open_filtered_socket
+
+UNIX_PREFIX = 'unix:'
+ABSTRACT_PREFIX = '\0l2-transport-'
+SIOCGIFHWADDR = 0x8927
+SIOCGIFMTU = 0x8921
+SOCKET_BUF_SIZE = 1 << 21   # queue several batches in each direction
+LISTEN_BACKLOG = 16
+
+# PACKET_AUXDATA (linux/if_packet.h): the tag the kernel stripped from a frame
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_AUXDATA = 8
+TP_STATUS_VLAN_VALID = 0x10
+# struct tpacket_auxdata: status, len, snaplen, mac, net, vlan_tci, vlan_tpid
+TPACKET_AUXDATA = struct.Struct('=IIIHHHH')
+AUXDATA_SIZE = socket.CMSG_SPACE(TPACKET_AUXDATA.size)
+
+
+def is_unix(interface):
+    return interface.startswith(UNIX_PREFIX)
+
+def unix_address(interface):
+    # Abstract namespace: nothing on the filesystem to clean up or chmod.
+    return ABSTRACT_PREFIX + interface[len(UNIX_PREFIX):]
+
+def describe(interface):
+    return f"unix socket {interface[len(UNIX_PREFIX):]}" if is_unix(interface) else interface
+
+def _seqpacket(sock):
+    for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUF_SIZE)
+        except OSError:
+            pass
+    return sock
+
+def source_mac(interface):
+    """The MAC this end sends from: the interface's, or one derived from the PID on a unix link."""
+    if is_unix(interface):
+        # Locally administered and unique per client process, so the
+        # server's per-source counters keep concurrent clients apart.
+        return bytes([0x02, 0x00]) + struct.pack('!I', os.getpid())
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        info = fcntl.ioctl(s.fileno(), SIOCGIFHWADDR, struct.pack('256s', interface[:15].encode('utf-8')))
+    return info[18:24]
+
+def interface_mtu(interface):
+    """The interface MTU (largest payload it sends), or None for unix links or on error."""
+    if is_unix(interface):
+        return None
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            info = fcntl.ioctl(s.fileno(), SIOCGIFMTU, struct.pack('16si', interface[:15].encode('utf-8'), 0))
+    except OSError:
+        return None
+    return struct.unpack_from('i', info, 16)[0]
+
+def kernel_timestamps(sock):
+    # AF_UNIX has no TX timestamps; RTT there is measured in user space.
+    return sock.family == socket.AF_PACKET
+
+def aux_vlan(ancdata):
+    """(vlan_tci, vlan_tpid, status) of the tag the kernel stripped, from PACKET_AUXDATA; None if untagged."""
+    for level, cmsg_type, data in ancdata:
+        if level == SOL_PACKET and cmsg_type == PACKET_AUXDATA and len(data) >= TPACKET_AUXDATA.size:
+            status, _len, _snaplen, _mac, _net, vlan_tci, vlan_tpid = TPACKET_AUXDATA.unpack_from(data)
+            if status & TP_STATUS_VLAN_VALID:
+                return vlan_tci, vlan_tpid, status
+    return None
+
+def connect(interface):
+    sock = _seqpacket(socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET))
+    try:
+        sock.connect(unix_address(interface))
+    except OSError as e:
+        sock.close()
+        raise OSError(e.errno, f"no server on {describe(interface)} ({e.strerror})") from None
+    return sock
+
+def open_test_sockets(interface, dst_mac, ethertype):
+    """(send_sock, recv_sock) for test frames to dst_mac and their echoes."""
+    if is_unix(interface):
+        # Echoes come back on the connection the frames went out on.
+        sock = connect(interface)
+        return sock, sock
+    send_sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    send_sock.bind((interface, 0))
+    # Only echoes from the server with our EtherType reach userspace. The
+    # filter does not restrict the VLAN, so tagged and untagged tests share it.
+    recv_filter = build_ethertype_filter(ethertype, src_mac=dst_mac)
+    recv_sock = open_filtered_socket(interface, ethertype, recv_filter)
+    return send_sock, recv_sock
+
+def open_protocol_socket(interface, ethertype):
+    """One socket sending and receiving frames of a single EtherType (e.g., stats queries)."""
+    if is_unix(interface):
+        return connect(interface)
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ethertype))
+    sock.bind((interface, ethertype))
+    return sock
+
+def listen(interface):
+    """Server side of a unix link; accept() yields one socket per client."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    sock.bind(unix_address(interface))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+def accept(listener):
+    conn, _ = listener.accept()
+    return _seqpacket(conn)
+
+def loopback_pair():
+    """(client end, server end): frames sent on one arrive, boundaries kept, on the other."""
+    a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    return _seqpacket(a), _seqpacket(b)
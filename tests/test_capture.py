@@ -0,0 +1,89 @@
+import struct
+
+from l2_capture import (Capture, section_header, interface_description, enhanced_packet, BLOCK_SHB, BLOCK_IDB,
+                        BLOCK_EPB, BYTE_ORDER_MAGIC, LINKTYPE_ETHERNET, OPT_COMMENT, OPT_IF_NAME, OPT_IF_TSRESOL,
+                        OPT_SHB_USERAPPL, TSRESOL_NS)
+
+
+def blocks(data):
+    # (block type, body) for each block, checking both length fields.
+    offset = 0
+    while offset < len(data):
+        block_type, length = struct.unpack_from('<II', data, offset)
+        assert length % 4 == 0
+        assert struct.unpack_from('<I', data, offset + length - 4)[0] == length
+        yield block_type, data[offset + 8:offset + length - 4]
+        offset += length
+    assert offset == len(data)
+
+def options(body):
+    result = {}
+    offset = 0
+    while offset < len(body):
+        code, length = struct.unpack_from('<HH', body, offset)
+        if code == 0:
+            break
+        result[code] = body[offset + 4:offset + 4 + length]
+        offset += 4 + length + (-length % 4)
+    return result
+
+def packets(filename):
+    # (timestamp ns, captured data, original length, options) per EPB.
+    with open(filename, 'rb') as f:
+        data = f.read()
+    result = []
+    for block_type, body in blocks(data):
+        if block_type == BLOCK_EPB:
+            _, high, low, caplen, orig_len = struct.unpack_from('<IIIII', body)
+            padded = caplen + (-caplen % 4)
+            result.append(((high << 32) | low, body[20:20 + caplen], orig_len, options(body[20 + padded:])))
+    return result
+
+
+def test_section_header():
+    [(block_type, body)] = blocks(section_header('tests'))
+    assert block_type == BLOCK_SHB
+    magic, major, minor, section_length = struct.unpack_from('<IHHq', body)
+    assert (magic, major, minor, section_length) == (BYTE_ORDER_MAGIC, 1, 0, -1)
+    assert options(body[16:]) == {OPT_SHB_USERAPPL: b'tests'}
+
+def test_interface_description():
+    [(block_type, body)] = blocks(interface_description('vt0', 64))
+    assert block_type == BLOCK_IDB
+    assert struct.unpack_from('<HHI', body) == (LINKTYPE_ETHERNET, 0, 64)
+    assert options(body[8:]) == {OPT_IF_NAME: b'vt0', OPT_IF_TSRESOL: bytes([TSRESOL_NS])}
+
+def test_enhanced_packet_layout():
+    ts_ns = 1_700_000_000_123_456_789
+    [(block_type, body)] = blocks(enhanced_packet(ts_ns, b'\x01' * 61, 1514, 'lost probe'))
+    assert block_type == BLOCK_EPB
+    interface_id, high, low, caplen, orig_len = struct.unpack_from('<IIIII', body)
+    assert (interface_id, (high << 32) | low, caplen, orig_len) == (0, ts_ns, 61, 1514)
+    assert body[20:81] == b'\x01' * 61 and body[81:84] == bytes(3)
+    assert options(body[84:]) == {OPT_COMMENT: b'lost probe'}
+    assert len(enhanced_packet(ts_ns, b'\x01' * 64, 64)) == 12 + 20 + 64
+
+def test_capture_samples_snaps_and_comments(tmp_path):
+    filename = tmp_path / 'capture.pcapng'
+    capture = Capture(str(filename), sample=3, snaplen=32, interface='vt0', outlier_ns=1_000_000)
+    for i in range(9):
+        capture.offer(bytes([i]) * 100, ts_ns=1000 + i)
+    capture.offer(b'\xaa' * 100, ts_ns=2000, latency_ns=5_000_000)
+    capture.trigger(b'\xbb' * 20, ts_ns=3000, comment='lost probe')
+    capture.close()
+    assert capture.summary()['offered'] == 10
+    written = packets(filename)
+    assert [(ts, data[:1], len(data), orig_len) for ts, data, orig_len, _ in written] == [
+        (1002, b'\x02', 32, 100), (1005, b'\x05', 32, 100), (1008, b'\x08', 32, 100),
+        (2000, b'\xaa', 32, 100), (3000, b'\xbb', 20, 20)]
+    assert written[3][3] == {OPT_COMMENT: b'latency outlier: 5.000 ms'}
+    assert written[4][3] == {OPT_COMMENT: b'lost probe'}
+
+def test_capture_queue_is_bounded_in_bytes(tmp_path):
+    capture = Capture(str(tmp_path / 'capture.pcapng'), sample=1, queue_bytes=1000)
+    with capture.lock:  # hold off the writer thread
+        for _ in range(20):
+            capture._enqueue(bytes(100), None, None)
+    capture.close()
+    assert capture.written == 10
+    assert capture.dropped == 10
@@ -0,0 +1,86 @@
+import multiprocessing
+
+from l2_counters import (CounterTable, merge_entries, sum_entries, pack_stats_query, parse_stats_query,
+                         pack_stats_reply, parse_stats_reply, records_per_frame, DEFAULT_REPLY_PAYLOAD)
+
+MACS = [bytes([2, 0, 0, 0, 0, i]) for i in range(16)]
+
+
+def fill(table):
+    # Runs in a spawned worker: one echoed frame per source.
+    for mac in MACS[:4]:
+        table.count(mac, None, 100, True)
+
+
+def test_counts_per_source_and_vlan():
+    table = CounterTable()
+    table.count(MACS[0], None, 100, True)
+    table.count(MACS[0], None, 60, False)
+    table.count(MACS[0], 10, 100, True)
+    table.count(MACS[0], 10, 100, None)
+    entries = {entry[:2]: entry[2:] for entry in table.entries()}
+    assert entries == {(MACS[0], None): (2, 160, 1, 0), (MACS[0], 10): (1, 100, 0, 1)}
+    assert table.totals() == {'frames': 3, 'bytes': 260, 'errors': 1, 'drops': 1}
+
+def test_colliding_keys_fill_every_slot():
+    # With as many keys as slots, most keys probe past a taken slot.
+    table = CounterTable(slots=8)
+    for _ in range(3):
+        for mac in MACS[:8]:
+            table.count(mac, 1, 64, True)
+    assert sorted(table.entries()) == [(mac, 1, 3, 192, 0, 0) for mac in MACS[:8]]
+    assert table.overflow == 0
+
+def test_full_table_counts_overflow():
+    table = CounterTable(slots=4)
+    for mac in MACS[:6]:
+        table.count(mac, None, 64, True)
+    assert len(list(table.entries())) == 4
+    assert table.overflow == 2
+
+def test_reader_over_the_same_buffer():
+    writer = CounterTable(slots=16)
+    reader = CounterTable(writer.buf, 16)
+    writer.count(MACS[1], 5, 64, True)
+    assert list(reader.entries()) == [(MACS[1], 5, 1, 64, 0, 0)]
+
+def test_shared_table_crosses_a_spawned_process():
+    # Pickled into the child (spawn), still backed by the same shared memory.
+    table = CounterTable.shared(slots=16)
+    worker = multiprocessing.get_context('spawn').Process(target=fill, args=(table,))
+    worker.start()
+    worker.join(30)
+    assert worker.exitcode == 0
+    assert sorted(entry[0] for entry in table.entries()) == MACS[:4]
+    assert table.totals()['bytes'] == 400
+
+def test_merge_entries_busiest_first():
+    first, second = CounterTable(slots=16), CounterTable(slots=16)
+    first.count(MACS[0], None, 10, True)
+    second.count(MACS[0], None, 10, True)
+    second.count(MACS[1], None, 10, True)
+    second.count(MACS[1], None, 10, True)
+    second.count(MACS[1], None, 10, True)
+    merged = merge_entries([first, second])
+    assert merged == [(MACS[1], None, 3, 30, 0, 0), (MACS[0], None, 2, 20, 0, 0)]
+    assert sum_entries(merged)['frames'] == 5
+
+def test_stats_reply_pages():
+    entries = [(mac, vlan, 1, 2, 3, 4) for mac in MACS for vlan in (None, 7)]
+    for max_payload in (None, 200, DEFAULT_REPLY_PAYLOAD, 9000):
+        start, limit = parse_stats_query(pack_stats_query(0, max_payload))
+        assert limit == (max_payload or DEFAULT_REPLY_PAYLOAD)
+        fetched = []
+        while len(fetched) < len(entries):
+            payload = pack_stats_reply(entries, len(fetched), limit)
+            assert len(payload) <= limit
+            first, total, page = parse_stats_reply(payload)
+            assert first == len(fetched) and total == len(entries)
+            assert len(page) == min(records_per_frame(limit), len(entries) - len(fetched))
+            fetched += page
+        assert fetched == entries
+
+def test_stats_frames_are_told_apart():
+    assert parse_stats_reply(pack_stats_query(0)) is None
+    assert parse_stats_query(pack_stats_reply([], 0)) is None
+    assert parse_stats_query(b'\x00' * 3) is None
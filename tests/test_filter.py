@@ -0,0 +1,118 @@
+import struct
+
+import pytest
+
+from l2_filter import (_assemble, _ancillary, build_ethertype_filter, BPF_LD_W_ABS, BPF_LD_H_ABS,
+                       BPF_ALU_AND_K, BPF_ALU_MOD_K, BPF_JEQ_K, BPF_RET_K, SKF_AD_VLAN_TAG,
+                       SKF_AD_VLAN_TAG_PRESENT, ACCEPT_SNAPLEN)
+
+ETHERTYPE = 0x88B5
+DST = bytes.fromhex('020000000002')
+SRC = bytes.fromhex('020000000001')
+
+
+def run(program, frame, vlan_tci=None):
+    # Minimal classic BPF interpreter for the opcodes the generator emits;
+    # vlan_tci stands for a tag the kernel stripped (ancillary data).
+    a = pc = 0
+    while True:
+        code, jt, jf, k = program[pc]
+        pc += 1
+        if code == BPF_RET_K:
+            return k
+        if code in (BPF_LD_W_ABS, BPF_LD_H_ABS):
+            if k == _ancillary(SKF_AD_VLAN_TAG_PRESENT):
+                a = int(vlan_tci is not None)
+            elif k == _ancillary(SKF_AD_VLAN_TAG):
+                a = vlan_tci or 0
+            else:
+                size = 4 if code == BPF_LD_W_ABS else 2
+                if k + size > len(frame):
+                    return 0
+                a = int.from_bytes(frame[k:k + size], 'big')
+        elif code == BPF_ALU_AND_K:
+            a &= k
+        elif code == BPF_ALU_MOD_K:
+            a %= k
+        elif code == BPF_JEQ_K:
+            pc += jt if a == k else jf
+        else:
+            raise AssertionError(f"unexpected opcode {code:#x}")
+
+def frame(ethertype=ETHERTYPE, vlan_id=None, src=SRC, payload=bytes(46)):
+    tag = struct.pack('!HH', 0x8100, vlan_id) if vlan_id is not None else b''
+    return DST + src + tag + struct.pack('!H', ethertype) + payload
+
+
+def test_assemble_resolves_labels_relative_to_next_insn():
+    program = _assemble([
+        (BPF_JEQ_K, 'yes', 'no', 1),
+        'yes',
+        (BPF_RET_K, 0, 0, 1),
+        'no',
+        (BPF_RET_K, 0, 0, 0),
+    ])
+    assert program == [(BPF_JEQ_K, 0, 1, 1), (BPF_RET_K, 0, 0, 1), (BPF_RET_K, 0, 0, 0)]
+
+def test_assemble_keeps_numeric_offsets():
+    insns = [(BPF_LD_H_ABS, 0, 0, 12), (BPF_JEQ_K, 1, 0, 5), (BPF_RET_K, 0, 0, 0), (BPF_RET_K, 0, 0, 1)]
+    assert _assemble(insns) == insns
+
+def test_assemble_unknown_label():
+    with pytest.raises(KeyError):
+        _assemble([(BPF_JEQ_K, 'missing', 0, 1), (BPF_RET_K, 0, 0, 0)])
+
+@pytest.mark.parametrize('vlan_id', [None, 100])
+@pytest.mark.parametrize('src_mac', [None, SRC])
+def test_jumps_stay_in_program(vlan_id, src_mac):
+    program = build_ethertype_filter(ETHERTYPE, vlan_id, src_mac=src_mac)
+    for pc, (code, jt, jf, _) in enumerate(program):
+        if code == BPF_JEQ_K:
+            assert 0 <= jt and pc + 1 + jt < len(program)
+            assert 0 <= jf and pc + 1 + jf < len(program)
+    assert program[-1][0] == BPF_RET_K
+
+def test_ethertype_untagged_and_inband():
+    program = build_ethertype_filter(ETHERTYPE)
+    assert run(program, frame()) == ACCEPT_SNAPLEN
+    assert run(program, frame(vlan_id=7)) == ACCEPT_SNAPLEN
+    assert run(program, frame(vlan_id=7), vlan_tci=7) == ACCEPT_SNAPLEN
+    assert run(program, frame(ethertype=0x0800)) == 0
+    assert run(program, frame(ethertype=0x0800, vlan_id=7)) == 0
+
+def test_vlan_offloaded_and_inband():
+    program = build_ethertype_filter(ETHERTYPE, vlan_id=100)
+    # Offloaded: the frame reaches the filter untagged, the tag is ancillary.
+    assert run(program, frame(), vlan_tci=100) == ACCEPT_SNAPLEN
+    assert run(program, frame(), vlan_tci=(5 << 13) | 100) == ACCEPT_SNAPLEN  # PCP bits ignored
+    assert run(program, frame(), vlan_tci=101) == 0
+    assert run(program, frame(ethertype=0x0800), vlan_tci=100) == 0
+    assert run(program, frame(vlan_id=100)) == ACCEPT_SNAPLEN
+    assert run(program, frame(vlan_id=101)) == 0
+    assert run(program, frame()) == 0
+
+def test_src_mac():
+    program = build_ethertype_filter(ETHERTYPE, src_mac=SRC)
+    assert run(program, frame()) == ACCEPT_SNAPLEN
+    assert run(program, frame(src=bytes.fromhex('020000000009'))) == 0
+    assert run(program, frame(src=SRC[:5] + b'\x09')) == 0
+
+def flow_payload(flow_id):
+    # Test header: magic, version, flags, then the flow ID.
+    return bytes(4) + struct.pack('!H', flow_id) + bytes(40)
+
+@pytest.mark.parametrize('vlan_id', [None, 7])
+def test_flow_id(vlan_id):
+    program = build_ethertype_filter(ETHERTYPE, flow_id=3)
+    for tci in ([None] if vlan_id is None else [None, vlan_id]):
+        # In-band tag (payload at 18) and offloaded tag (payload at 14).
+        inband = vlan_id if tci is None else None
+        assert run(program, frame(vlan_id=inband, payload=flow_payload(3)), tci) == ACCEPT_SNAPLEN
+        assert run(program, frame(vlan_id=inband, payload=flow_payload(4)), tci) == 0
+
+def test_flow_shards_split_the_flows():
+    programs = [build_ethertype_filter(ETHERTYPE, flow_shard=(shard, 4)) for shard in range(4)]
+    for flow_id in range(0x100, 0x110):
+        accepted = [shard for shard, program in enumerate(programs)
+                    if run(program, frame(payload=flow_payload(flow_id)))]
+        assert accepted == [flow_id % 4]
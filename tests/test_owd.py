@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from l2_owd import OneWayDelay
+
+OFFSET_NS = 1_700_000_000_000_000_000   # server clock ahead of the client's (e.g. realtime vs. monotonic)
+SERVER_NS = 10_000
+
+
+def probes(count=10_000, interval_ns=1_000_000, drift_ppm=50, uplink_ns=100_000, downlink_ns=100_000,
+           uplink_queue_ns=0, downlink_queue_ns=0, seed=1):
+    # (seq, t1, t2, t3, t4) with the server's clock running drift_ppm fast;
+    # a fifth of the probes see no queueing, the rest exponential queueing.
+    rng = random.Random(seed)
+
+    def queueing(mean):
+        return 0 if not mean or rng.random() < 0.2 else int(rng.expovariate(1 / mean))
+
+    def server_clock(t):
+        return OFFSET_NS + int(t * (1 + drift_ppm / 1e6))
+
+    for seq in range(count):
+        t1 = seq * interval_ns
+        arrival = t1 + uplink_ns + queueing(uplink_queue_ns)
+        departure = arrival + SERVER_NS
+        t4 = departure + downlink_ns + queueing(downlink_queue_ns)
+        yield seq, t1, server_clock(arrival), server_clock(arrival) + SERVER_NS, t4
+
+def estimate(**kwargs):
+    owd = OneWayDelay()
+    for probe in probes(**kwargs):
+        owd.add(*probe)
+    return owd.finish()
+
+
+def test_fits_offset_and_drift():
+    summary = estimate(uplink_queue_ns=50_000, downlink_queue_ns=50_000)
+    assert summary['offset_ns'] == pytest.approx(OFFSET_NS, abs=2_000)
+    assert summary['drift_ppm'] == pytest.approx(50, abs=0.5)
+    assert summary['windows'] == 10_000 // 64 + 1
+
+def test_without_drift():
+    summary = estimate(drift_ppm=0)
+    assert summary['offset_ns'] == pytest.approx(OFFSET_NS, abs=100)
+    assert summary['drift_ppm'] == pytest.approx(0, abs=0.01)
+    assert summary['uplink']['p50'] == pytest.approx(100_000, rel=0.01)
+    assert summary['downlink']['p50'] == pytest.approx(100_000, rel=0.01)
+    assert summary['server']['p50'] == pytest.approx(SERVER_NS, rel=0.01)
+
+def test_queueing_is_attributed_to_its_direction():
+    summary = estimate(uplink_queue_ns=200_000)
+    assert summary['uplink']['p90'] > 300_000
+    assert summary['downlink']['p90'] == pytest.approx(100_000, rel=0.05)
+
+def test_asymmetric_base_delay_is_split_evenly():
+    # Without synchronised clocks the minimum delay splits evenly.
+    summary = estimate(uplink_ns=300_000, downlink_ns=100_000, drift_ppm=0)
+    assert summary['offset_ns'] == pytest.approx(OFFSET_NS + 100_000, abs=100)
+    assert summary['uplink']['p50'] == pytest.approx(200_000, rel=0.01)
+    assert summary['downlink']['p50'] == pytest.approx(200_000, rel=0.01)
+
+def test_single_window():
+    summary = estimate(count=10, drift_ppm=0)
+    assert summary['windows'] == 1
+    assert summary['drift_ppm'] == 0
+    assert summary['offset_ns'] == pytest.approx(OFFSET_NS, abs=100)
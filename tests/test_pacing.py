@@ -0,0 +1,33 @@
+import pytest
+
+from l2_pacing import parse_rate
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('5000', 5000),
+    ('5000pps', 5000),
+    ('20kpps', 20_000),
+    (' 1.5 Mpps ', 1_500_000),
+    ('2.5k', 2500),
+    ('100p/s', 100),
+])
+def test_packet_rates(text, expected):
+    assert parse_rate(text, 8000) == pytest.approx(expected)
+
+@pytest.mark.parametrize('text, expected', [
+    ('8000bps', 1),
+    ('50Mbps', 6250),
+    ('1Gb/s', 125_000),
+    ('8kbps', 1),
+])
+def test_bit_rates_divide_by_frame_bits(text, expected):
+    assert parse_rate(text, 8000) == pytest.approx(expected)
+
+@pytest.mark.parametrize('text', [None, '', '   '])
+def test_empty_is_unlimited(text):
+    assert parse_rate(text, 8000) is None
+
+@pytest.mark.parametrize('text', ['fast', '10 mbit', '-5pps', '1e3', '10Tbps'])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        parse_rate(text, 8000)
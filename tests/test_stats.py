@@ -0,0 +1,182 @@
+import json
+import random
+
+import pytest
+
+from l2_stats import SequenceTracker, LatencyHistogram, LatencyStats, SEQ_MASK
+
+
+def track(seqs, last=None, **kwargs):
+    tracker = SequenceTracker(**kwargs)
+    for seq in seqs:
+        tracker.add(seq)
+    return tracker.finish(max(seqs) if last is None else last)
+
+
+def test_in_order():
+    stats = track(range(100))
+    assert stats['received'] == 100
+    assert stats['lost'] == stats['reordered'] == stats['duplicates'] == stats['late'] == 0
+
+def test_loss():
+    stats = track([0, 1, 3, 4, 7])
+    assert stats['received'] == 5
+    assert stats['lost'] == 3
+    assert stats['reordered'] == 0
+
+def test_finish_counts_the_tail_as_lost():
+    stats = track([0, 1], last=5)
+    assert stats['lost'] == 4
+
+def test_nothing_received():
+    tracker = SequenceTracker()
+    assert tracker.finish(9)['lost'] == 10
+
+def test_reordered():
+    stats = track([0, 3, 1, 2, 4])
+    assert stats['received'] == 5
+    assert stats['lost'] == 0
+    assert stats['reordered'] == 2
+    assert stats['max_displacement'] == 2
+
+def test_duplicates():
+    stats = track([0, 1, 1, 2, 0])
+    assert stats['received'] == 3
+    assert stats['duplicates'] == 2
+    assert stats['lost'] == 0
+
+def test_late_arrival_stays_lost():
+    stats = track([0, 20, 1], last=20, window=8)
+    assert stats['received'] == 2
+    assert stats['late'] == 1
+    assert stats['lost'] == 19
+
+def test_gap_larger_than_window():
+    stats = track([0, 1, 1000, 1001], window=16)
+    assert stats['received'] == 4
+    assert stats['lost'] == 998
+
+def test_loss_counted_as_the_window_slides():
+    tracker = SequenceTracker(window=8)
+    for seq in (0, 2, 9):
+        tracker.add(seq)
+    # 1 has left the window; 3..8 are still in it and may yet arrive.
+    assert tracker.lost == 1
+    tracker.add(5)
+    assert tracker.finish(9)['lost'] == 6
+
+def test_wraps_at_32_bits():
+    tracker = SequenceTracker(first_seq=SEQ_MASK - 1)
+    for seq in (SEQ_MASK - 1, SEQ_MASK, 0, 2, 1):
+        tracker.add(seq)
+    assert tracker.highest == SEQ_MASK + 3
+    stats = tracker.finish(tracker.unwrap(3))
+    assert stats['received'] == 5
+    assert stats['lost'] == 1
+    assert stats['reordered'] == 1
+    assert stats['duplicates'] == 0
+
+def test_reordered_across_the_wrap():
+    tracker = SequenceTracker(first_seq=SEQ_MASK - 1)
+    for seq in (SEQ_MASK - 1, 0, SEQ_MASK):
+        tracker.add(seq)
+    stats = tracker.finish(tracker.highest)
+    assert stats['received'] == 3
+    assert stats['reordered'] == 1
+    assert stats['max_displacement'] == 1
+    assert stats['lost'] == 0
+
+def test_corrupted_frames_count_as_lost():
+    tracker = SequenceTracker()
+    tracker.add(0)
+    tracker.add_corrupted()
+    tracker.add(2)
+    stats = tracker.finish(2)
+    assert stats['corrupted'] == 1
+    assert stats['lost'] == 1
+
+def test_memory_is_bounded():
+    tracker = SequenceTracker(window=64)
+    size = len(tracker.bitmap)
+    for seq in range(0, 100_000, 3):
+        tracker.add(seq)
+    assert len(tracker.bitmap) == size
+    assert tracker.finish(99_999)['lost'] == 100_000 - len(range(0, 100_000, 3))
+
+
+def test_histogram_index_round_trip():
+    histogram = LatencyHistogram()
+    for index in range(len(histogram.counts)):
+        assert histogram._index(histogram._value_at(index)) == index
+
+def test_histogram_precision():
+    histogram = LatencyHistogram()
+    for value in range(histogram.sub_count):
+        assert histogram._value_at(histogram._index(value)) == value
+    rng = random.Random(1)
+    for value in [rng.randrange(256, histogram.max_value) for _ in range(10_000)]:
+        assert abs(histogram._value_at(histogram._index(value)) - value) <= value / histogram.half
+    indexes = [histogram._index(value) for value in range(0, 1 << 20, 97)]
+    assert indexes == sorted(indexes)
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 10_001):
+        histogram.record(value * 1000)
+    assert histogram.count == 10_000
+    assert histogram.min == 1000 and histogram.max == 10_000_000
+    assert histogram.mean() == pytest.approx(5_000_500)
+    for pct in (50, 90, 99, 99.9):
+        assert histogram.percentile(pct) == pytest.approx(pct * 100_000, rel=1 / 128)
+    assert histogram.percentile(100) == pytest.approx(10_000_000, rel=1 / 128)
+
+def test_histogram_percentile_stays_within_min_and_max():
+    histogram = LatencyHistogram()
+    histogram.record(1_000_001, count=5)
+    assert histogram.percentile(50) == histogram.percentile(99.9) == 1_000_001
+    assert LatencyHistogram().percentile(50) is None
+
+def test_histogram_overflow():
+    histogram = LatencyHistogram(max_value=1_000_000)
+    histogram.record(5_000_000)
+    assert histogram.overflow == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.max == 5_000_000
+
+def test_histogram_merge_equals_recording_everything():
+    rng = random.Random(2)
+    values = [int(rng.lognormvariate(12, 1)) for _ in range(5000)]
+    whole, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, value in enumerate(values):
+        whole.record(value)
+        (first if i % 3 else second).record(value)
+    first.merge(second)
+    assert first.counts == whole.counts
+    assert first.summary() == whole.summary()
+
+def test_histogram_merge_needs_same_layout():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(sub_bucket_bits=7))
+
+def test_histogram_dict_round_trip():
+    histogram = LatencyHistogram()
+    for value in (10, 2000, 3_000_000, 70_000_000_000):
+        histogram.record(value)
+    copy = LatencyHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert copy.counts == histogram.counts
+    assert copy.summary() == histogram.summary()
+    assert copy.overflow == 1
+
+def test_latency_stats_jitter_and_ipdv():
+    stats = LatencyStats()
+    for seq, latency in enumerate([1000, 3000] * 50):
+        stats.add(seq, latency)
+    summary = stats.summary()
+    # |D| is always 2000 ns: RFC 3550 jitter converges on it.
+    assert summary['jitter'] == pytest.approx(2000, rel=0.05)
+    assert summary['ipdv_p50'] == pytest.approx(2000, rel=1 / 128)
+    # A gap in the sequence numbers yields no IPDV sample.
+    stats = LatencyStats()
+    stats.add(0, 1000)
+    stats.add(2, 5000)
+    assert stats.ipdv.count == 0